@@ -1,28 +1,100 @@
+import argparse
+import json
+import os
+import queue
+import random
+import shlex
 import subprocess
 import sys
-import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# this sets the amount of runs, which are performed
-amount_of_runs = 5
+parser = argparse.ArgumentParser(description="Runs the same config multiple times with different random seeds, each run writes into its own sub folder of the output folder.")
+parser.add_argument('file', help='The path to the configuration file, which should be run multiple times.')
+parser.add_argument('args', metavar='arguments', nargs='+', help='Additional arguments which are used to replace placeholders inside the configuration. The last argument has to be the output folder, in which a sub folder is created for each run.')
+parser.add_argument('--runs', type=int, default=5, help="The amount of runs. Default: 5")
+parser.add_argument('--processes', type=int, default=1, help="The amount of runs which are executed in parallel. The available cpus are split evenly between them. Default: 1")
+parser.add_argument('--seed', type=int, default=None, help="The base seed, run i uses the seed <seed> + i via BLENDER_PROC_RANDOM_SEED. Default: a random base seed, which is stored in the summary.")
+parser.add_argument('--no-pinning', dest='no_pinning', action='store_true', help="If set, the runs are not pinned to their cpu set. Pinning is only available on linux.")
+parser.add_argument('--temp-dir', dest='temp_dir', default=None, help="The directory in which every run gets its own temp dir. Default: the default temp dir of run.py.")
+parser.add_argument('--run-args', dest='run_args', default="", help="Additional options for run.py as one string, e.g. --run-args \"--custom-blender-path /opt/blender\".")
+parser.add_argument('--summary', default=None, help="The path of the json summary containing seed, exit code and runtime per run. Default: <output folder>/rerun_summary.json")
+args = parser.parse_args()
 
 # set the folder in which the run.py is located
 rerun_folder = os.path.abspath(os.path.dirname(__file__))
 
-# the first one is the rerun.py script, the last is the output
-used_arguments = sys.argv[1:-1]
-output_location = os.path.abspath(sys.argv[-1])
-for run_id in range(amount_of_runs):
-    # in each run, the arguments are reused
-    cmd = ["python", os.path.join(rerun_folder, "run.py")]
-    cmd.extend(used_arguments)
-    # the only exception is the output, which gets changed for each run, so that the examples are not overwritten
-    cmd.append(os.path.join(output_location, str(run_id)))
-    print(" ".join(cmd))
-    # execute one BlenderProc run
-    subprocess.call(" ".join(cmd), shell=True)
+# the last argument is the output, all others are reused in each run
+used_arguments = args.args[:-1]
+output_location = os.path.abspath(args.args[-1])
+os.makedirs(output_location, exist_ok=True)
+base_seed = args.seed if args.seed is not None else random.randrange(2 ** 31)
+
+# Split the available cpus evenly into one cpu set per parallel process
+if hasattr(os, "sched_getaffinity"):
+    available_cpus = sorted(os.sched_getaffinity(0))
+else:
+    available_cpus = list(range(os.cpu_count()))
+processes = max(1, min(args.processes, args.runs))
+cpus_per_process = max(1, len(available_cpus) // processes)
+if processes > len(available_cpus):
+    print("There are more parallel processes than cpus, some processes share their cpus.")
+cpu_sets = queue.Queue()
+for i in range(processes):
+    cpu_sets.put(available_cpus[(i * cpus_per_process) % len(available_cpus):][:cpus_per_process])
+
+use_pinning = not args.no_pinning and hasattr(os, "sched_setaffinity")
+if not args.no_pinning and not use_pinning:
+    print("Pinning the runs to cpu sets is not supported on this platform, the runs are not pinned.")
+
+
+def execute_run(run_id):
+    """ Executes one BlenderProc run on one of the free cpu sets and returns its summary. """
+    cpu_set = cpu_sets.get()
+    try:
+        seed = base_seed + run_id
+        # the only exception is the output, which gets changed for each run, so that the examples are not overwritten
+        run_output = os.path.join(output_location, str(run_id))
+        cmd = [sys.executable, os.path.join(rerun_folder, "run.py"), args.file] + used_arguments + [run_output]
+        cmd += ["--cpu-threads", str(len(cpu_set))]
+        if args.temp_dir is not None:
+            cmd += ["--temp-dir", os.path.join(os.path.abspath(args.temp_dir), "run_{}".format(run_id))]
+        cmd += shlex.split(args.run_args)
+        print("Run {} (seed {}, cpus {}): {}".format(run_id, seed, ",".join(str(cpu) for cpu in cpu_set), " ".join(cmd)))
 
+        # Pin the process, blender inherits the affinity from it
+        preexec_fn = (lambda: os.sched_setaffinity(0, cpu_set)) if use_pinning else None
+        env = dict(os.environ, BLENDER_PROC_RANDOM_SEED=str(seed))
+        start = time.time()
+        if processes > 1:
+            # If multiple runs are executed in parallel, their output would be interleaved, so it is written into log files
+            log_path = os.path.join(output_location, "run_{}.log".format(run_id))
+            with open(log_path, "w") as log_file:
+                exit_code = subprocess.call(cmd, env=env, preexec_fn=preexec_fn, stdout=log_file, stderr=subprocess.STDOUT)
+        else:
+            log_path = None
+            exit_code = subprocess.call(cmd, env=env, preexec_fn=preexec_fn)
+        runtime = time.time() - start
+        print("Run {} finished with exit code {} after {:.1f}s".format(run_id, exit_code, runtime))
+        return {"run_id": run_id, "seed": seed, "output_dir": run_output, "cpus": cpu_set, "exit_code": exit_code,
+                "runtime": runtime, "log": log_path}
+    finally:
+        cpu_sets.put(cpu_set)
 
 
+start = time.time()
+with ThreadPoolExecutor(max_workers=processes) as executor:
+    runs = list(executor.map(execute_run, range(args.runs)))
+total_runtime = time.time() - start
 
+summary_path = args.summary if args.summary is not None else os.path.join(output_location, "rerun_summary.json")
+with open(summary_path, "w") as f:
+    json.dump({"config": args.file, "arguments": used_arguments, "base_seed": base_seed, "processes": processes,
+               "total_runtime": total_runtime, "runs": runs}, f, indent=2)
 
+failed_runs = [run for run in runs if run["exit_code"] != 0]
+print("Finished {} runs in {:.1f}s, {} failed. Summary: {}".format(len(runs), total_runtime, len(failed_runs), summary_path))
+for run in runs:
+    print("  run {:>3}: seed {:>10}, exit code {:>3}, {:8.1f}s".format(run["run_id"], run["seed"], run["exit_code"], run["runtime"]))
 
+exit(failed_runs[0]["exit_code"] if failed_runs else 0)
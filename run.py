@@ -7,6 +7,7 @@
 import shutil
 import signal
 import sys
+import multiprocessing
 from sys import platform, version_info
 
 from src.utility.SetupUtility import SetupUtility
@@ -25,6 +26,13 @@
 parser.add_argument('args', metavar='arguments', nargs='*', help='Additional arguments which are used to replace placeholders inside the configuration. <args:i> is hereby replaced by the i-th argument.')
 parser.add_argument('--reinstall-blender', dest='reinstall_blender', action='store_true', help='If given, the blender installation is deleted and reinstalled. Is ignored, if a "custom_blender_path" is configured in the configuration file.')
 parser.add_argument('--batch_process', help='Renders a batch of house-cam combinations, by reading a file containing the combinations on each line, where each line is the standard placeholder arguments for rendering a single scene separated by spaces. The value of this option is the path to the index file, no need to add placeholder arguments.')
+parser.add_argument('--workers', type=int, default=1, help="Only used together with --batch_process. The number of blender processes which work through the lines of the index file in parallel. The available cpu threads are split evenly between them. Default: 1")
+parser.add_argument('--resume', action='store_true', help="Only used together with --batch_process. Skips all lines of the index file, which have already been finished according to the batch manifest.")
+parser.add_argument('--reuse-assets', dest='reuse_assets', action='store_true', help="Only used together with --batch_process. Keeps loaded images, materials and meshes in memory over all lines processed by one blender process, so assets which are used in multiple lines are only loaded once.")
+parser.add_argument('--batch-manifest', dest='batch_manifest', default=None, help="Only used together with --batch_process. The path of the append-only manifest, to which an entry is written after every processed line of the index file. Default: <index file>.manifest.jsonl")
+parser.add_argument('--profile', default=None, help="If given, a profile of the pipeline run is written to this path as a json file in the chrome trace event format. It contains wall time, cpu time, peak rss and the number of blender data blocks for every module. In batch mode, the line index is appended to the file name. Only works with config files.")
+parser.add_argument('--cprofile-modules', dest='cprofile_modules', default=None, help="Only used together with --profile. A comma separated list of modules (e.g. loader.ObjectLoader,RgbRenderer) for which additionally cProfile stats are dumped next to the profile.")
+parser.add_argument('--cpu-threads', dest='cpu_threads', type=int, default=None, help="The number of cpu threads blender should use, if no cpu_threads are given in the config. Together with --workers, this is the number of threads per worker. Only works with config files. Default: all available threads.")
 parser.add_argument('--temp-dir', dest='temp_dir', default=None, help="The path to a directory where all temporary output files should be stored. If it doesn't exist, it is created automatically. Type: string. Default: \"/dev/shm\" or \"/tmp/\" depending on which is available.")
 parser.add_argument('--keep-temp-dir', dest='keep_temp_dir', action='store_true', help="If set, the temporary directory is not removed in the end.")
 parser.add_argument('--blender-install-path', dest='blender_install_path', default=None, help="Set path where blender should be installed. If None is given, /home_local/<env:USER>/blender/ is used per default. This argument is ignored if it is specified in the given YAML config.")
@@ -190,6 +198,28 @@ def __call__(self, block_num, block_size, total_size):
 else:
     path_src_run = args.file
 
+# Arguments which are used for profiling the pipeline
+profile_args = []
+if args.profile is not None:
+    profile_args += ["--profile", os.path.abspath(args.profile)]
+    if args.cprofile_modules is not None:
+        profile_args += ["--cprofile-modules", args.cprofile_modules]
+
+# Limits the cpu threads blender uses, if the config does not specify them
+thread_args = []
+if args.cpu_threads is not None and is_config:
+    thread_args += ["--cpu-threads", str(args.cpu_threads)]
+
+# Arguments which are passed to every blender process working on the batch
+batch_args = []
+if args.batch_process:
+    if args.resume:
+        batch_args.append("--resume")
+    if args.reuse_assets:
+        batch_args.append("--reuse-assets")
+    if args.batch_manifest is not None:
+        batch_args += ["--batch-manifest", args.batch_manifest]
+
 # Determine perfect temp dir
 if args.temp_dir is None:
     if sys.platform != "win32":
@@ -208,15 +238,29 @@ def __call__(self, block_num, block_size, total_size):
 if not os.path.exists(temp_dir):
     os.makedirs(temp_dir)
 
+processes = []
 if args.debug:
-    p = subprocess.Popen([blender_run_path, "--python-use-system-env", "--python-exit-code", "0", "--python", "src/debug_startup.py", "--", path_src_run if not is_config else args.file, temp_dir] + args.args, env=dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONNOUSERSITE="1"), cwd=repo_root_directory)
+    processes.append(subprocess.Popen([blender_run_path, "--python-use-system-env", "--python-exit-code", "0", "--python", "src/debug_startup.py", "--", path_src_run if not is_config else args.file, temp_dir] + args.args, env=dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONNOUSERSITE="1"), cwd=repo_root_directory))
 else:
     if not args.batch_process:
-        p = subprocess.Popen([blender_run_path, "--background", "--python-use-system-env", "--python-exit-code", "2", "--python", path_src_run, "--", args.file, temp_dir] + args.args,
-                             env=dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONNOUSERSITE="1"), cwd=repo_root_directory)
-    else:  # Pass the index file path containing placeholder args for all input combinations (cam, house, output path)
-        p = subprocess.Popen([blender_run_path, "--background", "--python-use-system-env", "--python-exit-code", "2", "--python", path_src_run, "--",  args.file, temp_dir, "--batch-process", args.batch_process],
-                             env=dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONNOUSERSITE="1"), cwd=repo_root_directory)
+        processes.append(subprocess.Popen([blender_run_path, "--background", "--python-use-system-env", "--python-exit-code", "2", "--python", path_src_run, "--", args.file, temp_dir] + args.args + profile_args + thread_args,
+                                          env=dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONNOUSERSITE="1"), cwd=repo_root_directory))
+    elif args.workers <= 1:  # Pass the index file path containing placeholder args for all input combinations (cam, house, output path)
+        processes.append(subprocess.Popen([blender_run_path, "--background", "--python-use-system-env", "--python-exit-code", "2", "--python", path_src_run, "--",  args.file, temp_dir, "--batch-process", args.batch_process] + batch_args + profile_args + thread_args,
+                                          env=dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONNOUSERSITE="1"), cwd=repo_root_directory))
+    else:
+        # All workers claim their next line from this shared queue directory
+        batch_queue_dir = os.path.join(temp_dir, "batch_queue")
+        os.makedirs(batch_queue_dir)
+        cpu_threads_per_worker = args.cpu_threads if args.cpu_threads is not None else max(1, multiprocessing.cpu_count() // args.workers)
+        print("Starting {} workers with {} cpu threads each".format(args.workers, cpu_threads_per_worker))
+        for worker_id in range(args.workers):
+            # Each worker gets its own temp dir, so their temporary outputs do not collide
+            worker_temp_dir = os.path.join(temp_dir, "worker_{}".format(worker_id))
+            processes.append(subprocess.Popen([blender_run_path, "--background", "--python-use-system-env", "--python-exit-code", "2", "--python", path_src_run, "--", args.file, worker_temp_dir,
+                                               "--batch-process", args.batch_process, "--batch-queue-dir", batch_queue_dir,
+                                               "--worker-id", str(worker_id), "--cpu-threads", str(cpu_threads_per_worker)] + batch_args + profile_args,
+                                              env=dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONNOUSERSITE="1"), cwd=repo_root_directory))
 
 
 def clean_temp_dir():
@@ -225,22 +269,27 @@ def clean_temp_dir():
         print("Cleaning temporary directory")
         shutil.rmtree(temp_dir)
 
-# Listen for SIGTERM signal, so we can properly cleanup and and terminate the child process
+# Listen for SIGTERM signal, so we can properly cleanup and and terminate the child processes
 def handle_sigterm(signum, frame):
     clean_temp_dir()
-    p.terminate()
+    for p in processes:
+        p.terminate()
 signal.signal(signal.SIGTERM, handle_sigterm)
 
 try:
-    p.wait()
+    for p in processes:
+        p.wait()
 except KeyboardInterrupt:
-    try:
-        p.terminate()
-    except OSError:
-        pass
-    p.wait()
+    for p in processes:
+        try:
+            p.terminate()
+        except OSError:
+            pass
+    for p in processes:
+        p.wait()
 
 # Clean up
 clean_temp_dir()
 
-exit(p.returncode)
+# Report the first failure of any of the processes
+exit(next((p.returncode for p in processes if p.returncode != 0), 0))
@@ -0,0 +1,61 @@
+"""
+Compares a cold scene load with restoring the scene from a main.Checkpoint snapshot.
+
+The given config is run three times:
+1. unchanged (cold load)
+2. with a main.Checkpoint inserted after the given module, which saves the snapshot (cold load + saving)
+3. again with the checkpoint, which now skips the loaders and restores the snapshot
+
+Usage: python scripts/benchmark_checkpoint.py examples/front_3d/config.yaml <args> --checkpoint_after 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+parser = argparse.ArgumentParser("Benchmarks the scene snapshot restore of main.Checkpoint against a cold load")
+parser.add_argument('config', help="Path to the config file, which should be benchmarked.")
+parser.add_argument('args', nargs='*', help="The placeholder arguments of the config.")
+parser.add_argument('--checkpoint_after', type=int, required=True, help="Index of the module (starting with 0 for the main.Initializer) after which the checkpoint is inserted, usually the last loader or constructor module.")
+parser.add_argument('--runs', type=int, default=1, help="How often each variant is timed, the mean is reported.")
+args = parser.parse_args()
+
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+with open(args.config, "r") as f:
+    config = yaml.safe_load(f)
+
+
+def time_run(config_path):
+    """ Runs BlenderProc with the given config and returns the wall time in seconds. """
+    start = time.time()
+    subprocess.run([sys.executable, os.path.join(repo_root, "run.py"), os.path.abspath(config_path)] + args.args, check=True, cwd=repo_root)
+    return time.time() - start
+
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    snapshot_path = os.path.join(temp_dir, "snapshot.blend")
+    # json is valid yaml, so the modified config can be written via json
+    checkpoint_config = dict(config)
+    checkpoint_config["modules"] = list(config["modules"])
+    checkpoint_config["modules"].insert(args.checkpoint_after + 1, {"module": "main.Checkpoint", "config": {"path": snapshot_path}})
+    checkpoint_config_path = os.path.join(temp_dir, "config_with_checkpoint.yaml")
+    with open(checkpoint_config_path, "w") as f:
+        json.dump(checkpoint_config, f)
+
+    cold_times, save_times, restore_times = [], [], []
+    for _ in range(args.runs):
+        cold_times.append(time_run(args.config))
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+        save_times.append(time_run(checkpoint_config_path))
+        restore_times.append(time_run(checkpoint_config_path))
+
+    print("Snapshot size: {:.1f} MB".format(os.path.getsize(snapshot_path) / 1024 / 1024))
+
+for name, times in [("cold load", cold_times), ("cold load + saving the snapshot", save_times), ("restoring the snapshot", restore_times)]:
+    print("{:<35} {:8.2f}s".format(name, sum(times) / len(times)))
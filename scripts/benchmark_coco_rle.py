@@ -0,0 +1,81 @@
+"""
+Checks the numpy based COCO run length encoding against the previous itertools.groupby implementation (and against
+pycocotools, if installed) and measures both on masks of varying density.
+
+Usage: python run.py scripts/benchmark_coco_rle.py [<height> <width>] [<repetitions>]
+"""
+from src.utility.SetupUtility import SetupUtility
+SetupUtility.setup([])
+
+import sys
+import time
+from itertools import groupby
+
+import numpy as np
+
+from src.utility.CocoWriterUtility import CocoWriterUtility
+
+height, width = (int(sys.argv[1]), int(sys.argv[2])) if len(sys.argv) > 2 else (1080, 1920)
+repetitions = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+
+def groupby_rle(binary_mask):
+    """ The previous implementation of CocoWriterUtility.binary_mask_to_rle(). """
+    rle = {'counts': [], 'size': list(binary_mask.shape)}
+    counts = rle.get('counts')
+    for i, (value, elements) in enumerate(groupby(binary_mask.ravel(order='F'))):
+        if i == 0 and value == 1:
+            counts.append(0)
+        counts.append(len(list(elements)))
+    return rle
+
+
+try:
+    from pycocotools import mask as coco_mask
+except ImportError:
+    coco_mask = None
+    print("pycocotools is not installed, the compressed encoding is only checked for being decodable by itself")
+
+random_state = np.random.RandomState(0)
+y, x = np.mgrid[0:height, 0:width]
+masks = {
+    "empty": np.zeros((height, width), dtype=np.int64),
+    "full": np.ones((height, width), dtype=np.int64),
+    "small object": np.where((x - width * 0.3) ** 2 + (y - height * 0.6) ** 2 < (height * 0.05) ** 2, 1, 0),
+    "large object": np.where((x - width * 0.5) ** 2 + (y - height * 0.5) ** 2 < (height * 0.4) ** 2, 1, 0),
+    "stripes": np.where((x // 7 + y // 5) % 2 == 0, 1, 0),
+    "noise 10%": np.where(random_state.rand(height, width) < 0.1, 1, 0),
+    "noise 50%": np.where(random_state.rand(height, width) < 0.5, 1, 0),
+    # Small masks hit the edge cases, e.g. a single pixel or runs of one pixel
+    "1x1 set": np.ones((1, 1), dtype=np.int64),
+    "1x1 unset": np.zeros((1, 1), dtype=np.int64),
+    "3x2 alternating": np.array([[1, 0], [0, 1], [1, 0]])
+}
+
+print("{:<18} {:>8} {:>14} {:>12} {:>16} {:>8}".format("mask", "runs", "groupby [ms]", "numpy [ms]",
+                                                      "compressed [ms]", "speedup"))
+for name, binary_mask in masks.items():
+    expected = groupby_rle(binary_mask)
+    rle = CocoWriterUtility.binary_mask_to_rle(binary_mask)
+    if rle != expected:
+        raise Exception("The numpy encoding of the mask {} differs from the groupby encoding.".format(name))
+    compressed_rle = CocoWriterUtility.binary_mask_to_rle(binary_mask, compressed=True)
+    if coco_mask is not None:
+        reference = coco_mask.encode(np.asfortranarray(binary_mask.astype(np.uint8)))
+        if compressed_rle["counts"] != reference["counts"].decode("ascii") or \
+                compressed_rle["size"] != list(reference["size"]):
+            raise Exception("The compressed encoding of the mask {} differs from pycocotools.".format(name))
+        if not np.array_equal(coco_mask.decode(compressed_rle), binary_mask):
+            raise Exception("The compressed encoding of the mask {} can not be decoded by pycocotools.".format(name))
+
+    timings = []
+    for encode in [groupby_rle, CocoWriterUtility.binary_mask_to_rle,
+                   lambda mask: CocoWriterUtility.binary_mask_to_rle(mask, compressed=True)]:
+        start = time.time()
+        for _ in range(repetitions):
+            encode(binary_mask)
+        timings.append((time.time() - start) / repetitions)
+    print("{:<18} {:8d} {:14.2f} {:12.2f} {:16.2f} {:7.1f}x".format(name, len(rle["counts"]), timings[0] * 1000,
+                                                                   timings[1] * 1000, timings[2] * 1000,
+                                                                   timings[0] / max(timings[1], 1e-9)))
+print("All encodings are equal")
@@ -0,0 +1,43 @@
+"""
+Measures the sampling throughput of the Shell sampler with and without the memoized config lookups.
+
+The sampler reads all its parameters from its config on every sample. Each variant is measured with flat parameters
+and with parameters which are found via the global config.
+
+Usage: python run.py scripts/benchmark_config_access.py [<amount of samples>]
+"""
+from src.utility.SetupUtility import SetupUtility
+SetupUtility.setup([])
+
+import sys
+import time
+
+from src.main.GlobalStorage import GlobalStorage
+from src.provider.sampler.Shell import Shell
+from src.utility.Config import Config
+
+amount_of_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+sampler_config = {
+    "center": [0, 0, 0],
+    "radius_min": 1,
+    "radius_max": 4,
+    "elevation_min": 1,
+    "elevation_max": 89
+}
+# The same sampler, but the radius and elevation are read via the fallback to the global config
+GlobalStorage.init_global(Config({key: value for key, value in sampler_config.items() if key != "center"}))
+variants = {
+    "local parameters": Shell(Config(dict(sampler_config))),
+    "global parameters": Shell(Config({"center": [0, 0, 0]}))
+}
+
+for name, sampler in variants.items():
+    for use_memoization in [False, True]:
+        Config.use_memoization = use_memoization
+        start = time.time()
+        for _ in range(amount_of_samples):
+            sampler.run()
+        duration = time.time() - start
+        print("{:<20} memoization {:<5}: {:10.0f} samples/s".format(name, "on" if use_memoization else "off", amount_of_samples / duration))
+Config.use_memoization = True
@@ -0,0 +1,82 @@
+"""
+Compares the decoding time of .exr images via imageio against load_image() and the parallel load_images().
+
+load_image() only uses its fast path, if the OpenEXR package is installed, e.g. via SetupUtility.setup_pip(["OpenEXR"])
+or the pip setup in a config. Without .exr files given, synthetic half float distance, normals and segmentation images
+are written via blender. Real outputs can be kept by running a config with --keep-temp-dir.
+
+Usage: python run.py scripts/benchmark_exr_decoding.py [<exr files>]
+"""
+from src.utility.SetupUtility import SetupUtility
+SetupUtility.setup(["imageio"])
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import bpy
+import imageio
+import numpy as np
+
+from src.utility.BlenderUtility import load_image, load_images
+
+repetitions = 5
+temp_dir = tempfile.mkdtemp()
+
+if len(sys.argv) > 1:
+    groups = {"given files": sys.argv[1:]}
+else:
+    height, width = 720, 1280
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    distance = 2 + 10 * x / width + np.sin(y / 30)
+    normals = np.stack([np.sin(x / 50), np.cos(y / 70), np.ones_like(x)], axis=-1) * 0.5 + 0.5
+    segmentation = ((x // 64) + (y // 64) * 20)
+    synthetic = {
+        "distance": np.stack([distance] * 3, axis=-1),
+        "normals": normals,
+        "segmentation": np.stack([segmentation] * 3, axis=-1)
+    }
+
+    # Write the images like the renderers do it: half float exr
+    image_settings = bpy.context.scene.render.image_settings
+    image_settings.file_format = "OPEN_EXR"
+    image_settings.color_depth = "16"
+    image_settings.color_mode = "RGB"
+    groups = {}
+    for name, data in synthetic.items():
+        image = bpy.data.images.new(name, width, height, alpha=False, float_buffer=True)
+        # Blender stores the rows from bottom to top and always uses four channels
+        pixels = np.concatenate([data[::-1], np.ones((height, width, 1), dtype=np.float32)], axis=-1)
+        image.pixels.foreach_set(pixels.ravel())
+        groups[name] = []
+        for frame in range(8):
+            path = os.path.join(temp_dir, "{}_{:04d}.exr".format(name, frame))
+            image.save_render(path, scene=bpy.context.scene)
+            groups[name].append(path)
+
+try:
+    import OpenEXR
+    print("OpenEXR is installed, load_image() uses the fast path")
+except ImportError:
+    print("OpenEXR is not installed, load_image() falls back to imageio")
+
+variants = {
+    "imageio": lambda paths: [imageio.imread(path)[:, :, :3] for path in paths],
+    "load_image": lambda paths: [load_image(path) for path in paths],
+    "load_image, float16": lambda paths: [load_image(path, keep_half_float=True) for path in paths],
+    "load_images, 4 threads": lambda paths: load_images(paths),
+    "load_images, 4 threads, float16": lambda paths: load_images(paths, keep_half_float=True)
+}
+
+print("{:<15} {:<32} {:>15}".format("images", "variant", "per image [ms]"))
+for name, paths in groups.items():
+    for variant_name, variant in variants.items():
+        start = time.time()
+        for _ in range(repetitions):
+            variant(paths)
+        per_image = (time.time() - start) / repetitions / len(paths)
+        print("{:<15} {:<32} {:15.2f}".format(name, variant_name, per_image * 1000))
+
+shutil.rmtree(temp_dir)
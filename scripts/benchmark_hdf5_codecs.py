@@ -0,0 +1,74 @@
+"""
+Measures write time, read time and file size of all hdf5 codecs on representative outputs.
+
+The outputs are taken from the given hdf5 file (e.g. one written by the Hdf5Writer), otherwise synthetic colors,
+distance, normals and segmap images are used. Every codec is written via the same code path as the writers, the
+float16 variants are lossy and only applied to float outputs.
+
+Usage: python run.py scripts/benchmark_hdf5_codecs.py [<hdf5 file>] [<repetitions>]
+"""
+from src.utility.SetupUtility import SetupUtility
+SetupUtility.setup(["h5py"])
+
+import os
+import sys
+import tempfile
+import time
+
+import h5py
+import numpy as np
+
+from src.utility.WriterUtility import WriterUtility
+
+repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+if len(sys.argv) > 1:
+    with h5py.File(sys.argv[1], "r") as file:
+        outputs = {key: np.array(file[key]) for key in file.keys() if file[key].ndim > 1}
+else:
+    # Smooth images with some noise, similar to rendered outputs
+    height, width = 512, 512
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    noise = np.random.RandomState(0).normal(0, 0.01, (height, width)).astype(np.float32)
+    normals = np.stack([np.sin(x / 50), np.cos(y / 70), np.ones_like(x)], axis=-1) + noise[..., None]
+    outputs = {
+        "colors": (np.stack([x / width, y / height, 0.5 + noise * 10], axis=-1).clip(0, 1) * 255).astype(np.uint8),
+        "distance": 2 + x / width + np.sin(y / 30) + noise,
+        "normals": normals / np.linalg.norm(normals, axis=-1, keepdims=True),
+        "segmap": ((x // 64) + (y // 64) * 8).astype(np.uint8)
+    }
+
+codecs = {
+    "none": {"compression": "none"},
+    "lzf": {"compression": "lzf"},
+    "lzf + shuffle": {"compression": "lzf", "shuffle": True},
+    "gzip 1": {"compression": "gzip", "compression_level": 1},
+    "gzip 4": {"compression": "gzip", "compression_level": 4},
+    "gzip 9": {"compression": "gzip", "compression_level": 9},
+    "gzip 4 + shuffle": {"compression": "gzip", "compression_level": 4, "shuffle": True},
+    "gzip 4 + shuffle, float16": {"compression": "gzip", "compression_level": 4, "shuffle": True, "dtype": "float16"},
+    "lzf + shuffle, float16": {"compression": "lzf", "shuffle": True, "dtype": "float16"}
+}
+
+print("{:<12} {:<26} {:>10} {:>10} {:>12}".format("key", "codec", "write [ms]", "read [ms]", "size [KB]"))
+with tempfile.TemporaryDirectory() as temp_dir:
+    hdf5_path = os.path.join(temp_dir, "benchmark.hdf5")
+    for key, data in outputs.items():
+        for name, settings in codecs.items():
+            if "dtype" in settings and data.dtype.kind != "f":
+                continue
+
+            write_time, read_time = 0, 0
+            for _ in range(repetitions):
+                start = time.time()
+                WriterUtility._write_hdf5_file(hdf5_path, [(key, data)], {key: settings})
+                write_time += time.time() - start
+
+                start = time.time()
+                with h5py.File(hdf5_path, "r") as file:
+                    np.array(file[key])
+                read_time += time.time() - start
+
+            print("{:<12} {:<26} {:10.2f} {:10.2f} {:12.1f}".format(key, name, write_time / repetitions * 1000,
+                                                                    read_time / repetitions * 1000,
+                                                                    os.path.getsize(hdf5_path) / 1024))
@@ -0,0 +1,137 @@
+"""
+Measures the encode time, size and decode time of all file formats and codecs the renderer can write.
+
+A fixed scene made of primitives is rendered on the CPU once per resolution. Its color image (the Render Result) and
+its distance, depth and normals images are then encoded with every format, codec and depth via blender. The files
+are decoded via load_image(). The decoded images are compared to the ones of the default settings to find the
+lossless options. At the end, the fastest lossless option (encode + decode) per output key is printed in the
+format of RendererUtility.auto_output_formats, which is used by the file format or codec "auto".
+
+Run it on the same file system as the temporary directory, e.g. /dev/shm, as the results depend heavily on it.
+
+Usage: python run.py scripts/benchmark_output_formats.py [<temp dir>] [<resolutions, e.g. 640x480 1280x720>]
+"""
+from src.utility.SetupUtility import SetupUtility
+SetupUtility.setup(["imageio"])
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import bpy
+import numpy as np
+from mathutils import Vector
+
+from src.utility.BlenderUtility import load_image
+from src.utility.CameraUtility import CameraUtility
+from src.utility.Initializer import Initializer
+from src.utility.LightUtility import Light
+from src.utility.MathUtility import MathUtility
+from src.utility.MeshObjectUtility import MeshObject
+from src.utility.RendererUtility import RendererUtility
+from src.utility.Utility import Utility
+
+repetitions = 3
+temp_dir = tempfile.mkdtemp(dir=sys.argv[1] if len(sys.argv) > 1 else None)
+resolutions = [tuple(int(size) for size in arg.split("x")) for arg in sys.argv[2:]] \
+    if len(sys.argv) > 2 else [(320, 240), (640, 480), (1280, 720)]
+
+# The options per kind of output: (name, file format, color depth, codec, is the default setting)
+color_variants = [("PNG 8 bit, compression {}".format(level), "PNG", "8", level, level == 15)
+                  for level in [0, 15, 50, 100]]
+color_variants += [("JPEG, quality 95", "JPEG", "8", None, False)]
+exr_variants = [("EXR half, {}".format(codec), "OPEN_EXR", "16", codec, codec == "ZIP")
+                for codec in ["NONE", "ZIP", "ZIPS", "PIZ", "RLE", "PXR24", "B44", "DWAA"]]
+exr_variants += [("EXR float, {}".format(codec), "OPEN_EXR", "32", codec, False) for codec in ["NONE", "ZIP"]]
+
+# A fixed scene of primitives
+Initializer.init(compute_device="CPU")
+RendererUtility.init()
+RendererUtility.set_samples(16)
+RendererUtility.set_denoiser(None)
+ground = MeshObject.create_primitive("PLANE")
+ground.set_scale([5, 5, 1])
+for index, shape in enumerate(["CUBE", "SPHERE", "CYLINDER", "CONE", "MONKEY"]):
+    primitive = MeshObject.create_primitive(shape)
+    primitive.set_location([(index - 2) * 2.2, (index % 2) * 1.5, 1])
+light = Light()
+light.set_location([4, -4, 6])
+light.set_energy(1000)
+cam2world = MathUtility.t_mat_from_R_t(CameraUtility.rotation_from_forward_vec(Vector([0, 1, -0.6])), [0, -9, 6])
+CameraUtility.add_camera_pose(cam2world)
+
+Utility.temp_dir = temp_dir
+RendererUtility.enable_distance_output(temp_dir)
+RendererUtility.enable_depth_output(temp_dir)
+RendererUtility.enable_normals_output(temp_dir)
+RendererUtility.set_output_format("PNG")
+
+# Total encode + decode time of the lossless variants per output key and variant
+total_times = defaultdict(lambda: defaultdict(float))
+lossless = defaultdict(lambda: defaultdict(lambda: True))
+image_settings = bpy.context.scene.render.image_settings
+print("{:<11} {:<10} {:<32} {:>11} {:>11} {:>10} {:>9}".format("resolution", "key", "variant", "encode [ms]",
+                                                             "decode [ms]", "size [KB]", "lossless"))
+for width, height in resolutions:
+    bpy.context.scene.render.resolution_x, bpy.context.scene.render.resolution_y = width, height
+    RendererUtility.render(temp_dir, return_data=False)
+
+    # The color image is encoded from the render result, like blender does it while rendering
+    sources = {"colors": (bpy.data.images["Render Result"], color_variants)}
+    for key in ["distance", "depth", "normals"]:
+        image = bpy.data.images.load(Utility.find_registered_output_by_key(key)["path"] % 0)
+        image.colorspace_settings.name = "Non-Color"
+        sources[key] = (image, exr_variants)
+
+    for key, (image, variants) in sources.items():
+        reference = None
+        for name, file_format, color_depth, codec, is_default in sorted(variants, key=lambda variant: not variant[4]):
+            image_settings.file_format = file_format
+            image_settings.color_depth = color_depth
+            image_settings.color_mode = "RGB"
+            if file_format == "PNG":
+                image_settings.compression = codec
+            elif file_format == "OPEN_EXR":
+                image_settings.exr_codec = codec
+            path = os.path.join(temp_dir, "benchmark" + RendererUtility.map_file_format_to_file_ending(file_format))
+
+            start = time.time()
+            for _ in range(repetitions):
+                image.save_render(path, scene=bpy.context.scene)
+            encode_time = (time.time() - start) / repetitions
+
+            start = time.time()
+            for _ in range(repetitions):
+                decoded = load_image(path)
+            decode_time = (time.time() - start) / repetitions
+
+            # The default settings are lossless, all others are compared against them
+            if reference is None:
+                reference = decoded
+            is_lossless = decoded.shape == reference.shape and np.array_equal(decoded.astype(np.float32),
+                                                                              reference.astype(np.float32))
+            lossless[key][name] &= is_lossless
+            total_times[key][(name, file_format, codec)] += encode_time + decode_time
+            print("{:<11} {:<10} {:<32} {:11.2f} {:11.2f} {:10.1f} {:>9}".format(
+                "{}x{}".format(width, height), key, name, encode_time * 1000, decode_time * 1000,
+                os.path.getsize(path) / 1024, "yes" if is_lossless else "no"))
+
+        if key != "colors":
+            bpy.data.images.remove(image)
+
+# The float EXR variants are lossless as well, but change the data type of the outputs
+auto_output_formats = {}
+for key, times in total_times.items():
+    candidates = [(total_time, name, file_format, codec) for (name, file_format, codec), total_time in times.items()
+                  if lossless[key][name] and "float" not in name]
+    _, name, file_format, codec = min(candidates)
+    auto_output_formats[key] = {"file_format": file_format, "codec": codec}
+    print("Fastest lossless option for {}: {}".format(key, name))
+# The diffuse color is written like the colors
+auto_output_formats["diffuse"] = auto_output_formats["colors"]
+print("RendererUtility.auto_output_formats = {}".format(auto_output_formats))
+
+shutil.rmtree(temp_dir)
@@ -0,0 +1,39 @@
+"""
+Measures the start up time of BlenderProc by running a config without any modules.
+
+This mainly measures starting blender, the pip setup and importing the pipeline. Run it once before and once after
+deleting custom-python-packages/blenderproc_pip_manifest.json inside the blender installation, to see the time spent
+in pip.
+
+Usage: python scripts/benchmark_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser("Benchmarks the start up time of BlenderProc with an empty config")
+parser.add_argument('--runs', type=int, default=5, help="How often BlenderProc is started.")
+parser.add_argument('run_args', nargs='*', help="Additional arguments for run.py, e.g. --custom-blender-path.")
+args = parser.parse_args()
+
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    config_path = os.path.join(temp_dir, "empty_config.yaml")
+    # json is valid yaml
+    with open(config_path, "w") as f:
+        json.dump({"version": 3, "setup": {}, "modules": []}, f)
+
+    times = []
+    for i in range(args.runs):
+        start = time.time()
+        subprocess.run([sys.executable, os.path.join(repo_root, "run.py"), config_path] + args.run_args, check=True,
+                       cwd=repo_root, stdout=subprocess.DEVNULL)
+        times.append(time.time() - start)
+        print("Run {}: {:.2f}s".format(i + 1, times[-1]))
+
+print("min: {:.2f}s, mean: {:.2f}s, max: {:.2f}s".format(min(times), sum(times) / len(times), max(times)))
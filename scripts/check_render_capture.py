@@ -0,0 +1,113 @@
+"""
+Checks that the color images captured in memory (RendererUtility.render with capture_in_memory) are equal to the
+rendered files, byte for byte.
+
+A fixed scene made of primitives is rendered on the CPU into files and captured in memory for every file format and
+color depth. Both use the Standard view transform and the dithering of the files is disabled, as it is random. The
+files are decoded via load_image(), the captured PNG images are also checked after writing them via
+RenderCaptureUtility.save_frame(). JPEG is not checked, as the lossy encoders of blender and imageio differ. At the
+start, it is checked that capturing blender's default view transform Filmic fails, unless capture_view_transform is
+set, and that the view transform is restored afterwards.
+
+Usage: python run.py scripts/check_render_capture.py [<temp dir>]
+"""
+from src.utility.SetupUtility import SetupUtility
+SetupUtility.setup(["imageio"])
+
+import os
+import shutil
+import sys
+import tempfile
+
+import bpy
+import numpy as np
+from mathutils import Vector
+
+from src.utility.BlenderUtility import load_image
+from src.utility.CameraUtility import CameraUtility
+from src.utility.Initializer import Initializer
+from src.utility.LightUtility import Light
+from src.utility.MathUtility import MathUtility
+from src.utility.MeshObjectUtility import MeshObject
+from src.utility.RenderCaptureUtility import RenderCaptureUtility
+from src.utility.RendererUtility import RendererUtility
+from src.utility.Utility import Utility
+
+temp_dir = tempfile.mkdtemp(dir=sys.argv[1] if len(sys.argv) > 1 else None)
+
+# A fixed scene of primitives seen from two cameras
+Initializer.init(compute_device="CPU")
+RendererUtility.init()
+RendererUtility.set_samples(16)
+RendererUtility.set_denoiser(None)
+ground = MeshObject.create_primitive("PLANE")
+ground.set_scale([5, 5, 1])
+for index, shape in enumerate(["CUBE", "SPHERE", "CYLINDER", "CONE", "MONKEY"]):
+    primitive = MeshObject.create_primitive(shape)
+    primitive.set_location([(index - 2) * 2.2, (index % 2) * 1.5, 1])
+light = Light()
+light.set_location([4, -4, 6])
+light.set_energy(1000)
+for location in [[0, -9, 6], [3, -8, 5]]:
+    forward = Vector([-location[0], -location[1], 1 - location[2]])
+    CameraUtility.add_camera_pose(MathUtility.t_mat_from_R_t(CameraUtility.rotation_from_forward_vec(forward),
+                                                             location))
+bpy.context.scene.render.resolution_x, bpy.context.scene.render.resolution_y = 320, 240
+Utility.temp_dir = temp_dir
+frames = range(bpy.context.scene.frame_start, bpy.context.scene.frame_end)
+
+# Capturing the default view transform of blender fails, unless the view transform is replaced explicitly
+view_settings = bpy.context.scene.view_settings
+view_settings.view_transform = "Filmic"
+RendererUtility.set_output_format("PNG")
+try:
+    RendererUtility.render(temp_dir, "filmic_", "filmic", return_data=False, capture_in_memory=True)
+except Exception as e:
+    print("Capturing Filmic failed as expected: " + str(e))
+else:
+    raise Exception("Capturing the Filmic view transform did not fail.")
+RendererUtility.render(temp_dir, "filmic_", "filmic", return_data=False, capture_in_memory=True,
+                       capture_view_transform="Standard")
+if view_settings.view_transform != "Filmic":
+    raise Exception("The view transform was not restored after capturing.")
+
+view_settings.view_transform = "Standard"
+bpy.context.scene.render.dither_intensity = 0
+mismatches = 0
+for file_format, color_depth in [("PNG", 8), ("PNG", 16), ("OPEN_EXR", 16), ("OPEN_EXR", 32)]:
+    name = "{}_{}".format(file_format.lower(), color_depth)
+    RendererUtility.set_output_format(file_format, color_depth)
+    RendererUtility.render(temp_dir, name + "_file_", name + "_file", return_data=False)
+    RendererUtility.render(temp_dir, name + "_memory_", name + "_memory", return_data=False, capture_in_memory=True)
+    file_path = Utility.find_registered_output_by_key(name + "_file")["path"]
+    for frame in frames:
+        expected = load_image(file_path % frame)
+        captured = RenderCaptureUtility.get_frame(name + "_memory", frame)
+        if file_format == "OPEN_EXR" and color_depth == 16:
+            # The file stores half floats
+            captured = captured.astype(np.float16)
+        elif file_format == "PNG":
+            # The captured image is compared after writing it as well
+            saved_path = os.path.join(temp_dir, "{}_saved_{:04d}.png".format(name, frame))
+            RenderCaptureUtility.save_frame(name + "_memory", frame, saved_path)
+            saved = load_image(saved_path)
+            if saved.tobytes() != captured.tobytes():
+                raise Exception("The saved image of {} frame {} differs from the captured one.".format(name, frame))
+        equal = expected.shape == captured.shape and expected.dtype == captured.dtype and \
+            expected.tobytes() == captured.tobytes()
+        if not equal:
+            mismatches += 1
+            if expected.shape == captured.shape:
+                difference = np.abs(expected.astype(np.float64) - captured.astype(np.float64))
+                print("{} frame {}: {} differing values, maximum difference {}".format(
+                    name, frame, np.count_nonzero(difference), difference.max()))
+            else:
+                print("{} frame {}: shape {} {} differs from the file {} {}".format(
+                    name, frame, captured.shape, captured.dtype, expected.shape, expected.dtype))
+        else:
+            print("{} frame {}: equal".format(name, frame))
+
+shutil.rmtree(temp_dir)
+if mismatches:
+    raise Exception("{} captured images differ from the rendered files.".format(mismatches))
+print("All captured images are equal to the rendered files")
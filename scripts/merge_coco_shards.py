@@ -0,0 +1,70 @@
+"""
+Merges the shards written by the CocoAnnotationsWriter with sharded_output into one coco_annotations.json.
+
+The shards are read one after another, so only one shard has to fit into memory. Their images are written directly
+into the merged file, their annotations are collected in a temporary file and appended after the last shard. The ids
+are already final in the shards and are not changed.
+
+Usage: python scripts/merge_coco_shards.py <coco_data dir> [--output <path>] [--delete_shards]
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+parser = argparse.ArgumentParser()
+parser.add_argument('coco_data_dir', help='path to the folder containing coco_annotations_index.json and the shards')
+parser.add_argument('-o', '--output', dest='output', default=None,
+                    help='path of the merged file, default: coco_annotations.json inside the coco_data folder')
+parser.add_argument('--delete_shards', action='store_true',
+                    help='removes the index file and the shards after merging')
+args = parser.parse_args()
+
+index_path = os.path.join(args.coco_data_dir, "coco_annotations_index.json")
+output_path = args.output if args.output is not None else os.path.join(args.coco_data_dir, "coco_annotations.json")
+with open(index_path, 'r') as f:
+    index = json.load(f)
+
+
+def write_items(file, items, first):
+    """ Writes the given items as elements of a json list, separated by commas from the previous ones. """
+    for item in items:
+        if not first:
+            file.write(", ")
+        json.dump(item, file)
+        first = False
+    return first
+
+
+amount_of_images, amount_of_annotations = 0, 0
+# The merged file is first written next to the target, so an existing file is only replaced by a complete one
+with open(output_path + ".tmp", 'w') as output, \
+        tempfile.TemporaryFile('w+', dir=os.path.dirname(os.path.abspath(output_path))) as annotations_file:
+    output.write('{"info": ' + json.dumps(index["info"]) + ', "licenses": ' + json.dumps(index["licenses"]) +
+                 ', "categories": ' + json.dumps(index["categories"]) + ', "images": [')
+    first_image, first_annotation = True, True
+    for shard in index["shards"]:
+        with open(os.path.join(args.coco_data_dir, shard["file"]), 'r') as f:
+            shard_data = json.load(f)
+        if len(shard_data["images"]) != shard["images"] or len(shard_data["annotations"]) != shard["annotations"]:
+            raise Exception("The shard {} does not match the index, it might not have been written completely."
+                            .format(shard["file"]))
+        first_image = write_items(output, shard_data["images"], first_image)
+        first_annotation = write_items(annotations_file, shard_data["annotations"], first_annotation)
+        amount_of_images += shard["images"]
+        amount_of_annotations += shard["annotations"]
+        print("Merged " + shard["file"])
+
+    output.write('], "annotations": [')
+    annotations_file.seek(0)
+    shutil.copyfileobj(annotations_file, output)
+    output.write(']}')
+os.replace(output_path + ".tmp", output_path)
+print("Wrote {} images and {} annotations from {} shards to {}".format(amount_of_images, amount_of_annotations,
+                                                                       len(index["shards"]), output_path))
+
+if args.delete_shards:
+    for shard in index["shards"]:
+        os.remove(os.path.join(args.coco_data_dir, shard["file"]))
+    os.remove(index_path)
@@ -0,0 +1,90 @@
+import os
+
+import bpy
+
+from src.main.Module import Module
+from src.utility.Utility import Utility
+
+
+class CheckpointModule(Module):
+    """ Saves the scene into a .blend snapshot or restores the scene from it.
+
+    Place this module directly after the expensive loader and constructor modules. If the snapshot does not exist yet,
+    the current scene is saved to it. If the snapshot already exists when the pipeline starts, all modules before the
+    checkpoint (except the main.Initializer) are skipped and the scene is restored from the snapshot instead, so the
+    json parsing and object importing is only done once per scene.
+
+    With `amount_of_variations` all modules after the checkpoint are executed multiple times. Before every further
+    variation the scene is restored from the snapshot, so each variation starts from the freshly loaded scene. Make
+    sure to set `append_to_existing_output` in the used writers, otherwise the variations overwrite each other.
+
+    Example:
+
+    .. code-block:: yaml
+
+        {
+          "module": "main.Checkpoint",
+          "config": {
+            "path": "<args:1>/snapshot.blend",
+            "amount_of_variations": 10
+          }
+        }
+
+    **Configuration**:
+
+    .. list-table::
+        :widths: 25 100 10
+        :header-rows: 1
+
+        * - Parameter
+          - Description
+          - Type
+        * - path
+          - The path of the .blend snapshot.
+          - string
+        * - amount_of_variations
+          - How often the modules after the checkpoint are executed, each time starting from the snapshot.
+            Default: 1.
+          - int
+        * - overwrite
+          - If true, an existing snapshot is not restored, instead all modules are executed and the snapshot is
+            overwritten. Default: False.
+          - bool
+    """
+
+    def __init__(self, config):
+        Module.__init__(self, config)
+        self._path = Utility.resolve_path(self.config.get_string("path"))
+        self.amount_of_variations = self.config.get_int("amount_of_variations", 1)
+        # Remember if the snapshot should be restored, as the snapshot is created during the run
+        self._restore_snapshot = os.path.exists(self._path) and not self.config.get_bool("overwrite", False)
+
+    def should_restore(self) -> bool:
+        """ Returns whether the snapshot existed at the beginning of the pipeline and will be restored.
+
+        In that case the pipeline skips the modules before this checkpoint.
+
+        :return: True, if the snapshot will be restored.
+        """
+        return self._restore_snapshot
+
+    def save(self):
+        """ Saves the current scene into the snapshot. """
+        if os.path.dirname(self._path):
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        # Save a copy, so the path of the currently opened file does not change
+        bpy.ops.wm.save_as_mainfile(filepath=self._path, copy=True)
+        print("Saved scene snapshot to " + self._path)
+
+    def restore(self):
+        """ Replaces the current scene with the scene stored in the snapshot. """
+        bpy.ops.wm.open_mainfile(filepath=self._path, load_ui=False)
+        print("Restored scene snapshot from " + self._path)
+
+    def run(self):
+        if self._restore_snapshot:
+            self.restore()
+        else:
+            self.save()
+            # All further variations start from the snapshot
+            self._restore_snapshot = True
@@ -55,13 +55,28 @@ def init_global(global_config):
         :param global_config: the config to use
         """
         GlobalStorage._global_config = global_config
+        # Values memoized by other configs might have used the previous global config as fallback
+        global_config.invalidate_caches()
         for key, value in GlobalStorage._add_to_global_config_at_init.items():
             if not GlobalStorage._global_config.has_param(key):
-                GlobalStorage._global_config.data[key] = value
+                GlobalStorage._global_config.set(key, value)
             else:
                 raise RuntimeError("This key was already found in the global config: {} it is also used internally, "
                                    "please use another key!".format(key))
 
+    @staticmethod
+    def reset():
+        """
+        Removes all stored values and the global config, this is used to start a new pipeline run from a clean state,
+        e.g. for every line of a batch.
+        """
+        GlobalStorage._storage_dict = {}
+        GlobalStorage._global_config = None
+        GlobalStorage._add_to_global_config_at_init = {}
+        # Configs of the previous run must not use the removed global config as memoized fallback
+        from src.utility.Config import Config
+        Config.invalidate_caches()
+
     @staticmethod
     def add_to_config_before_init(key, value):
         """
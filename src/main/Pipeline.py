@@ -1,14 +1,25 @@
 
 import os
+import time
+
+import bpy
 
 from src.utility.ConfigParser import ConfigParser
 from src.utility.SetupUtility import SetupUtility
 from src.utility.Utility import Utility, Config
 from src.main.GlobalStorage import GlobalStorage
+from src.utility.ProfilerUtility import PipelineProfiler
+from src.utility.AsyncWriterUtility import AsyncWriterUtility
+from src.utility.TempOutputUtility import TempOutputUtility
+from src.utility.Hdf5ContainerUtility import Hdf5ContainerUtility
+from src.main.CheckpointModule import CheckpointModule
+from src.main.InitializerModule import InitializerModule
+from src.renderer.RendererInterface import RendererInterface
 
 class Pipeline:
 
-    def __init__(self, config_path, args, working_dir, temp_dir, avoid_output=False):
+    def __init__(self, config_path, args, working_dir, temp_dir, avoid_output=False, profile_path=None,
+                 cprofile_modules=None):
         """
         Inits the pipeline, by calling the constructors of all modules mentioned in the config.
 
@@ -18,6 +29,9 @@ def __init__(self, config_path, args, working_dir, temp_dir, avoid_output=False)
         :param working_dir: the directory where to put temporary files during the execution
         :param avoid_output: if this is true, all modules (renderers and writers) skip producing output. With this it is possible to debug \
                                properly.
+        :param profile_path: if given, a profile of the run is written to this path in the chrome trace format.
+        :param cprofile_modules: a list of module names, which should be additionally profiled via cProfile, \
+                                 only used if a profile_path is given.
         """
         Utility.working_dir = working_dir
 
@@ -27,17 +41,123 @@ def __init__(self, config_path, args, working_dir, temp_dir, avoid_output=False)
         # Setup pip packages specified in config
         SetupUtility.setup_pip(config["setup"]["pip"] if "pip" in config["setup"] else [])
 
+        # Stored in the frame index of hdf5 containers
+        GlobalStorage.set("source_config", " ".join([config_path] + list(args)))
+
         if avoid_output:
             GlobalStorage.add_to_config_before_init("avoid_output", True)
 
         Utility.temp_dir = Utility.resolve_path(temp_dir)
         os.makedirs(Utility.temp_dir, exist_ok=True)
 
-        self.modules = Utility.initialize_modules(config["modules"])
+        self.profiler = PipelineProfiler(Utility.resolve_path(profile_path), cprofile_modules) if profile_path is not None else None
+
+        # The writers declare which temporary outputs they read, while being initialized
+        TempOutputUtility.reset()
+        Hdf5ContainerUtility.reset()
+        self.modules = Utility.initialize_modules(config["modules"], self.profiler)
+
+    def _run_module(self, module_index, module):
+        """ Runs the given module and measures its execution time.
+
+        :param module_index: The index of the module inside the pipeline.
+        :param module: The module to run.
+        """
+        with Utility.BlockStopWatch("Running module " + module.__class__.__name__):
+            if self.profiler is not None:
+                self.profiler.run_module(module, module.__class__.__module__.replace("src.", "", 1), module_index)
+            else:
+                module.run()
+
+    def _run_modules(self, module_indices):
+        """ Runs the modules with the given indices, the renderers and all modules after them in render chunks.
+
+        If frames_per_render_chunk is set in the global config, the frames are split into chunks of that size. For
+        every chunk, the frame range of the scene is set to the chunk and all modules starting with the first
+        renderer are run, so the chunk is rendered, written and its temporary files are removed, before the next
+        chunk is rendered. The frame numbers are not changed, so the outputs are numbered as without chunks. The
+        modules after the first renderer should therefore only render and write, as they are run once per chunk.
+
+        :param module_indices: The indices of the modules to run.
+        """
+        frames_per_chunk = GlobalStorage.get_global_config().get_int("frames_per_render_chunk", 0) \
+            if GlobalStorage.has_param("frames_per_render_chunk") else 0
+        first_renderer = next((i for i in module_indices if isinstance(self.modules[i], RendererInterface)), None)
+        if frames_per_chunk <= 0 or first_renderer is None:
+            for module_index in module_indices:
+                self._run_module(module_index, self.modules[module_index])
+            return
+
+        for module_index in module_indices:
+            if module_index >= first_renderer:
+                break
+            self._run_module(module_index, self.modules[module_index])
+
+        scene = bpy.context.scene
+        frame_start, frame_end = scene.frame_start, scene.frame_end
+        chunk_starts = range(frame_start, frame_end, frames_per_chunk) if frame_end > frame_start else [frame_start]
+        try:
+            for chunk_index, chunk_start in enumerate(chunk_starts):
+                with Utility.BlockStopWatch("Running render chunk " + str(chunk_index)):
+                    # The writers append the frames of all chunks after the first one, see WriterInterface
+                    GlobalStorage.set("render_chunk", chunk_index)
+                    if self.profiler is not None:
+                        self.profiler.render_chunk = chunk_index
+                    scene.frame_start = chunk_start
+                    scene.frame_end = min(chunk_start + frames_per_chunk, frame_end)
+                    for module_index in module_indices:
+                        if module_index >= first_renderer:
+                            self._run_module(module_index, self.modules[module_index])
+        finally:
+            GlobalStorage.set("render_chunk", 0)
+            if self.profiler is not None:
+                self.profiler.render_chunk = None
+            scene.frame_start, scene.frame_end = frame_start, frame_end
+
+    def run(self, flush_async_writes=True):
+        """ Runs each module and measuring their execution time.
+
+        If the pipeline contains a main.Checkpoint, whose snapshot already exists, all modules before it are skipped
+        (except the main.Initializer), as the checkpoint restores the scene from its snapshot anyway. If the checkpoint
+        asks for multiple variations, the modules after it are run again for every further variation.
+
+        If frames_per_render_chunk is set in the global config, the frames are rendered and written in chunks,
+        see _run_modules().
+
+        If a profile path was given, the profile is also written, if the run fails.
+
+        :param flush_async_writes: If true, the pipeline waits at the end until all writes, which were submitted by
+                                   writers with async_write, have finished. In the batch mode, this is done after the
+                                   last line, so the writing of one line overlaps with the next line.
+        """
+        checkpoint_index = next((i for i, module in enumerate(self.modules) if isinstance(module, CheckpointModule)), None)
+
+        try:
+            with Utility.BlockStopWatch("Running blender pipeline"):
+                module_indices = []
+                for module_index, module in enumerate(self.modules):
+                    if checkpoint_index is not None and module_index < checkpoint_index and \
+                            self.modules[checkpoint_index].should_restore() and not isinstance(module, InitializerModule):
+                        print("Skipping module " + module.__class__.__name__ + ", the scene is restored from the checkpoint")
+                        continue
+                    module_indices.append(module_index)
+                self._run_modules(module_indices)
+
+                if checkpoint_index is not None:
+                    for variation in range(1, self.modules[checkpoint_index].amount_of_variations):
+                        with Utility.BlockStopWatch("Running variation " + str(variation)):
+                            if self.profiler is not None:
+                                self.profiler.variation = variation
+                            self._run_modules(list(range(checkpoint_index, len(self.modules))))
 
-    def run(self):
-        """ Runs each module and measuring their execution time. """
-        with Utility.BlockStopWatch("Running blender pipeline"):
-            for module in self.modules:
-                with Utility.BlockStopWatch("Running module " + module.__class__.__name__):
-                    module.run()
+                if flush_async_writes:
+                    with Utility.BlockStopWatch("Finishing pending writes"):
+                        start = time.time()
+                        AsyncWriterUtility.flush()
+                        if self.profiler is not None:
+                            self.profiler.add_event("flush_async_writes", "write", start, time.time() - start)
+        finally:
+            # Failed or aborted runs are the ones, which are most interesting to inspect
+            if self.profiler is not None:
+                self.profiler.variation = 0
+                self.profiler.save()
@@ -1,9 +1,13 @@
+from typing import Union
+
 import addon_utils
 import bpy
 
 from src.main.Module import Module
 from src.utility.Config import Config
+from src.utility.DefaultConfig import DefaultConfig
 from src.utility.RendererUtility import RendererUtility
+from src.utility.TempOutputUtility import TempOutputUtility
 
 
 class RendererInterface(Module):
@@ -114,7 +118,7 @@ class RendererInterface(Module):
           - bool
         * - cpu_threads
           - Set number of cpu cores used for rendering (1 thread is always used for coordination if more than one
-            cpu thread means GPU-only rendering). Default: 1
+            cpu thread means GPU-only rendering). Default: 1, or the share of cpu threads of one batch worker.
           - int
         * - render_normals
           - If true, the normals are also rendered. Default: False
@@ -128,11 +132,38 @@ class RendererInterface(Module):
         * - render_diffuse_color
           - If true, the diffuse color image are also rendered. Default: False
           - bool
+        * - temp_size_limit
+          - If the temporary files of all processes started by the same run.py call (e.g. the workers of a batch)
+            use more than this amount of MB, the renderer waits until the other processes have freed space, before
+            rendering. Other files on the same file system are not counted. Usually set in the global config.
+            Default: None (no limit)
+          - int
+        * - temp_size_limit_timeout
+          - The amount of seconds, after which the renderer stops waiting for space, if the usage has not
+            decreased meanwhile. Default: 300
+          - int
+        * - output_codec
+          - The exr codec (e.g. "ZIP", "PIZ" or "NONE") of the distance, depth and normals outputs. "auto" uses
+            the fastest lossless codec of each output key, see RendererUtility.auto_output_formats and
+            scripts/benchmark_output_formats.py. Default: None (blender's default).
+          - string
+        * - png_compression
+          - The png compression (0-100) of the diffuse color output, "auto" uses the fastest one. Default: None
+            (blender's default).
+          - int/string
+        * - frames_per_render_chunk
+          - Only read from the global config. If set, the frames are rendered in chunks of this size and every
+            chunk is rendered, written and its temporary files are removed, before the next chunk is rendered. All
+            modules starting with the first renderer are run once per chunk, the writers append the chunks to each
+            other. The frame numbers are kept. Default: None (all frames at once)
+          - int
     """
 
     def __init__(self, config: Config):
         Module.__init__(self, config)
         addon_utils.enable("render_auto_tile_size")
+        TempOutputUtility.size_limit_mb = self.config.get_int("temp_size_limit", None)
+        TempOutputUtility.size_limit_timeout = self.config.get_int("temp_size_limit_timeout", 300)
 
     def _configure_renderer(self, default_samples: int = 256, use_denoiser: bool = False,
                             default_denoiser: str = "Intel"):
@@ -157,7 +188,7 @@ def _configure_renderer(self, default_samples: int = 256, use_denoiser: bool = F
 
         # Set number of cpu cores used for rendering (1 thread is always used for coordination => 1
         # cpu thread means GPU-only rendering)
-        RendererUtility.set_cpu_threads(self.config.get_int("cpu_threads", 1))
+        RendererUtility.set_cpu_threads(self.config.get_int("cpu_threads", DefaultConfig.cpu_threads))
         
         print('Resolution: {}, {}'.format(bpy.context.scene.render.resolution_x, bpy.context.scene.render.resolution_y))
 
@@ -179,10 +210,13 @@ def _configure_renderer(self, default_samples: int = 256, use_denoiser: bool = F
 
     def _render(self, default_prefix: str, default_key: str, output_key_parameter_name: str = "output_key",
                 output_file_prefix_parameter_name: str = "output_file_prefix", enable_transparency: bool = False,
-                file_format: str = "PNG"):
+                file_format: str = "PNG", capture_in_memory: bool = False,
+                capture_view_transform: Union[str, None] = None):
         """ Renders each registered keypoint.
 
         :param default_prefix: The default prefix of the output files.
+        :param capture_in_memory: If true, the rendered images are kept in memory instead of being written to files.
+        :param capture_view_transform: If given, the view transform used while capturing the images in memory.
         """
         if self.config.get_bool("render_distance", False):
             RendererUtility.enable_distance_output(
@@ -191,35 +225,42 @@ def _render(self, default_prefix: str, default_key: str, output_key_parameter_na
                 self.config.get_string("distance_output_key", "distance"),
                 self.config.get_float("distance_start", 0.1),
                 self.config.get_float("distance_range", 25.0),
-                self.config.get_string("distance_falloff", "LINEAR")
+                self.config.get_string("distance_falloff", "LINEAR"),
+                self.config.get_raw_value("output_codec", None)
             )
 
         if self.config.get_bool("render_depth", False):
             RendererUtility.enable_depth_output(
                 self._determine_output_dir(),
                 self.config.get_string("depth_output_file_prefix", "depth_"),
-                self.config.get_string("depth_output_key", "depth")
+                self.config.get_string("depth_output_key", "depth"),
+                self.config.get_raw_value("output_codec", None)
             )
 
         if self.config.get_bool("render_normals", False):
             RendererUtility.enable_normals_output(
                 self._determine_output_dir(),
                 self.config.get_string("normals_output_file_prefix", "normals_"),
-                self.config.get_string("normals_output_key", "normals")
+                self.config.get_string("normals_output_key", "normals"),
+                self.config.get_raw_value("output_codec", None)
             )
 
         if self.config.get_bool("render_diffuse_color", False):
             RendererUtility.enable_diffuse_color_output(
                 self._determine_output_dir(),
                 self.config.get_string("diffuse_color_output_file_prefix", "diffuse_"),
-                self.config.get_string("diffuse_color_output_key", "diffuse")
+                self.config.get_string("diffuse_color_output_key", "diffuse"),
+                self.config.get_raw_value("png_compression", None)
             )
 
-        RendererUtility.set_output_format(file_format, enable_transparency=enable_transparency)
+        RendererUtility.set_output_format(file_format, enable_transparency=enable_transparency,
+                                          output_key=self.config.get_string(output_key_parameter_name, default_key))
         if not self._avoid_output:
             RendererUtility.render(
                 self._determine_output_dir(),
                 self.config.get_string(output_file_prefix_parameter_name, default_prefix),
                 self.config.get_string(output_key_parameter_name, default_key),
-                return_data=False
+                return_data=False,
+                capture_in_memory=capture_in_memory,
+                capture_view_transform=capture_view_transform
             )
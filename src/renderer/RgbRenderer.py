@@ -24,7 +24,8 @@ class RgbRenderer(RendererInterface):
             False.
           - bool
         * - image_type
-          - Image type of saved rendered images, Default: 'PNG'. Available: ['PNG','JPEG']
+          - Image type of saved rendered images, Default: 'PNG'. Available: ['PNG','JPEG', 'auto']. 'auto' uses the
+            fastest lossless format and codec, see RendererUtility.auto_output_formats.
           - str
         * - transparent_background
           - Whether to render the background as transparent or not, Default: False.
@@ -47,6 +48,19 @@ class RgbRenderer(RendererInterface):
             activated. If set to 1, this creates a pure motion blur effect, if set to 0 a pure rolling shutter
             effect, Default: 0.2
           - float
+        * - capture_in_memory
+          - If true, the rendered images are copied from blender's memory and handed to the writers directly,
+            instead of being written to files and read again. Only the Standard and Raw view transform are
+            supported for PNG and JPEG, blender's default Filmic requires setting capture_view_transform. Set it to False to get the files, e.g. for
+            debugging. Default: False.
+          - bool
+        * - capture_view_transform
+          - If set, the view transform used while capturing the images in memory, "Standard" or "Raw". Look,
+            exposure, gamma and curves are disabled meanwhile. Blender's default view transform Filmic can not be
+            captured, so set this to "Standard" to capture a Filmic scene, then the images look different from the
+            rendered files. Default: None (the color management of the scene is kept, which then has to use the
+            Standard or Raw view transform).
+          - string
     """
     def __init__(self, config):
         RendererInterface.__init__(self, config)
@@ -79,5 +93,7 @@ def run(self):
                 "rgb_",
                 "colors",
                 enable_transparency=self.config.get_bool("transparent_background", False),
-                file_format=self._image_type
+                file_format=self._image_type,
+                capture_in_memory=self.config.get_bool("capture_in_memory", False),
+                capture_view_transform=self.config.get_raw_value("capture_view_transform", None)
             )
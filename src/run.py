@@ -23,31 +23,136 @@
 # Read args
 argv = sys.argv
 batch_index_file = None
+batch_queue_dir = None
+worker_id = None
+cpu_threads = None
+batch_manifest = None
+resume_batch = "--resume" in argv
+reuse_assets = "--reuse-assets" in argv
+profile_path = None
+cprofile_modules = None
 
 if "--batch-process" in argv:
     batch_index_file = argv[argv.index("--batch-process") + 1]
+# Only given, if the batch is processed by multiple workers in parallel
+if "--batch-queue-dir" in argv:
+    batch_queue_dir = argv[argv.index("--batch-queue-dir") + 1]
+if "--worker-id" in argv:
+    worker_id = int(argv[argv.index("--worker-id") + 1])
+if "--batch-manifest" in argv:
+    batch_manifest = argv[argv.index("--batch-manifest") + 1]
+if "--profile" in argv:
+    profile_path = argv[argv.index("--profile") + 1]
+if "--cprofile-modules" in argv:
+    cprofile_modules = argv[argv.index("--cprofile-modules") + 1].split(",")
+if "--cpu-threads" in argv:
+    cpu_threads = int(argv[argv.index("--cpu-threads") + 1])
 
 argv = argv[argv.index("--") + 1:]
+# Remove the profiling and thread options, as they would otherwise be interpreted as placeholder arguments
+for option in ["--profile", "--cprofile-modules", "--cpu-threads"]:
+    if option in argv:
+        del argv[argv.index(option):argv.index(option) + 2]
 working_dir = os.path.dirname(os.path.abspath(__file__))
 
 from src.utility.SetupUtility import SetupUtility
 # Setup general required pip packages e.q. pyyaml
 SetupUtility.setup_pip([])
 
+import time
+import traceback
+from concurrent.futures import wait as wait_for_futures
+
 from src.main.Pipeline import Pipeline
+from src.main.GlobalStorage import GlobalStorage
 from src.utility.Utility import Utility
+from src.utility.BatchUtility import BatchUtility
+from src.utility.DefaultConfig import DefaultConfig
+from src.utility.AssetCache import AssetCache
+from src.utility.AsyncWriterUtility import AsyncWriterUtility
 
 config_path = argv[0]
 temp_dir = argv[1]
 
+if cpu_threads is not None:
+    # Used by the Initializer and all renderers, if no cpu_threads are given in the config
+    DefaultConfig.cpu_threads = cpu_threads
+
 if batch_index_file == None:
-    pipeline = Pipeline(config_path, argv[2:], working_dir, temp_dir)
+    pipeline = Pipeline(config_path, argv[2:], working_dir, temp_dir, profile_path=profile_path, cprofile_modules=cprofile_modules)
     pipeline.run()
 else:
-    with open(Utility.resolve_path(batch_index_file), "r") as f:
-        lines = f.readlines()
+    # If there is a batch queue dir, this process is one of many workers, which share the lines of the index file
+    is_worker = batch_queue_dir is not None
+    worker_name = "Worker {}".format(worker_id) if is_worker else "Batch"
+    index_file_path = Utility.resolve_path(batch_index_file)
+    manifest_path = Utility.resolve_path(batch_manifest) if batch_manifest is not None else index_file_path + ".manifest.jsonl"
+    # Lines which already finished in a previous run are skipped, when resuming
+    finished_line_hashes = BatchUtility.get_finished_line_hashes(manifest_path) if resume_batch else set()
+
+    # Keep loaded images, materials and meshes alive over all lines processed by this process
+    AssetCache.enabled = reuse_assets
+
+    lines = BatchUtility.read_index_file(index_file_path)
+    failed_lines = []
+    # Lines whose async writes are still running, they are only added to the manifest once all their writes are done
+    pending_lines = []
+
+    def record_written_lines(wait_for_all):
+        """ Adds all pending lines, whose writes have finished, to the manifest. """
+        for pending_line in list(pending_lines):
+            line_index, line_hash, start, output_paths, futures = pending_line
+            if not wait_for_all and not all(future.done() for future in futures):
+                continue
+            wait_for_futures(futures)
+            pending_lines.remove(pending_line)
+            errors = [future.exception() for future in futures if future.exception() is not None]
+            if errors:
+                BatchUtility.append_to_manifest(manifest_path, line_index, line_hash, "failed", time.time() - start)
+                if not is_worker:
+                    raise errors[0]
+                traceback.print_exception(type(errors[0]), errors[0], errors[0].__traceback__)
+                failed_lines.append(line_index)
+                print("{}: Writing line {}/{} failed after {:.3f} seconds".format(worker_name, line_index + 1, len(lines), time.time() - start))
+            else:
+                BatchUtility.append_to_manifest(manifest_path, line_index, line_hash, "finished", time.time() - start, output_paths)
+                print("{}: Line {}/{} finished in {:.3f} seconds".format(worker_name, line_index + 1, len(lines), time.time() - start))
+
+    for line_index, line in enumerate(lines):
+        if is_worker and not BatchUtility.claim_line(batch_queue_dir, line_index):
+            continue
+
+        line_hash = BatchUtility.hash_line(config_path, line)
+        if line_hash in finished_line_hashes:
+            print("{}: Skipping line {}/{}, it has already been finished".format(worker_name, line_index + 1, len(lines)))
+            continue
+
+        print("{}: Starting line {}/{}: {}".format(worker_name, line_index + 1, len(lines), line))
+        start = time.time()
+        # Make sure outputs and global values of the previous line do not leak into this one
+        GlobalStorage.reset()
+        try:
+            # In batch mode every line gets its own profile
+            line_profile_path = None
+            if profile_path is not None:
+                line_profile_path = "{}_{}{}".format(os.path.splitext(profile_path)[0], line_index, os.path.splitext(profile_path)[1])
+            pipeline = Pipeline(config_path, line.split(" "), working_dir, temp_dir, profile_path=line_profile_path, cprofile_modules=cprofile_modules)
+            # Async writes of this line may overlap with the next line
+            pipeline.run(flush_async_writes=False)
+        except Exception:
+            AsyncWriterUtility.take_submitted()
+            BatchUtility.append_to_manifest(manifest_path, line_index, line_hash, "failed", time.time() - start)
+            # A single process stops at the first failing line, workers continue with the remaining lines
+            if not is_worker:
+                raise
+            traceback.print_exc()
+            failed_lines.append(line_index)
+            print("{}: Line {}/{} failed after {:.3f} seconds".format(worker_name, line_index + 1, len(lines), time.time() - start))
+        else:
+            pending_lines.append((line_index, line_hash, start, BatchUtility.collect_output_paths(), AsyncWriterUtility.take_submitted()))
+        record_written_lines(wait_for_all=False)
+
+    record_written_lines(wait_for_all=True)
 
-        for line in lines:
-            args = line.split(" ")
-            pipeline = Pipeline(config_path, args, working_dir, temp_dir)
-            pipeline.run()
+    if failed_lines:
+        raise Exception("{}: {} line(s) of the batch failed: {}".format(worker_name, len(failed_lines), ", ".join(str(i + 1) for i in failed_lines)))
@@ -0,0 +1,212 @@
+import os
+from typing import Union, List
+
+import bpy
+
+
+class AssetCache:
+    """ Keeps loaded images, materials and meshes alive over multiple pipeline runs inside the same blender process.
+
+    This is used in the batch mode (run.py --batch_process <index_file> --reuse-assets), where every line of the index
+    file builds a new pipeline. Without the cache, the Initializer removes all data blocks at the start of every line
+    and identical textures, hdris and object files are loaded from disk again.
+
+    Every cached data block is identified by its kind, its source path and the modification time of that file, so
+    changed files are reloaded. Cached data blocks are marked via a custom property, which makes the Initializer skip
+    them when cleaning up the scene. Materials and meshes are cached as pristine copies, every reuse returns a new
+    copy, so changes done by later modules (e.g. the MaterialManipulator) do not leak into the next run.
+
+    The pristine materials do not keep their custom properties (e.g. "is_cc_texture" or "asset_name"), they are
+    stored inside the cache marker and restored on every copy. Together with get_all_materials() skipping cached
+    materials, this makes sure getters and samplers never pick the pristine copies.
+    """
+
+    # If False, no data block is cached and all loading functions fall back to the default blender behavior
+    enabled = False
+    # The custom property which marks a data block as being owned by the cache
+    cache_marker = "blenderproc_asset_cache"
+
+    # Maps (kind, source path, additional key) to the modification time and the name(s) of the cached data block(s)
+    _entries = {}
+
+    @staticmethod
+    def _get_entry(kind: str, path: str, additional_key: str = ""):
+        """ Returns the names stored for the given cache key, if the entry is still valid.
+
+        :param kind: The kind of the cached data, e.g. "image".
+        :param path: The source path of the data.
+        :param additional_key: Further information, which influences how the data was loaded.
+        :return: The stored names or None, if there is no valid entry.
+        """
+        key = (kind, os.path.abspath(path), additional_key)
+        if key in AssetCache._entries:
+            mtime, names = AssetCache._entries[key]
+            if mtime == os.path.getmtime(path):
+                return names
+            # The file has changed since it was cached
+            del AssetCache._entries[key]
+        return None
+
+    @staticmethod
+    def _set_entry(kind: str, path: str, names, additional_key: str = ""):
+        """ Stores the names of the data blocks, which were loaded from the given path.
+
+        :param kind: The kind of the cached data, e.g. "image".
+        :param path: The source path of the data.
+        :param names: The name or the list of names of the cached data blocks.
+        :param additional_key: Further information, which influences how the data was loaded.
+        """
+        AssetCache._entries[(kind, os.path.abspath(path), additional_key)] = (os.path.getmtime(path), names)
+
+    @staticmethod
+    def is_cached(data_block: bpy.types.ID) -> bool:
+        """ Checks if the given data block is owned by the cache and should therefore survive the scene clean up.
+
+        :param data_block: The data block to check.
+        :return: True, if the data block should be kept.
+        """
+        return AssetCache.enabled and AssetCache.cache_marker in data_block.keys()
+
+    @staticmethod
+    def clear():
+        """ Forgets all cached data blocks, they are removed during the next scene clean up. """
+        for collection in [bpy.data.images, bpy.data.materials, bpy.data.meshes]:
+            for data_block in collection:
+                if AssetCache.cache_marker in data_block.keys():
+                    del data_block[AssetCache.cache_marker]
+        AssetCache._entries = {}
+
+    @staticmethod
+    def _create_pristine_material(material: bpy.types.Material) -> bpy.types.Material:
+        """ Creates a marked copy of the given material, the images used by the material are marked as well.
+
+        :param material: The material to copy.
+        :return: The pristine copy.
+        """
+        pristine_material = material.copy()
+        # The custom properties identify the material for the getters, so they are moved into the marker
+        custom_properties = {}
+        for key in list(pristine_material.keys()):
+            value = pristine_material[key]
+            if hasattr(value, "to_dict"):
+                value = value.to_dict()
+            elif hasattr(value, "to_list"):
+                value = value.to_list()
+            custom_properties[key] = value
+            del pristine_material[key]
+        pristine_material[AssetCache.cache_marker] = custom_properties
+        if pristine_material.use_nodes:
+            for node in pristine_material.node_tree.nodes:
+                if hasattr(node, "image") and node.image is not None:
+                    node.image[AssetCache.cache_marker] = True
+        return pristine_material
+
+    @staticmethod
+    def _copy_pristine_material(pristine_material: bpy.types.Material) -> bpy.types.Material:
+        """ Creates an unmarked copy of the given pristine material with the custom properties of the original one.
+
+        :param pristine_material: The pristine material created by _create_pristine_material().
+        :return: The new copy.
+        """
+        material = pristine_material.copy()
+        custom_properties = material[AssetCache.cache_marker].to_dict()
+        del material[AssetCache.cache_marker]
+        for key, value in custom_properties.items():
+            material[key] = value
+        return material
+
+    @staticmethod
+    def load_image(image_path: str) -> bpy.types.Image:
+        """ Loads the image at the given path, or returns it from the cache if it has been loaded before.
+
+        :param image_path: The path to the image.
+        :return: The loaded image.
+        """
+        if not AssetCache.enabled:
+            return bpy.data.images.load(image_path, check_existing=True)
+
+        name = AssetCache._get_entry("image", image_path)
+        if name is not None and name in bpy.data.images:
+            return bpy.data.images[name]
+
+        image = bpy.data.images.load(image_path, check_existing=True)
+        image[AssetCache.cache_marker] = True
+        AssetCache._set_entry("image", image_path, image.name)
+        return image
+
+    @staticmethod
+    def get_material(source_path: str) -> Union[bpy.types.Material, None]:
+        """ Returns a new copy of the material which was created from the given source, if it is cached.
+
+        :param source_path: The path of the file the material was created from.
+        :return: The copy of the material or None, if there is no such material in the cache.
+        """
+        if not AssetCache.enabled:
+            return None
+
+        name = AssetCache._get_entry("material", source_path)
+        if name is not None and name in bpy.data.materials:
+            return AssetCache._copy_pristine_material(bpy.data.materials[name])
+        return None
+
+    @staticmethod
+    def add_material(source_path: str, material: bpy.types.Material):
+        """ Stores a pristine copy of the given material, which was just created from the given source.
+
+        :param source_path: The path of the file the material was created from.
+        :param material: The newly created material.
+        """
+        if AssetCache.enabled:
+            pristine_material = AssetCache._create_pristine_material(material)
+            AssetCache._set_entry("material", source_path, pristine_material.name)
+
+    @staticmethod
+    def get_objects(file_path: str, import_settings: str = "") -> Union[List[bpy.types.Object], None]:
+        """ Creates new objects based on the cached meshes of the given file, if it has been loaded before.
+
+        The new objects are linked into the current collection and are selected, like it is done by the importers.
+
+        :param file_path: The path of the file the meshes were loaded from.
+        :param import_settings: A string describing the settings, which were used for importing the file.
+        :return: The list of new objects or None, if the file is not cached.
+        """
+        if not AssetCache.enabled:
+            return None
+
+        cached_objects = AssetCache._get_entry("mesh", file_path, import_settings)
+        if cached_objects is None or any(mesh_name not in bpy.data.meshes for _, mesh_name, _ in cached_objects):
+            return None
+
+        new_objects = []
+        for object_name, mesh_name, matrix_world in cached_objects:
+            mesh = bpy.data.meshes[mesh_name].copy()
+            del mesh[AssetCache.cache_marker]
+            # Also the materials are copied, as they might be changed by later modules
+            for i, material in enumerate(mesh.materials):
+                if material is not None:
+                    mesh.materials[i] = AssetCache._copy_pristine_material(material)
+            obj = bpy.data.objects.new(object_name, mesh)
+            bpy.context.collection.objects.link(obj)
+            obj.matrix_world = matrix_world
+            obj.select_set(True)
+            new_objects.append(obj)
+        return new_objects
+
+    @staticmethod
+    def add_objects(file_path: str, objects: List[bpy.types.Object], import_settings: str = ""):
+        """ Stores pristine copies of the meshes of the given objects, which were just loaded from the given file.
+
+        :param file_path: The path of the file the objects were loaded from.
+        :param objects: The newly loaded objects.
+        :param import_settings: A string describing the settings, which were used for importing the file.
+        """
+        if AssetCache.enabled:
+            cached_objects = []
+            for obj in objects:
+                pristine_mesh = obj.data.copy()
+                pristine_mesh[AssetCache.cache_marker] = True
+                for i, material in enumerate(pristine_mesh.materials):
+                    if material is not None:
+                        pristine_mesh.materials[i] = AssetCache._create_pristine_material(material)
+                cached_objects.append((obj.name, pristine_mesh.name, obj.matrix_world.copy()))
+            AssetCache._set_entry("mesh", file_path, cached_objects, import_settings)
@@ -0,0 +1,101 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable, List, Union
+
+
+class AsyncWriterUtility:
+    """ Runs the CPU-bound part of the writers (compression, encoding, json dumping) in the background.
+
+    All work which needs bpy or reads temporary files (which are overwritten by the next render) has to be done by the
+    writer on the main thread before submitting. The submitted function only gets plain python and numpy data.
+
+    The amount of submitted but not yet finished writes is bounded by the queue size: if the queue is full, submit
+    blocks until one of the writes has finished. This keeps the memory usage bounded, when rendering is faster than
+    writing. Errors which occurred while writing are raised by flush().
+    """
+
+    _executor = None
+    _workers = 1
+    _queue_size = 2
+    # The futures of all submitted writes, which have not been flushed yet, together with their output dir
+    _pending = deque()
+    # The futures submitted since the last call of take_submitted()
+    _submitted = []
+
+    @staticmethod
+    def configure(workers: int, queue_size: int):
+        """ Raises the amount of background threads and the maximum amount of pending writes.
+
+        As the executor is shared by all writers, the settings are only ever increased, so the largest configured
+        value is used and the order in which the writers are created does not matter. This never waits for pending
+        writes, so it can be called while the writes of a previous pipeline (e.g. the previous batch line) are still
+        running.
+
+        :param workers: The amount of threads, which are writing in parallel.
+        :param queue_size: The maximum amount of pending writes, before submit blocks.
+        """
+        if workers < 1 or queue_size < 1:
+            raise Exception("The amount of async writer workers and the queue size have to be at least one.")
+        if workers > AsyncWriterUtility._workers:
+            if AsyncWriterUtility._executor is not None:
+                # The pending writes are finished by the old threads, the next writes go to a larger executor
+                AsyncWriterUtility._executor.shutdown(wait=False)
+                AsyncWriterUtility._executor = None
+            AsyncWriterUtility._workers = workers
+        AsyncWriterUtility._queue_size = max(AsyncWriterUtility._queue_size, queue_size)
+
+    @staticmethod
+    def submit(output_dir: str, fn: Callable, *args, **kwargs) -> Future:
+        """ Runs the given function in the background.
+
+        :param output_dir: The directory the function writes to, used to only flush the writes of one directory.
+        :param fn: The function to run.
+        :param args: The positional arguments of the function.
+        :param kwargs: The keyword arguments of the function.
+        :return: The future of the write.
+        """
+        if AsyncWriterUtility._executor is None:
+            AsyncWriterUtility._executor = ThreadPoolExecutor(max_workers=AsyncWriterUtility._workers,
+                                                              thread_name_prefix="AsyncWriter")
+
+        # Block until there is space in the queue
+        while sum(not future.done() for _, future in AsyncWriterUtility._pending) >= AsyncWriterUtility._queue_size:
+            wait([future for _, future in AsyncWriterUtility._pending], return_when=FIRST_COMPLETED)
+
+        future = AsyncWriterUtility._executor.submit(fn, *args, **kwargs)
+        AsyncWriterUtility._pending.append((output_dir, future))
+        AsyncWriterUtility._submitted.append(future)
+        return future
+
+    @staticmethod
+    def flush(output_dir: Union[str, None] = None):
+        """ Waits until all pending writes have finished and raises the first error, which occurred while writing.
+
+        :param output_dir: If given, only the writes to this directory are waited for.
+        """
+        remaining = deque()
+        futures = []
+        for pending_dir, future in AsyncWriterUtility._pending:
+            if output_dir is None or pending_dir == output_dir:
+                futures.append(future)
+            else:
+                remaining.append((pending_dir, future))
+        AsyncWriterUtility._pending = remaining
+
+        if futures:
+            print("Waiting for {} pending write(s)".format(len(futures)))
+        wait(futures)
+        for future in futures:
+            future.result()
+
+    @staticmethod
+    def take_submitted() -> List[Future]:
+        """ Returns the futures of all writes submitted since the last call.
+
+        This is used in the batch mode to determine when the writes of one line have finished.
+
+        :return: The list of futures.
+        """
+        submitted = AsyncWriterUtility._submitted
+        AsyncWriterUtility._submitted = []
+        return submitted
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import hashlib
+from typing import List, Set
+
+from src.main.GlobalStorage import GlobalStorage
+from src.utility.Utility import Utility
+
+
+class BatchUtility:
+
+    @staticmethod
+    def read_index_file(index_file_path: str) -> List[str]:
+        """ Reads the given batch index file.
+
+        Each non-empty line of the index file contains the placeholder arguments for one pipeline run.
+
+        :param index_file_path: The path to the index file.
+        :return: The list of all non-empty lines, stripped of their trailing line break.
+        """
+        with open(index_file_path, "r") as f:
+            return [line.rstrip("\n") for line in f.readlines() if line.strip()]
+
+    @staticmethod
+    def claim_line(queue_dir: str, line_index: int) -> bool:
+        """ Tries to claim the line with the given index in the shared work queue.
+
+        The queue is a directory which is shared between all batch workers. A line is claimed by atomically
+        creating a marker file for it, so every line is processed by exactly one worker.
+
+        :param queue_dir: The directory which is shared between all workers.
+        :param line_index: The index of the line inside the index file.
+        :return: True, if the calling worker is now responsible for the line.
+        """
+        try:
+            fd = os.open(os.path.join(queue_dir, "{:08d}.claimed".format(line_index)), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
+
+    @staticmethod
+    def hash_line(config_path: str, line: str) -> str:
+        """ Returns a hash which identifies the given line of the index file in combination with the used config.
+
+        :param config_path: The path to the config, which is used for all lines.
+        :param line: The line of the index file.
+        :return: The hex digest of the hash.
+        """
+        return hashlib.sha1((config_path.strip() + "\n" + line.strip()).encode()).hexdigest()
+
+    @staticmethod
+    def append_to_manifest(manifest_path: str, line_index: int, line_hash: str, status: str, wall_time: float,
+                           output_paths: List[str] = None):
+        """ Appends an entry describing one processed line to the manifest.
+
+        The manifest is an append-only file with one json object per line, so it stays valid, even if the batch is
+        killed while it is written, and it can be shared between multiple workers.
+
+        :param manifest_path: The path to the manifest file.
+        :param line_index: The index of the line inside the index file.
+        :param line_hash: The hash of the line, see hash_line().
+        :param status: The exit status of the line, either "finished" or "failed".
+        :param wall_time: The time in seconds it took to process the line.
+        :param output_paths: The paths of the persistent outputs, which were created for this line.
+        """
+        entry = {
+            "line_index": line_index,
+            "line_hash": line_hash,
+            "status": status,
+            "wall_time": wall_time,
+            "output_paths": output_paths if output_paths is not None else [],
+            "timestamp": time.time(),
+            "pid": os.getpid()
+        }
+        with open(manifest_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    @staticmethod
+    def get_finished_line_hashes(manifest_path: str) -> Set[str]:
+        """ Collects the hashes of all lines, which have been finished successfully according to the given manifest.
+
+        :param manifest_path: The path to the manifest file.
+        :return: The set of line hashes. Empty, if the manifest does not exist yet.
+        """
+        finished_line_hashes = set()
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last entry might be incomplete, if the process was killed while writing it
+                        continue
+                    if entry["status"] == "finished":
+                        finished_line_hashes.add(entry["line_hash"])
+        return finished_line_hashes
+
+    @staticmethod
+    def collect_output_paths() -> List[str]:
+        """ Collects the persistent outputs of the last pipeline run.
+
+        This includes the configured global output_dir and all registered outputs which are not stored in the
+        temporary directory.
+
+        :return: A list of paths. Registered outputs are given as path patterns.
+        """
+        output_paths = []
+        if GlobalStorage.has_param("output_dir"):
+            output_paths.append(Utility.resolve_path(GlobalStorage.get_global_config().get_string("output_dir")))
+        for output in Utility.get_registered_outputs():
+            if not os.path.abspath(output["path"]).startswith(os.path.abspath(Utility.get_temporary_directory())):
+                output_paths.append(output["path"])
+        return output_paths
@@ -1,4 +1,7 @@
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Union
+
 from src.utility.SetupUtility import SetupUtility
 SetupUtility.setup_pip(["imageio"])
 
@@ -8,9 +11,9 @@
 from mathutils import Vector
 
 import numpy as np
-import imageio
 
 from src.utility.Utility import Utility
+from src.utility.AssetCache import AssetCache
 
 
 def local_to_world(cords, world):
@@ -309,10 +312,10 @@ def get_all_blender_mesh_objects() -> list:
 
 def get_all_materials():
     """
-    Returns a list of all materials used and unused
+    Returns a list of all materials used and unused, except the pristine copies owned by the AssetCache
     :return: a list of all materials
     """
-    return list(bpy.data.materials)
+    return [material for material in bpy.data.materials if not AssetCache.is_cached(material)]
 
 
 def get_all_textures():
@@ -323,15 +326,30 @@ def get_all_textures():
     return list(bpy.data.textures)
 
 
-def load_image(file_path: str, num_channels: int = 3) -> np.ndarray:
+def load_image(file_path: str, num_channels: int = 3, keep_half_float: bool = False) -> np.ndarray:
     """ Load the image at the given path returns its pixels as a numpy array.
 
     The alpha channel is neglected.
 
+    If the OpenEXR package is installed (e.g. by adding it to the pip packages in the setup of the config), .exr
+    files are decoded via OpenEXR, which only reads the requested channels and keeps the original data type.
+    Otherwise, or for other formats, imageio is used.
+
     :param file_path: The path to the image.
     :param num_channels: Number of channels to return.
+    :param keep_half_float: If true, half float .exr images decoded via OpenEXR are returned as float16 instead of
+                            float32. Only use this, if the consumer does not need the higher precision for its
+                            computations.
     :return: The numpy array
     """
+    if file_path.lower().endswith(".exr"):
+        image = _load_exr_image(file_path, num_channels, keep_half_float)
+        if image is not None:
+            return image
+
+    # Imported here, as imageio is slow to import and not needed by most modules
+    import imageio
+
     try:
         return imageio.imread(file_path)[:, :, :num_channels]
     except ValueError as e:
@@ -365,6 +383,65 @@ def load_image(file_path: str, num_channels: int = 3) -> np.ndarray:
             raise Exception(error)
 
 
+def _load_exr_image(file_path: str, num_channels: int, keep_half_float: bool) -> Union[np.ndarray, None]:
+    """ Loads the first channels (in the order R, G, B, A) of the given .exr image via OpenEXR.
+
+    :param file_path: The path to the image.
+    :param num_channels: Number of channels to return.
+    :param keep_half_float: If true, half float channels are returned as float16 instead of float32.
+    :return: The numpy array of shape [height, width, channels] or None, if OpenEXR is not installed.
+    """
+    try:
+        import OpenEXR
+        import Imath
+    except ImportError:
+        return None
+
+    exr_file = OpenEXR.InputFile(file_path)
+    try:
+        header = exr_file.header()
+        data_window = header["dataWindow"]
+        width = data_window.max.x - data_window.min.x + 1
+        height = data_window.max.y - data_window.min.y + 1
+
+        def channel_order(channel_name: str) -> Tuple[int, str]:
+            # Blender names the channels R, G, B, A, optionally prefixed with the layer name
+            channel = channel_name.split(".")[-1]
+            return ["R", "G", "B", "A"].index(channel) if channel in ["R", "G", "B", "A"] else 4, channel_name
+
+        channel_names = sorted(header["channels"].keys(), key=channel_order)[:num_channels]
+        # Only the requested channels are decoded, each in its own pixel type
+        channels_data = exr_file.channels(channel_names)
+    finally:
+        exr_file.close()
+
+    dtypes = {Imath.PixelType.HALF: np.float16, Imath.PixelType.FLOAT: np.float32, Imath.PixelType.UINT: np.uint32}
+    channels = []
+    for channel_name, channel_data in zip(channel_names, channels_data):
+        dtype = dtypes[header["channels"][channel_name].type.v]
+        channel = np.frombuffer(channel_data, dtype=dtype).reshape(height, width)
+        if dtype == np.float16 and not keep_half_float:
+            channel = channel.astype(np.float32)
+        channels.append(channel)
+    return np.stack(channels, axis=-1)
+
+
+def load_images(file_paths: List[str], num_channels: int = 3, keep_half_float: bool = False,
+                max_workers: int = 4) -> List[np.ndarray]:
+    """ Loads the images at the given paths in parallel threads.
+
+    :param file_paths: The paths to the images.
+    :param num_channels: Number of channels to return.
+    :param keep_half_float: If true, half float .exr images are returned as float16, see load_image().
+    :param max_workers: The maximum amount of threads decoding in parallel.
+    :return: The list of numpy arrays in the order of the given paths.
+    """
+    if len(file_paths) <= 1 or max_workers <= 1:
+        return [load_image(file_path, num_channels, keep_half_float) for file_path in file_paths]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(file_paths))) as executor:
+        return list(executor.map(lambda file_path: load_image(file_path, num_channels, keep_half_float), file_paths))
+
+
 def get_bound_volume(obj):
     """ Gets the volume of a possible orientated bounding box.
     :param obj: Mesh object.
@@ -4,7 +4,6 @@
 import glob
 import numpy as np
 import png
-import shutil
 
 import bpy
 from mathutils import Euler, Matrix, Vector
@@ -13,6 +12,7 @@
 from src.utility.Utility import Utility
 from src.utility.PostProcessingUtility import PostProcessingUtility
 from src.utility.WriterUtility import WriterUtility
+from src.utility.AsyncWriterUtility import AsyncWriterUtility
 from src.writer.CameraStateWriter import CameraStateWriter
 
 
@@ -81,6 +81,104 @@ def _save_json(path, content):
                 json.dump(content, f, sort_keys=True)
 
     
+    @staticmethod
+    def _write(async_write_dir, save_fct, path, *content):
+        """ Calls the given save function right away or submits it to the AsyncWriterUtility.
+
+        :param async_write_dir: If given, the write is done in the background and belongs to this directory.
+        :param save_fct: The function to call, e.g. _save_json.
+        :param path: The path to write to.
+        :param content: The content to write, given as one or more arguments of the save function.
+        """
+        if async_write_dir is not None:
+            AsyncWriterUtility.submit(async_write_dir, save_fct, path, *content)
+        else:
+            save_fct(path, *content)
+
+    @staticmethod
+    def _append_to_chunk_log(chunk_dir, chunk_gt, chunk_camera, compact):
+        """ Appends the GT annotations and camera info of the given frames to the log of the chunk.
+
+        The log scene_log.jsonl holds one line per frame, so appending does not need to read or rewrite the frames,
+        which are already in the chunk.
+
+        :param chunk_dir: The directory of the chunk.
+        :param chunk_gt: The GT annotations per frame id.
+        :param chunk_camera: The camera info per frame id.
+        :param compact: If true, the log is merged into scene_gt.json and scene_camera.json afterwards.
+        """
+        with open(os.path.join(chunk_dir, 'scene_log.jsonl'), 'a') as f:
+            for im_id in sorted(chunk_gt.keys()):
+                f.write(json.dumps({"im_id": im_id, "scene_gt": chunk_gt[im_id],
+                                    "scene_camera": chunk_camera[im_id]}, sort_keys=True) + "\n")
+        if compact:
+            BopWriterUtility._compact_chunk_log(chunk_dir)
+
+    @staticmethod
+    def _compact_chunk_log(chunk_dir):
+        """ Merges the log of the given chunk into its scene_gt.json and scene_camera.json and removes the log.
+
+        :param chunk_dir: The directory of the chunk.
+        """
+        log_path = os.path.join(chunk_dir, 'scene_log.jsonl')
+        gt_path = os.path.join(chunk_dir, 'scene_gt.json')
+        camera_path = os.path.join(chunk_dir, 'scene_camera.json')
+        # The chunk might have been started without the log
+        chunk_gt = BopWriterUtility._load_json(gt_path, keys_to_int=True) if os.path.exists(gt_path) else {}
+        chunk_camera = BopWriterUtility._load_json(camera_path, keys_to_int=True) if os.path.exists(camera_path) else {}
+        with open(log_path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    frame = json.loads(line)
+                    chunk_gt[frame["im_id"]] = frame["scene_gt"]
+                    chunk_camera[frame["im_id"]] = frame["scene_camera"]
+        BopWriterUtility._save_json(gt_path, chunk_gt)
+        BopWriterUtility._save_json(camera_path, chunk_camera)
+        os.remove(log_path)
+
+    @staticmethod
+    def _get_last_logged_frame_id(log_path):
+        """ Returns the id of the last frame in the given chunk log, only the end of the file is read.
+
+        :param log_path: The path of the scene_log.jsonl file.
+        :return: The frame id or None, if the log does not contain any complete line.
+        """
+        with open(log_path, 'rb') as f:
+            end = f.seek(0, os.SEEK_END)
+            block_size = 4096
+            while True:
+                start = max(end - block_size, 0)
+                f.seek(start)
+                # Complete lines end with a newline, so the part after the last one is dropped
+                lines = f.read().split(b"\n")[:-1]
+                if start > 0:
+                    # The first line of the block might be cut off
+                    lines = lines[1:]
+                lines = [line for line in lines if line.strip()]
+                if lines:
+                    return json.loads(lines[-1].decode())["im_id"]
+                if start == 0:
+                    return None
+                block_size *= 2
+
+    @staticmethod
+    def compact_chunk_logs(output_dir:str, dataset:str=""):
+        """ Merges the logs of all chunks, which were written with append_log, into their scene_gt.json and
+        scene_camera.json, so the dataset can be read by the BOP toolkit.
+
+        This is done automatically for every chunk, which is full, and when writing without append_log. In the
+        config pipeline, this is done by the BopWriter with compact_logs_at_end.
+
+        :param output_dir: Path to the output directory.
+        :param dataset: The bop dataset, which was given when writing.
+        """
+        dataset_dir = os.path.join(output_dir, 'bop_data', dataset)
+        # Logs might still be written in the background
+        AsyncWriterUtility.flush(dataset_dir)
+        for log_path in sorted(glob.glob(os.path.join(dataset_dir, 'train_pbr', '*', 'scene_log.jsonl'))):
+            print("Compacting " + log_path)
+            BopWriterUtility._compact_chunk_log(os.path.dirname(log_path))
+
     @staticmethod
     def _save_depth(path, im):
         """Saves a depth image (16-bit) to a PNG file.
@@ -105,7 +203,8 @@ def _save_depth(path, im):
     
     @staticmethod
     def write(output_dir:str, dataset:str="", append_to_existing_output:bool=False, depth_scale:float=1.0, 
-              save_world2cam:bool=True, ignore_dist_thres:float=100., m2mm:bool=True, frames_per_chunk:int=1000):
+              save_world2cam:bool=True, ignore_dist_thres:float=100., m2mm:bool=True, frames_per_chunk:int=1000,
+              async_write:bool=False, append_log:bool=False):
         """Write the BOP data
 
         :param output_dir: Path to the output directory.
@@ -118,6 +217,12 @@ def write(output_dir:str, dataset:str="", append_to_existing_output:bool=False,
         :param m2mm: Original bop annotations and models are in mm. If true, we convert the gt annotations to mm here. This
             is needed if BopLoader option mm2m is used.
         :param frames_per_chunk: Number of frames saved in each chunk (called scene in BOP) 
+        :param async_write: If true, the depth images and the chunk annotations are encoded and written in the
+            background via the AsyncWriterUtility.
+        :param append_log: If true, the GT annotations and camera info of the new frames are appended to the log
+            scene_log.jsonl of the chunk, instead of reading and rewriting its scene_gt.json and scene_camera.json.
+            The log is merged into them, when the chunk is full, when writing without append_log or via
+            compact_chunk_logs(). Until then, the BOP toolkit can not read the last chunk.
         """
         
         # Output paths.
@@ -125,6 +230,10 @@ def write(output_dir:str, dataset:str="", append_to_existing_output:bool=False,
         chunks_dir = os.path.join(dataset_dir, 'train_pbr')
         camera_path = os.path.join(dataset_dir, 'camera.json')
 
+        if append_to_existing_output:
+            # The chunks of previous runs might still be written in the background
+            AsyncWriterUtility.flush(dataset_dir)
+
         # Create the output directory structure.
         if not os.path.exists(dataset_dir):
             os.makedirs(dataset_dir)
@@ -153,7 +262,8 @@ def write(output_dir:str, dataset:str="", append_to_existing_output:bool=False,
         # Save the data.
         BopWriterUtility._write_camera(camera_path, depth_scale=depth_scale)
         BopWriterUtility._write_frames(chunks_dir, dataset_objects=dataset_objects, frames_per_chunk=frames_per_chunk, 
-                           m2mm=m2mm, ignore_dist_thres=ignore_dist_thres, save_world2cam=save_world2cam)
+                           m2mm=m2mm, ignore_dist_thres=ignore_dist_thres, save_world2cam=save_world2cam,
+                           async_write_dir=dataset_dir if async_write else None, append_log=append_log)
     
     @staticmethod
     def _write_camera(camera_path, depth_scale = 0.1):
@@ -234,8 +344,12 @@ def _get_frame_camera(save_world2cam, depth_scale=1.0, unit_scaling=1000., desti
     
     @staticmethod
     def _write_frames(chunks_dir, dataset_objects, depth_scale:float=1.0, frames_per_chunk:int=1000, m2mm:bool=True, 
-                            ignore_dist_thres:float=100., save_world2cam:bool=True):
+                            ignore_dist_thres:float=100., save_world2cam:bool=True, async_write_dir:str=None,
+                            append_log:bool=False):
         """ Writes images, GT annotations and camera info.
+
+        If async_write_dir is given, the depth images and annotations are written in the background. If append_log is
+        true, the annotations are appended to the log of the chunk, see write().
         """
         
         # Format of the depth images.
@@ -245,6 +359,12 @@ def _write_frames(chunks_dir, dataset_objects, depth_scale:float=1.0, frames_per
         depth_tpath = os.path.join(chunks_dir, '{chunk_id:06d}', 'depth', '{im_id:06d}' + depth_ext)
         chunk_camera_tpath = os.path.join(chunks_dir, '{chunk_id:06d}', 'scene_camera.json')
         chunk_gt_tpath = os.path.join(chunks_dir, '{chunk_id:06d}', 'scene_gt.json')
+        chunk_tpath = os.path.join(chunks_dir, '{chunk_id:06d}')
+
+        if not append_log:
+            # The frames of previous runs with append_log are merged first
+            for log_path in glob.glob(os.path.join(chunks_dir, '*', 'scene_log.jsonl')):
+                BopWriterUtility._compact_chunk_log(os.path.dirname(log_path))
         
         # Paths to the already existing chunk folders (such folders may exist
         # when appending to an existing dataset).
@@ -256,24 +376,35 @@ def _write_frames(chunks_dir, dataset_objects, depth_scale:float=1.0, frames_per
         curr_frame_id = 0
         if len(chunk_dirs):
             last_chunk_dir = sorted(chunk_dirs)[-1]
-            last_chunk_gt_fpath = os.path.join(last_chunk_dir, 'scene_gt.json')
-            chunk_gt = BopWriterUtility._load_json(last_chunk_gt_fpath, keys_to_int=True)
+            last_chunk_log_fpath = os.path.join(last_chunk_dir, 'scene_log.jsonl')
 
             # Last chunk and frame ID's.
             last_chunk_id = int(os.path.basename(last_chunk_dir))
-            last_frame_id = int(sorted(chunk_gt.keys())[-1])
+            last_chunk_gt_fpath = os.path.join(last_chunk_dir, 'scene_gt.json')
+            last_frame_id = None
+            if os.path.exists(last_chunk_log_fpath):
+                # The logged frames always follow the ones in scene_gt.json
+                last_frame_id = BopWriterUtility._get_last_logged_frame_id(last_chunk_log_fpath)
+            if last_frame_id is None and os.path.exists(last_chunk_gt_fpath):
+                chunk_gt = BopWriterUtility._load_json(last_chunk_gt_fpath, keys_to_int=True)
+                if chunk_gt:
+                    last_frame_id = int(sorted(chunk_gt.keys())[-1])
 
             # Current chunk and frame ID's.
             curr_chunk_id = last_chunk_id
-            curr_frame_id = last_frame_id + 1
-            if curr_frame_id % frames_per_chunk == 0:
-                curr_chunk_id += 1
+            if last_frame_id is None:
+                # The chunk does not contain any frame yet, e.g. as its log is still empty, so it is filled
                 curr_frame_id = 0
+            else:
+                curr_frame_id = last_frame_id + 1
+                if curr_frame_id % frames_per_chunk == 0:
+                    curr_chunk_id += 1
+                    curr_frame_id = 0
 
         # Initialize structures for the GT annotations and camera info.
         chunk_gt = {}
         chunk_camera = {}
-        if curr_frame_id != 0:
+        if curr_frame_id != 0 and not append_log:
             # Load GT and camera info of the chunk we are appending to.
             chunk_gt = BopWriterUtility._load_json(
                 chunk_gt_tpath.format(chunk_id=curr_chunk_id), keys_to_int=True)
@@ -281,7 +412,6 @@ def _write_frames(chunks_dir, dataset_objects, depth_scale:float=1.0, frames_per
                 chunk_camera_tpath.format(chunk_id=curr_chunk_id), keys_to_int=True)
 
         # Go through all frames.
-        num_new_frames = bpy.context.scene.frame_end - bpy.context.scene.frame_start
         for frame_id in range(bpy.context.scene.frame_start, bpy.context.scene.frame_end):
             # Activate frame.
             bpy.context.scene.frame_set(frame_id)
@@ -291,9 +421,9 @@ def _write_frames(chunks_dir, dataset_objects, depth_scale:float=1.0, frames_per
                 chunk_gt = {}
                 chunk_camera = {}
                 os.makedirs(os.path.dirname(
-                    rgb_tpath.format(chunk_id=curr_chunk_id, im_id=0, im_type='PNG')))
+                    rgb_tpath.format(chunk_id=curr_chunk_id, im_id=0, im_type='PNG')), exist_ok=True)
                 os.makedirs(os.path.dirname(
-                    depth_tpath.format(chunk_id=curr_chunk_id, im_id=0)))
+                    depth_tpath.format(chunk_id=curr_chunk_id, im_id=0)), exist_ok=True)
 
             # Get GT annotations and camera info for the current frame.
             
@@ -309,7 +439,7 @@ def _write_frames(chunks_dir, dataset_objects, depth_scale:float=1.0, frames_per
                 raise Exception("RGB image has not been rendered.")
             image_type = '.png' if rgb_output['path'].endswith('png') else '.jpg'
             rgb_fpath = rgb_tpath.format(chunk_id=curr_chunk_id, im_id=curr_frame_id, im_type=image_type)
-            shutil.copyfile(rgb_output['path'] % frame_id, rgb_fpath)
+            WriterUtility.copy_output_file(rgb_output, frame_id, rgb_fpath)
 
             # Load the resulting dist image.
             dist_output = Utility.find_registered_output_by_key("distance")
@@ -325,17 +455,25 @@ def _write_frames(chunks_dir, dataset_objects, depth_scale:float=1.0, frames_per
 
             # Save the scaled depth image.
             depth_fpath = depth_tpath.format(chunk_id=curr_chunk_id, im_id=curr_frame_id)
-            BopWriterUtility._save_depth(depth_fpath, depth_mm_scaled)
+            BopWriterUtility._write(async_write_dir, BopWriterUtility._save_depth, depth_fpath, depth_mm_scaled)
 
             # Save the chunk info if we are at the end of a chunk or at the last new frame.
             if ((curr_frame_id + 1) % frames_per_chunk == 0) or\
-                  (frame_id == num_new_frames - 1):
-
-                # Save GT annotations.
-                BopWriterUtility._save_json(chunk_gt_tpath.format(chunk_id=curr_chunk_id), chunk_gt)
-
-                # Save camera info.
-                BopWriterUtility._save_json(chunk_camera_tpath.format(chunk_id=curr_chunk_id), chunk_camera)
+                  (frame_id == bpy.context.scene.frame_end - 1):
+
+                if append_log:
+                    # Only the new frames are appended, a full chunk is closed by merging its log
+                    BopWriterUtility._write(async_write_dir, BopWriterUtility._append_to_chunk_log,
+                                            chunk_tpath.format(chunk_id=curr_chunk_id), chunk_gt, chunk_camera,
+                                            (curr_frame_id + 1) % frames_per_chunk == 0)
+                else:
+                    # Save GT annotations.
+                    BopWriterUtility._write(async_write_dir, BopWriterUtility._save_json,
+                                            chunk_gt_tpath.format(chunk_id=curr_chunk_id), chunk_gt)
+
+                    # Save camera info.
+                    BopWriterUtility._write(async_write_dir, BopWriterUtility._save_json,
+                                            chunk_camera_tpath.format(chunk_id=curr_chunk_id), chunk_camera)
 
                 # Update ID's.
                 curr_chunk_id += 1
@@ -2,23 +2,27 @@
 SetupUtility.setup_pip(["scikit-image"])
 
 import datetime
-from itertools import groupby
 import csv
 import json
 import os
-import shutil
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 import numpy as np
-from skimage import measure
 
 import bpy
 
 from src.utility.Utility import Utility
+from src.utility.WriterUtility import WriterUtility
+from src.utility.AsyncWriterUtility import AsyncWriterUtility
 
 class CocoWriterUtility:
 
     @staticmethod
     def write(output_dir: str, mask_encoding_format="rle", supercategory="coco_annotations", append_to_existing_output=False,
-                segmap_output_key="segmap", segcolormap_output_key="segcolormap", rgb_output_key="colors"):
+                segmap_output_key="segmap", segcolormap_output_key="segcolormap", rgb_output_key="colors",
+                async_write=False, workers=1, link_images=False, sharded=False):
         """ Writes coco annotations in the following steps:
         1. Locate the seg images
         2. Locate the rgb maps
@@ -27,7 +31,8 @@ def write(output_dir: str, mask_encoding_format="rle", supercategory="coco_annot
         5. For each frame write the coco annotation
 
         :param output_dir: Output directory to write the coco annotations
-        :param mask_encoding_format: Encoding format of the binary masks. Default: 'rle'. Available: 'rle', 'polygon'.
+        :param mask_encoding_format: Encoding format of the binary masks. Default: 'rle'. Available: 'rle',
+            'compressed_rle' (the string encoding of pycocotools), 'polygon'.
         :param supercategory: name of the dataset/supercategory to filter for, e.g. a specific BOP dataset set by 'bop_dataset_name' or 
             any loaded object with specified 'cp_supercategory'
         :param append_to_existing_output: If true and if there is already a coco_annotations.json file in the output directory, the new coco
@@ -39,8 +44,26 @@ def write(output_dir: str, mask_encoding_format="rle", supercategory="coco_annot
             the same as the colormap_output_key of the SegMapRenderer module. Default: segcolormap.
         :param rgb_output_key: The output key with which the rgb images were registered. Should be the same as the output_key of the
             RgbRenderer module. Default: colors.
+        :param async_write: If true, the annotations are generated and written in the background via the
+            AsyncWriterUtility. The segmentation maps are still loaded right away, as they are overwritten by the next
+            rendering.
+        :param workers: The amount of processes, which generate the annotations of the frames in parallel. The
+            processes are forked, so this is only available on systems supporting fork, e.g. linux. The images are
+            also copied by that many threads. Can not be combined with async_write. Default: 1.
+        :param link_images: If true, the rgb images are hard linked into the output directory instead of copied, if
+            possible. Blender overwrites files in place, so the temporary images must not be rendered again
+            afterwards, e.g. as they are deleted after writing. Default: False.
+        :param sharded: If true, the annotations of every call are written into a new shard file and only the small
+            index file coco_annotations_index.json is read and rewritten to append them, see
+            _generate_and_save_shard(). The shards can be merged into one coco_annotations.json via
+            scripts/merge_coco_shards.py. Default: False.
         """
 
+        if async_write and workers > 1:
+            # Forking from the background thread could deadlock the workers on locks held by other threads
+            raise Exception("The annotations can not be generated by multiple workers, if they are written "
+                            "asynchronously.")
+
         # Create output directory
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
@@ -74,49 +97,169 @@ def write(output_dir: str, mask_encoding_format="rle", supercategory="coco_annot
                 inst_attribute_maps.append(mapping)
 
         coco_annotations_path = os.path.join(output_dir, "coco_annotations.json")
+        index_path = os.path.join(output_dir, "coco_annotations_index.json")
+        if append_to_existing_output:
+            # The annotations of previous runs might still be written in the background
+            AsyncWriterUtility.flush(output_dir)
+        existing_index = None
         # Calculate image numbering offset, if append_to_existing_output is activated and coco data exists
-        if append_to_existing_output and os.path.exists(coco_annotations_path):
+        if sharded:
+            if append_to_existing_output and os.path.exists(index_path):
+                with open(index_path, 'r') as fp:
+                    existing_index = json.load(fp)
+                image_offset = existing_index["next_image_id"] - bpy.context.scene.frame_start
+            else:
+                image_offset = 0
+            existing_coco_annotations = None
+        elif append_to_existing_output and os.path.exists(coco_annotations_path):
             with open(coco_annotations_path, 'r') as fp:
                 existing_coco_annotations = json.load(fp)
-            image_offset = max([image["id"] for image in existing_coco_annotations["images"]]) + 1
+            # Continue the numbering of the existing images, also if only a chunk of the frames is written
+            image_offset = max([image["id"] for image in existing_coco_annotations["images"]]) + 1 - \
+                           bpy.context.scene.frame_start
         else:
             image_offset = 0
             existing_coco_annotations = None
 
         # collect all RGB paths
         new_coco_image_paths = []
-        # for each rendered frame
-        for frame in range(bpy.context.scene.frame_start, bpy.context.scene.frame_end):
-            segmentation_map_paths.append(segmentation_map_output["path"] % frame)
+        # The images are copied concurrently, linking or copying a file does not need bpy
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            copies = []
+            # for each rendered frame
+            for frame in range(bpy.context.scene.frame_start, bpy.context.scene.frame_end):
+                segmentation_map_paths.append(segmentation_map_output["path"] % frame)
+
+                target_path = os.path.join(output_dir, os.path.basename(rgb_output["path"] % (frame + image_offset)))
+
+                copies.append(executor.submit(WriterUtility.copy_output_file, rgb_output, frame, target_path,
+                                              link_images))
+                new_coco_image_paths.append(os.path.basename(target_path))
+            # Raises the errors of the copies
+            for copy in copies:
+                copy.result()
+
+        if workers > 1:
+            # The workers are forked, which should not happen while other threads might hold locks, e.g. while
+            # compressing or writing files of other writers in the background
+            AsyncWriterUtility.flush()
+
+        if async_write:
+            # Only the instance channel is needed, so keep just that one in memory until the write has finished
+            inst_channel = int(inst_attribute_maps[0]['channel_instance'])
+            segmentation_map_paths = [np.load(path)[:, :, inst_channel] for path in segmentation_map_paths]
 
-            source_path = rgb_output["path"] % frame
-            target_path = os.path.join(output_dir, os.path.basename(rgb_output["path"] % (frame + image_offset)))
+        if sharded:
+            args = (CocoWriterUtility._generate_and_save_shard, output_dir, existing_index, segmentation_map_paths,
+                    new_coco_image_paths, inst_attribute_maps, supercategory, mask_encoding_format, workers)
+        else:
+            args = (CocoWriterUtility._generate_and_save, coco_annotations_path, segmentation_map_paths,
+                    new_coco_image_paths, inst_attribute_maps, supercategory, mask_encoding_format,
+                    existing_coco_annotations, workers)
+        if async_write:
+            AsyncWriterUtility.submit(output_dir, *args)
+        else:
+            args[0](*args[1:])
 
-            shutil.copyfile(source_path, target_path)
-            new_coco_image_paths.append(os.path.basename(target_path))
+    @staticmethod
+    def _generate_and_save(coco_annotations_path, segmentation_maps, image_paths, inst_attribute_maps, supercategory,
+                           mask_encoding_format, existing_coco_annotations=None, workers=1):
+        """ Generates the coco annotations and writes them to the given path.
 
-        coco_output = CocoWriterUtility.generate_coco_annotations(segmentation_map_paths,
-                                                            new_coco_image_paths,
-                                                            inst_attribute_maps,
-                                                            supercategory,
-                                                            mask_encoding_format,
-                                                            existing_coco_annotations)
+        For a description of the parameters, see generate_coco_annotations().
+        """
+        coco_output = CocoWriterUtility.generate_coco_annotations(segmentation_maps,
+                                                                  image_paths,
+                                                                  inst_attribute_maps,
+                                                                  supercategory,
+                                                                  mask_encoding_format,
+                                                                  existing_coco_annotations,
+                                                                  workers)
 
         print("Writing coco annotations to " + coco_annotations_path)
         with open(coco_annotations_path, 'w') as fp:
             json.dump(coco_output, fp)
 
+    @staticmethod
+    def _generate_and_save_shard(output_dir, existing_index, segmentation_maps, image_paths, inst_attribute_maps,
+                                 supercategory, mask_encoding_format, workers=1):
+        """ Generates the coco annotations and writes them as a new shard next to the index file.
+
+        The index file coco_annotations_index.json holds the info, licenses and categories of the dataset, the next
+        free image and annotation ids and the list of shards with their amount of images and annotations. Each shard
+        holds the "images" and "annotations" of one call with their final ids, so appending only needs to read and
+        rewrite the index, not the annotations of the previous calls.
+
+        :param output_dir: The directory of the index file and the shards.
+        :param existing_index: The index to append to. If None, a new index is started and the shards of an existing
+                               index are removed.
+        For a description of the other parameters, see generate_coco_annotations().
+        """
+        coco_output = CocoWriterUtility.generate_coco_annotations(segmentation_maps, image_paths, inst_attribute_maps,
+                                                                  supercategory, mask_encoding_format, None, workers)
+
+        index_path = os.path.join(output_dir, "coco_annotations_index.json")
+        if existing_index is None:
+            if os.path.exists(index_path):
+                # The new dataset replaces the previous one
+                with open(index_path, 'r') as fp:
+                    for shard in json.load(fp)["shards"]:
+                        if os.path.exists(os.path.join(output_dir, shard["file"])):
+                            os.remove(os.path.join(output_dir, shard["file"]))
+            index = {
+                "info": coco_output["info"],
+                "licenses": coco_output["licenses"],
+                "categories": [],
+                "next_image_id": 0,
+                "next_annotation_id": 0,
+                "shards": []
+            }
+        else:
+            index = existing_index
+
+        for cat_dict in coco_output["categories"]:
+            if cat_dict not in index["categories"]:
+                index["categories"].append(cat_dict)
+
+        # The ids of the images and annotations continue the ones of the previous shards
+        for image in coco_output["images"]:
+            image["id"] += index["next_image_id"]
+        for annotation in coco_output["annotations"]:
+            annotation["id"] += index["next_annotation_id"]
+            annotation["image_id"] += index["next_image_id"]
+        index["next_image_id"] += len(coco_output["images"])
+        index["next_annotation_id"] += len(coco_output["annotations"])
+
+        shard_file = "coco_annotations_shard_{:06d}.json".format(len(index["shards"]))
+        print("Writing coco annotations to " + os.path.join(output_dir, shard_file))
+        with open(os.path.join(output_dir, shard_file), 'w') as fp:
+            json.dump({"images": coco_output["images"], "annotations": coco_output["annotations"]}, fp)
+        index["shards"].append({"file": shard_file,
+                                "images": len(coco_output["images"]),
+                                "annotations": len(coco_output["annotations"])})
+
+        # The index is replaced at once, so it always lists complete shards only
+        with open(index_path + ".tmp", 'w') as fp:
+            json.dump(index, fp, indent=2)
+        os.replace(index_path + ".tmp", index_path)
+
     @staticmethod
     def generate_coco_annotations(segmentation_map_paths, image_paths, inst_attribute_maps, supercategory,
-                                  mask_encoding_format, existing_coco_annotations=None):
+                                  mask_encoding_format, existing_coco_annotations=None, workers=1):
         """Generates coco annotations for images
 
-        :param segmentation_map_paths: A list of paths which points to the rendered segmentation maps.
+        :param segmentation_map_paths: A list of paths which points to the rendered segmentation maps. Instead of a
+                                       path, also the already loaded instance channel of the map can be given. Any
+                                       iterable can be used, the maps are processed one at a time.
         :param image_paths: A list of paths which points to the rendered segmentation maps.
         :param inst_attribute_maps: mapping with idx, class and optionally supercategory/bop_dataset_name
         :param supercategory: name of the dataset/supercategory to filter for, e.g. a specific BOP dataset
         :param mask_encoding_format: Encoding format of the binary mask. Type: string.
         :param existing_coco_annotations: If given, the new coco annotations will be appended to the given coco annotations dict.
+        :param workers: The amount of processes, which generate the annotations of the frames in parallel. The
+                        results are merged in the order of the frames, so the ids are the same for any amount of
+                        workers. The processes are forked, without fork or if not called from the main thread, the
+                        frames are processed sequentially.
         :return: dict containing coco annotations
         """
 
@@ -158,32 +301,31 @@ def generate_coco_annotations(segmentation_map_paths, image_paths, inst_attribut
         images = []
         annotations = []
 
-        for segmentation_map_path, image_path in zip(segmentation_map_paths, image_paths):
-            
-            # Load instance map
-            inst_channel = int(inst_attribute_maps[0]['channel_instance'])
-            segmentation_map = np.load(segmentation_map_path)[:,:,inst_channel]
-
-            # Add coco info for image
-            image_id = len(images)
-            images.append(CocoWriterUtility.create_image_info(image_id, image_path, segmentation_map.shape))
-
-            # Go through all objects visible in this image
-            instances = np.unique(segmentation_map)
-            # Remove background
-            instances = np.delete(instances, np.where(instances == 0))
-            for inst in instances:
-                if inst in instance_2_category_map:
-                    # Calc object mask
-                    binary_inst_mask = np.where(segmentation_map == inst, 1, 0)
-                    # Add coco info for object in this image
-                    annotation = CocoWriterUtility.create_annotation_info(len(annotations),
-                                                                    image_id,
-                                                                    instance_2_category_map[inst],
-                                                                    binary_inst_mask,
-                                                                    mask_encoding_format)
-                    if annotation is not None:
-                        annotations.append(annotation)
+        inst_channel = int(inst_attribute_maps[0]['channel_instance'])
+        if workers > 1 and "fork" in multiprocessing.get_all_start_methods() and \
+                threading.current_thread() is threading.main_thread():
+            # The workers are forked, as blender can not be started again by them. They only use numpy and
+            # scikit-image, which is fine to use after a fork. Forking from other threads might deadlock the workers.
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+        else:
+            executor = None
+        frame_results = (executor.map if executor is not None else map)(
+            CocoWriterUtility._generate_frame_annotations, segmentation_map_paths, repeat(inst_channel),
+            repeat(instance_2_category_map), repeat(mask_encoding_format))
+
+        try:
+            # The results are merged in the order of the frames, so the ids do not depend on the amount of workers
+            for (image_shape, frame_annotations), image_path in zip(frame_results, image_paths):
+                # Add coco info for image
+                image_id = len(images)
+                images.append(CocoWriterUtility.create_image_info(image_id, image_path, image_shape))
+                for annotation in frame_annotations:
+                    annotation["id"] = len(annotations)
+                    annotation["image_id"] = image_id
+                    annotations.append(annotation)
+        finally:
+            if executor is not None:
+                executor.shutdown()
 
         new_coco_annotations = {
             "info": info,
@@ -198,6 +340,53 @@ def generate_coco_annotations(segmentation_map_paths, image_paths, inst_attribut
 
         return new_coco_annotations
 
+    @staticmethod
+    def _generate_frame_annotations(segmentation_map_path, inst_channel, instance_2_category_map,
+                                    mask_encoding_format):
+        """ Generates the annotations of all objects visible in one frame.
+
+        This does not need bpy, so it can be run in a worker process. The ids of the annotations and their image are
+        set to None and have to be assigned by the caller.
+
+        :param segmentation_map_path: The path of the rendered segmentation map or its already loaded instance channel.
+        :param inst_channel: The channel of the instance ids in the segmentation map.
+        :param instance_2_category_map: A dict mapping the instance ids to the ids of their categories.
+        :param mask_encoding_format: Encoding format of the binary mask. Type: string.
+        :return: The shape [H, W] of the segmentation map and the list of annotations.
+        """
+        # Load instance map
+        if isinstance(segmentation_map_path, np.ndarray):
+            segmentation_map = segmentation_map_path
+        else:
+            segmentation_map = np.load(segmentation_map_path)[:, :, inst_channel]
+
+        # Go through all objects visible in this image, their areas and bounding boxes are computed at once
+        annotations = []
+        instances, areas, bounding_boxes = CocoWriterUtility.get_instance_statistics(segmentation_map)
+        height, width = segmentation_map.shape
+        for inst, area, bounding_box in zip(instances, areas, bounding_boxes):
+            # Skip the background
+            if inst != 0 and inst in instance_2_category_map:
+                # Only the object mask inside the bounding box is computed, with a border of one pixel, so
+                # polygons are fitted like on the whole image
+                x, y, w, h = bounding_box
+                x_start, y_start = max(x - 1, 0), max(y - 1, 0)
+                cropped_mask = np.where(segmentation_map[y_start:min(y + h + 1, height),
+                                                         x_start:min(x + w + 1, width)] == inst, 1, 0)
+                # Add coco info for object in this image
+                annotation = CocoWriterUtility.create_cropped_annotation_info(None,
+                                                                              None,
+                                                                              instance_2_category_map[inst],
+                                                                              cropped_mask,
+                                                                              (x_start, y_start),
+                                                                              segmentation_map.shape,
+                                                                              int(area),
+                                                                              bounding_box.tolist(),
+                                                                              mask_encoding_format)
+                if annotation is not None:
+                    annotations.append(annotation)
+        return segmentation_map.shape, annotations
+
     @staticmethod
     def merge_coco_annotations(existing_coco_annotations, new_coco_annotations):
         """ Merges the two given coco annotation dicts into one.
@@ -222,7 +411,8 @@ def merge_coco_annotations(existing_coco_annotations, new_coco_annotations):
         existing_coco_annotations["images"].extend(new_coco_annotations["images"])
 
         # Concatenate annotations sections
-        annotation_id_offset = max([annotation["id"] for annotation in existing_coco_annotations["annotations"]]) + 1
+        annotation_id_offset = max([annotation["id"] for annotation in existing_coco_annotations["annotations"]],
+                                   default=-1) + 1
         for annotation in new_coco_annotations["annotations"]:
             annotation["id"] += annotation_id_offset
             annotation["image_id"] += image_id_offset
@@ -268,11 +458,36 @@ def create_annotation_info(annotation_id, image_id, category_id, binary_mask, ma
             return None
 
         bounding_box = CocoWriterUtility.bbox_from_binary_mask(binary_mask)
+        return CocoWriterUtility.create_cropped_annotation_info(annotation_id, image_id, category_id, binary_mask,
+                                                                (0, 0), binary_mask.shape, area, bounding_box,
+                                                                mask_encoding_format, tolerance)
+
+    @staticmethod
+    def create_cropped_annotation_info(annotation_id, image_id, category_id, cropped_mask, offset, image_shape, area,
+                                       bounding_box, mask_encoding_format, tolerance=2):
+        """Creates info section of coco annotation from a mask, which only covers a part of the image
+
+        :param annotation_id: integer to uniquly identify the annotation
+        :param image_id: integer to uniquly identify image
+        :param category_id: Id of the category
+        :param cropped_mask: A binary mask of the object inside a part of the image, containing the whole object.
+        :param offset: The position [x, y] of the cropped mask inside the image.
+        :param image_shape: The shape of the whole image [H, W].
+        :param area: The area of the object.
+        :param bounding_box: The bounding box of the object [x, y, width, height].
+        :param mask_encoding_format: Encoding format of the mask. Type: string.
+        :param tolerance: The tolerance for fitting polygons to the objects mask.
+        """
+        if area < 1:
+            return None
 
         if mask_encoding_format == 'rle':
-            segmentation = CocoWriterUtility.binary_mask_to_rle(binary_mask)
+            segmentation = CocoWriterUtility.binary_mask_to_rle(cropped_mask, offset=offset, image_shape=image_shape)
+        elif mask_encoding_format == 'compressed_rle':
+            segmentation = CocoWriterUtility.binary_mask_to_rle(cropped_mask, compressed=True, offset=offset,
+                                                                image_shape=image_shape)
         elif mask_encoding_format == 'polygon':
-            segmentation = CocoWriterUtility.binary_mask_to_polygon(binary_mask, tolerance)
+            segmentation = CocoWriterUtility.binary_mask_to_polygon(cropped_mask, tolerance, offset)
             if not segmentation:
                 return None
         else:
@@ -286,11 +501,46 @@ def create_annotation_info(annotation_id, image_id, category_id, binary_mask, ma
             "area": area,
             "bbox": bounding_box,
             "segmentation": segmentation,
-            "width": binary_mask.shape[1],
-            "height": binary_mask.shape[0],
+            "width": image_shape[1],
+            "height": image_shape[0],
         }
         return annotation_info
 
+    @staticmethod
+    def get_instance_statistics(segmentation_map):
+        """ Computes the area and the bounding box of all instances in the given instance map at once.
+
+        :param segmentation_map: The instance map with the shape [H, W].
+        :return: The instance ids, their areas and their bounding boxes [x, y, width, height], sorted by instance id.
+        """
+        height, width = segmentation_map.shape
+        if segmentation_map.dtype.kind == "u":
+            # The instance ids can be used as labels directly
+            labels = segmentation_map
+            areas = np.bincount(labels.ravel())
+            instances = np.flatnonzero(areas)
+            areas = areas[instances]
+        else:
+            instances, labels = np.unique(segmentation_map, return_inverse=True)
+            labels = labels.reshape(segmentation_map.shape)
+            areas = np.bincount(labels.ravel(), minlength=len(instances))
+        amount_of_labels = int(labels.max()) + 1 if labels.size else 0
+
+        # Mark for every label the rows and columns it appears in
+        in_rows = np.zeros((amount_of_labels, height), dtype=bool)
+        in_rows[labels, np.arange(height)[:, np.newaxis]] = True
+        in_cols = np.zeros((amount_of_labels, width), dtype=bool)
+        in_cols[labels, np.arange(width)[np.newaxis, :]] = True
+        if segmentation_map.dtype.kind == "u":
+            in_rows, in_cols = in_rows[instances], in_cols[instances]
+
+        rmin = in_rows.argmax(axis=1)
+        rmax = height - 1 - in_rows[:, ::-1].argmax(axis=1)
+        cmin = in_cols.argmax(axis=1)
+        cmax = width - 1 - in_cols[:, ::-1].argmax(axis=1)
+        bounding_boxes = np.stack([cmin, rmin, cmax - cmin + 1, rmax - rmin + 1], axis=1)
+        return instances, areas, bounding_boxes
+
     @staticmethod
     def bbox_from_binary_mask(binary_mask):
         """ Returns the smallest bounding box containing all pixels marked "1" in the given image mask.
@@ -331,13 +581,17 @@ def close_contour(contour):
         return contour
 
     @staticmethod
-    def binary_mask_to_polygon(binary_mask, tolerance=0):
+    def binary_mask_to_polygon(binary_mask, tolerance=0, offset=(0, 0)):
         """Converts a binary mask to COCO polygon representation
 
          :param binary_mask: a 2D binary numpy array where '1's represent the object
          :param tolerance: Maximum distance from original points of polygon to approximated polygonal chain. If
                            tolerance is 0, the original coordinate array is returned.
+         :param offset: If the mask only covers a part of the image, its position [x, y] inside the image.
         """
+        # Imported here, as scikit-image is slow to import and only needed for the polygon encoding
+        from skimage import measure
+
         polygons = []
         # pad mask to close contours of shapes which start and end at an edge
         padded_binary_mask = np.pad(binary_mask, pad_width=1, mode='constant', constant_values=0)
@@ -345,6 +599,8 @@ def binary_mask_to_polygon(binary_mask, tolerance=0):
         # Reverse padding
         contours = contours - 1
         for contour in contours:
+            # Move the contour into the image, before it is approximated with image coordinates
+            contour = contour + [offset[1], offset[0]]
             # Make sure contour is closed
             contour = CocoWriterUtility.close_contour(contour)
             # Approximate contour by polygon
@@ -363,12 +619,64 @@ def binary_mask_to_polygon(binary_mask, tolerance=0):
         return polygons
 
     @staticmethod
-    def binary_mask_to_rle(binary_mask):
-        rle = {'counts': [], 'size': list(binary_mask.shape)}
-        counts = rle.get('counts')
-        for i, (value, elements) in enumerate(groupby(binary_mask.ravel(order='F'))):
-            if i == 0 and value == 1:
-                counts.append(0)
-            counts.append(len(list(elements)))
-
-        return rle
+    def binary_mask_to_rle(binary_mask, compressed=False, offset=(0, 0), image_shape=None):
+        """ Converts a binary mask to the COCO run length encoding.
+
+        The runs are counted in column-major order and alternate between 0s and 1s, starting with 0s.
+
+        :param binary_mask: a 2D binary numpy array where '1's represent the object
+        :param compressed: If true, the counts are encoded as string like pycocotools does it, otherwise as list.
+        :param offset: If the mask only covers a part of the image, its position [x, y] inside the image.
+        :param image_shape: If the mask only covers a part of the image, the shape of the whole image [H, W].
+        :return: A dict with the "counts" and the "size" [H, W].
+        """
+        if image_shape is None:
+            image_shape = binary_mask.shape
+        image_height, image_width = image_shape
+        mask_height = binary_mask.shape[0]
+
+        # Add a row of 0s above and below each column, so no run continues from one column into the next one
+        padded_mask = np.zeros((mask_height + 2, binary_mask.shape[1]), dtype=np.int8)
+        padded_mask[1:-1] = binary_mask
+        # A new run starts, where the value changes
+        run_starts = np.flatnonzero(np.diff(padded_mask.ravel(order='F'))) + 1
+        # Convert the positions in the padded mask into positions in the flattened image
+        columns, rows = np.divmod(run_starts, mask_height + 2)
+        run_starts = (columns + offset[0]) * image_height + rows - 1 + offset[1]
+        # If the mask covers whole columns, a run can continue in the next column. The padding then causes a run end
+        # and a run start at the same position, which cancel each other out
+        image_size = image_height * image_width
+        duplicates = np.flatnonzero(run_starts[1:] == run_starts[:-1])
+        run_starts = np.delete(run_starts, np.concatenate((duplicates, duplicates + 1)))
+        # A run ending with the last pixel does not start a new one
+        run_starts = run_starts[run_starts < image_size]
+
+        counts = np.diff(np.concatenate(([0], run_starts, [image_size]))).tolist() if image_size else []
+        if compressed:
+            counts = CocoWriterUtility._rle_counts_to_string(counts)
+        return {'counts': counts, 'size': [image_height, image_width]}
+
+    @staticmethod
+    def _rle_counts_to_string(counts):
+        """ Encodes the run lengths as string, like rleToString() of pycocotools.
+
+        Every count (after the second one relative to the count two runs before) is stored in chunks of 5 bits,
+        each written as one character starting at '0', where the 6th bit marks whether more chunks follow.
+
+        :param counts: The list of run lengths.
+        :return: The compressed counts.
+        """
+        characters = []
+        for i, count in enumerate(counts):
+            if i > 2:
+                count -= counts[i - 2]
+            more = True
+            while more:
+                chunk = count & 0x1f
+                # Python shifts negative numbers arithmetically, like the C implementation
+                count >>= 5
+                more = count != -1 if chunk & 0x10 else count != 0
+                if more:
+                    chunk |= 0x20
+                characters.append(chr(chunk + 48))
+        return "".join(characters)
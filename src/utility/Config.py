@@ -8,8 +8,32 @@ class Config:
     # Used in get_* functions to denote that no fallback value is specified
     no_fallback = object()
 
+    # If False, every lookup walks the config again (only used for benchmarking)
+    use_memoization = True
+    # The names of the parameters split up into their path, so every name is only split once
+    _compiled_paths = {}
+    # Increased whenever any config changes, this invalidates the memoized values of all config objects
+    _cache_version = 0
+    # Memoized to denote a parameter which does not exist
+    _missing = object()
+    # Returned by the memoization dicts, if a parameter has not been memoized yet
+    _not_memoized = object()
+
     def __init__(self, data):
         self.data = data
+        # Map the parameter names to their stored values (or providers), separately for lookups with and without
+        # building providers
+        self._cache = {}
+        self._raw_cache = {}
+        self._cache_version_of_cache = Config._cache_version
+
+    @staticmethod
+    def invalidate_caches():
+        """ Invalidates the memoized values of all config objects.
+
+        This has to be called, if the data of a config or the global config is changed without using set().
+        """
+        Config._cache_version += 1
 
     def is_empty(self):
         """ Checks if the config contains no parameters.
@@ -39,64 +63,134 @@ def has_param(self, name, block=None):
             return name in block
             
         return False
-            
-    def _get_value(self, name, block=None, allow_invoke_provider=False, global_check=True):
-        """ Returns the value of the parameter with the given name inside the given block.
 
-        Basically just a recursive dict lookup, making sure the parameter exists, otherwise an error is thrown.
+    def set(self, name, value):
+        """ Sets the parameter with the given name, missing parent blocks are created.
+
+        All memoized values are invalidated, as the parameter might also be used as fallback via the global config.
+
+        :param name: The name of the parameter. "/" can be used to represent nested parameters (e.q. "render/iterations" results in ["render"]["iterations]
+        :param value: The new value.
+        """
+        block = self.data
+        path = Config._compile_path(name)
+        for block_name in path[:-1]:
+            if block_name not in block or type(block[block_name]) is not dict:
+                block[block_name] = {}
+            block = block[block_name]
+        block[path[-1]] = value
+        Config.invalidate_caches()
+
+    @staticmethod
+    def _compile_path(name):
+        """ Splits the given parameter name into its path, the result is cached.
+
+        :param name: The name of the parameter, e.g. "render/iterations".
+        :return: The path as tuple, e.g. ("render", "iterations").
+        """
+        path = Config._compiled_paths.get(name)
+        if path is None:
+            path = tuple(name.split("/"))
+            Config._compiled_paths[name] = path
+        return path
+
+    def _get_stored_value(self, name, block=None, allow_invoke_provider=False, global_check=True):
+        """ Returns the value stored for the parameter with the given name, providers are not run.
+
+        Basically just a dict lookup along the path of the parameter, making sure the parameter exists, otherwise an
+        error is thrown. If the parameter is not found in its block, its name is looked up in the global config.
 
         :param name: The name of the parameter. "/" can be used to represent nested parameters (e.q. "render/iterations" results in ["render"]["iterations]
         :param block: A dict containing the configuration. If none, the whole data of this config object will be used.
-        :param allow_invoke_provider: If set to True, then a provider is automatically invoked if the parameter value is a dict.
-        :return: The value of the parameter.
+        :param allow_invoke_provider: If set to True, then a provider is automatically built if the parameter value is a dict.
+        :param global_check: If set to True, the global config is used as fallback.
+        :return: The stored value, which might be a provider.
         """
         if block is None:
             block = self.data
 
-        if "/" in name:
-            delimiter_pos = name.find("/")
-            block_name = name[:delimiter_pos]
+        path = Config._compile_path(name)
+        for block_name in path[:-1]:
             if block_name in block and type(block[block_name]) is dict:
-                return self._get_value(name[delimiter_pos + 1:], block[block_name], allow_invoke_provider)
+                block = block[block_name]
             else:
                 raise NotFoundError("No such configuration block '" + block_name + "'!")
+
+        name = path[-1]
+        if name in block:
+            # Check for whether a provider should be invoked
+            if allow_invoke_provider and type(block[name]) is dict:
+                block[name] = Utility.Utility.build_provider_based_on_config(block[name])
+                # The dict has been replaced, so values memoized before are outdated
+                Config.invalidate_caches()
+            return block[name]
+        elif global_check and GlobalStorage.has_param(name):
+            # this might also throw an NotFoundError
+            return GlobalStorage.get_global_config()._get_stored_value(name, None, allow_invoke_provider, global_check=False)
         else:
-            if name in block:
-
-                # Check for whether a provider should be invoked
-                if allow_invoke_provider and type(block[name]) is dict:
-                    block[name] = Utility.Utility.build_provider_based_on_config(block[name])
-
-                # If the parameter is set to a provider object, call the provider to return the parameter value
-                if isinstance(block[name], Provider):
-                    return block[name].run()
-                else:
-                    return block[name]
-            elif global_check and GlobalStorage.has_param(name):
-                # this might also throw an NotFoundError
-                return GlobalStorage.get_global_config()._get_value(name, None, allow_invoke_provider, global_check=False)
-            else:
-                raise NotFoundError("No such configuration '" + name + "'!")
-            
+            raise NotFoundError("No such configuration '" + name + "'!")
+
+    def _get_value(self, name, block=None, allow_invoke_provider=False, global_check=True):
+        """ Returns the value of the parameter with the given name inside the given block.
+
+        :param name: The name of the parameter. "/" can be used to represent nested parameters (e.q. "render/iterations" results in ["render"]["iterations]
+        :param block: A dict containing the configuration. If none, the whole data of this config object will be used.
+        :param allow_invoke_provider: If set to True, then a provider is automatically invoked if the parameter value is a dict.
+        :return: The value of the parameter.
+        """
+        value = self._get_stored_value(name, block, allow_invoke_provider, global_check)
+        # If the parameter is set to a provider object, call the provider to return the parameter value
+        if isinstance(value, Provider):
+            return value.run()
+        return value
+
     def _get_value_with_fallback(self, name, fallback=no_fallback, allow_invoke_provider=False):
         """ Returns the value of the given parameter with the given name.
 
         If the parameter does not exist, the given fallback value is returned.
         If Config.no_fallback as fallback is given, an error is thrown in such a case.
 
+        The stored value is memoized per config object, so repeated lookups (e.g. inside sampling loops) neither walk
+        the config nor the global config again. Providers are memoized as well, but they are run on every call.
+
         :param name: The name of the parameter. "/" can be used to represent nested parameters (e.q. "render/iterations" results in ["render"]["iterations]
         :param fallback: The fallback value.
         :param allow_invoke_provider: If set to True, then a provider is automatically invoked if the parameter value is a dict.
         :return: The value of the parameter.
         """
-        try:
-            return self._get_value(name, None, allow_invoke_provider)
-        except NotFoundError:
-            if fallback != Config.no_fallback:
-                return fallback
-            else:
+        if not Config.use_memoization:
+            try:
+                return self._get_value(name, None, allow_invoke_provider)
+            except NotFoundError:
+                if fallback is not Config.no_fallback:
+                    return fallback
                 raise
 
+        if self._cache_version_of_cache != Config._cache_version:
+            self._cache = {}
+            self._raw_cache = {}
+            self._cache_version_of_cache = Config._cache_version
+
+        cache = self._cache if allow_invoke_provider else self._raw_cache
+        value = cache.get(name, Config._not_memoized)
+        if value is Config._not_memoized:
+            try:
+                value = self._get_stored_value(name, None, allow_invoke_provider)
+            except NotFoundError:
+                value = Config._missing
+            # Only memoize, if the lookup itself did not change any config
+            if self._cache_version_of_cache == Config._cache_version:
+                cache[name] = value
+
+        if value is Config._missing:
+            if fallback is not Config.no_fallback:
+                return fallback
+            # Raise the original error
+            return self._get_value(name, None, allow_invoke_provider)
+        if isinstance(value, Provider):
+            return value.run()
+        return value
+
     def get_raw_dict(self, name, fallback=no_fallback):
         """ Returns the complete dict stored at the given parameter path.
 
@@ -1,5 +1,5 @@
 import os
-from typing import Dict, List
+from typing import Dict, List, Union, Iterator
 
 import bpy
 import numpy as np
@@ -62,7 +62,8 @@ def _output_vector_field(forward_flow: bool, backward_flow: bool, output_dir: st
     def render(output_dir: str, temp_dir: str, get_forward_flow: bool, get_backward_flow: bool,
                blender_image_coordinate_style: bool = False, forward_flow_output_file_prefix: str = "forward_flow_",
                forward_flow_output_key: str = "forward_flow", backward_flow_output_file_prefix: str = "backward_flow_",
-               backward_flow_output_key: str = "backward_flow", return_data: bool = True) -> Dict[str, List[np.ndarray]]:
+               backward_flow_output_key: str = "backward_flow", return_data: bool = True, stream: bool = False) \
+            -> Union[Dict[str, List[np.ndarray]], Iterator[Dict[str, np.ndarray]]]:
         """ Renders the optical flow (forward and backward) for all frames.
 
         :param output_dir: The directory to write images to.
@@ -75,7 +76,9 @@ def render(output_dir: str, temp_dir: str, get_forward_flow: bool, get_backward_
         :param backward_flow_output_file_prefix: The file prefix that should be used when writing backward flow to a file.
         :param backward_flow_output_key: The key which should be used for storing backward optical flow values.
         :param return_data: Whether to load and return generated data. Backwards compatibility to config-based pipeline.
-        :return: dict of lists of raw renderer outputs. Keys can be 'forward_flow', 'backward_flow'
+        :param stream: If true, an iterator returning the data frame by frame is returned instead of loading all frames
+                       at once, see WriterUtility.iterate_registered_outputs().
+        :return: dict of lists of raw renderer outputs. Keys can be 'forward_flow', 'backward_flow'. With stream, an iterator of dicts per frame.
         """
         if get_forward_flow is False and get_backward_flow is False:
             raise Exception("Take the FlowRenderer Module out of the config if both forward and backward flow are set to False!")
@@ -100,6 +103,8 @@ def render(output_dir: str, temp_dir: str, get_forward_flow: bool, get_backward_
                 if get_forward_flow:
                     file_path = temporary_fwd_flow_file_path + "%04d" % frame + ".exr"
                     fwd_flow_field = load_image(file_path, num_channels=4).astype(np.float32)
+                    # The intermediate rendering is not needed anymore, so free the space in the temp dir
+                    os.remove(file_path)
 
                     if not blender_image_coordinate_style:
                         fwd_flow_field[:, :, 1] = fwd_flow_field[:, :, 1] * -1
@@ -111,6 +116,7 @@ def render(output_dir: str, temp_dir: str, get_forward_flow: bool, get_backward_
                 if get_backward_flow:
                     file_path = temporary_bwd_flow_file_path + "%04d" % frame + ".exr"
                     bwd_flow_field = load_image(file_path, num_channels=4).astype(np.float32)
+                    os.remove(file_path)
 
                     if not blender_image_coordinate_style:
                         bwd_flow_field[:, :, 1] = bwd_flow_field[:, :, 1] * -1
@@ -127,4 +133,6 @@ def render(output_dir: str, temp_dir: str, get_forward_flow: bool, get_backward_
             Utility.register_output(output_dir, backward_flow_output_file_prefix, backward_flow_output_key, '.npy', '2.0.0')
             load_keys.add(backward_flow_output_key)
 
-        return WriterUtility.load_registered_outputs(load_keys) if return_data else {}
+        if not return_data:
+            return {}
+        return WriterUtility.iterate_registered_outputs(load_keys) if stream else WriterUtility.load_registered_outputs(load_keys)
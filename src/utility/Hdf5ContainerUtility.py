@@ -0,0 +1,231 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Tuple
+
+import bpy
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on windows, there the shards are only locked between the threads of one process
+    fcntl = None
+
+from src.main.GlobalStorage import GlobalStorage
+from src.utility.Utility import KeyFrame
+from src.utility.WriterUtility import WriterUtility
+from src.utility.AsyncWriterUtility import AsyncWriterUtility
+
+
+class Hdf5ContainerUtility:
+    """ Appends frames to one hdf5 container (or multiple sharded containers) instead of writing one file per frame.
+
+    Every output key is stored as a resizable dataset of shape [frames, ...], where each frame is one chunk (or
+    multiple, if a chunk shape is given in the hdf5 settings). Strings like the versions are stored as attributes.
+    The dataset "frame_index" stores for every frame its global frame number, the frame number in blender, the
+    camera pose and the config it was generated with.
+
+    A frame does not get its position before it is written: while holding the lock of the shard, the next free
+    position is read from the length of its frame index, all outputs are written there and only then the frame index
+    is extended. So a frame is only visible to readers, once it is complete, the frame index never contains holes and
+    a failed write is simply overwritten by the next frame. The lock is shared with other processes via a
+    <shard>.lock file, so multiple batch workers or run.py calls can append to the same container.
+
+    With multiple shards, the frames are distributed round robin over the shards and the frame at position p of
+    shard s gets the global frame number p * shards + s. As the shards might be filled unevenly, the global frame
+    numbers are unique, but not necessarily contiguous.
+    """
+
+    # The shard the next frame is appended to per container, only used to distribute the frames evenly
+    _next_shards = {}
+    # One lock per shard, as h5py can not open the same file multiple times for writing
+    _locks = {}
+    _locks_lock = threading.Lock()
+
+    @staticmethod
+    def reset():
+        """ Forgets the shards used in a previous pipeline run. """
+        Hdf5ContainerUtility._next_shards = {}
+
+    @staticmethod
+    def get_shard_paths(output_dir: str, shards: int = 1) -> List[str]:
+        """ Returns the paths of all shards of the container in the given directory.
+
+        :param output_dir: The directory of the container.
+        :param shards: The amount of shards.
+        :return: The list of paths.
+        """
+        if shards == 1:
+            return [os.path.join(output_dir, "container.hdf5")]
+        return [os.path.join(output_dir, "container_{:03d}.hdf5".format(shard)) for shard in range(shards)]
+
+    @staticmethod
+    def prepare(output_dir: str, shards: int = 1, append: bool = True):
+        """ Prepares the container before frames are appended to it.
+
+        :param output_dir: The directory of the container.
+        :param shards: The amount of shards.
+        :param append: If False, an existing container in the output dir is replaced.
+        """
+        if shards < 1:
+            raise Exception("The amount of hdf5 container shards has to be at least one.")
+        if not append:
+            # The old container might still be written in the background
+            AsyncWriterUtility.flush(output_dir)
+            for shard_path in Hdf5ContainerUtility.get_shard_paths(output_dir, shards):
+                with Hdf5ContainerUtility._lock_shard(shard_path):
+                    if os.path.exists(shard_path):
+                        os.remove(shard_path)
+        if output_dir not in Hdf5ContainerUtility._next_shards:
+            # Processes appending at the same time start at different shards
+            Hdf5ContainerUtility._next_shards[output_dir] = os.getpid() % shards
+
+    @staticmethod
+    def get_frame_info(source_frame: int) -> Dict[str, Any]:
+        """ Collects the entry of the frame index for the given blender frame.
+
+        :param source_frame: The frame number in blender.
+        :return: The frame info used by append_frame().
+        """
+        with KeyFrame(source_frame):
+            cam2world_matrix = np.array(bpy.context.scene.camera.matrix_world)
+        source_config = GlobalStorage.get("source_config") if GlobalStorage.is_in_storage("source_config") else ""
+        return {"source_frame": source_frame, "cam2world_matrix": cam2world_matrix, "source_config": source_config}
+
+    @staticmethod
+    def append_frame(output_dir: str, frame_data: List[Tuple[str, np.ndarray]], frame_info: Dict[str, Any],
+                     shards: int = 1, hdf5_settings: Dict[str, Dict[str, Any]] = None, async_write: bool = False):
+        """ Appends the data of one frame to the container.
+
+        :param output_dir: The directory of the container.
+        :param frame_data: A list of (key, data) tuples.
+        :param frame_info: The entry of the frame index: "source_frame" (the frame number in blender),
+                           "cam2world_matrix" (4x4) and "source_config".
+        :param shards: The amount of shards.
+        :param hdf5_settings: The compression, chunking and dtype per key, see WriterUtility.get_hdf5_settings().
+        :param async_write: If True, the frame is written in the background.
+        """
+        shard = Hdf5ContainerUtility._next_shards.get(output_dir, 0) % shards
+        Hdf5ContainerUtility._next_shards[output_dir] = (shard + 1) % shards
+        args = (Hdf5ContainerUtility.get_shard_paths(output_dir, shards)[shard], shard, frame_data, frame_info,
+                shards, hdf5_settings)
+        if async_write:
+            AsyncWriterUtility.submit(output_dir, Hdf5ContainerUtility._write_frame, *args)
+        else:
+            Hdf5ContainerUtility._write_frame(*args)
+
+    @staticmethod
+    def _get_lock(shard_path: str) -> threading.Lock:
+        """ Returns the lock, which has to be held while writing to the given shard.
+
+        :param shard_path: The path of the shard.
+        :return: The lock.
+        """
+        with Hdf5ContainerUtility._locks_lock:
+            if shard_path not in Hdf5ContainerUtility._locks:
+                Hdf5ContainerUtility._locks[shard_path] = threading.Lock()
+            return Hdf5ContainerUtility._locks[shard_path]
+
+    @staticmethod
+    @contextmanager
+    def _lock_shard(shard_path: str):
+        """ Locks the given shard against the other threads of this process and against other processes.
+
+        :param shard_path: The path of the shard.
+        """
+        with Hdf5ContainerUtility._get_lock(shard_path):
+            if fcntl is None:
+                yield
+                return
+            # The lock is released by the os, if the process crashes
+            with open(shard_path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _write_frame(shard_path: str, shard: int, frame_data: List[Tuple[str, np.ndarray]],
+                     frame_info: Dict[str, Any], shards: int, hdf5_settings: Dict[str, Dict[str, Any]]) -> int:
+        """ Appends the data of one frame to the given shard.
+
+        :param shard_path: The path of the shard.
+        :param shard: The index of the shard.
+        :param frame_data: A list of (key, data) tuples.
+        :param frame_info: The entry of the frame index.
+        :param shards: The amount of shards.
+        :param hdf5_settings: The compression, chunking and dtype per key.
+        :return: The global frame number of the written frame.
+        """
+        # Imported here, as h5py is slow to import and this utility is also used by all renderers
+        import h5py
+
+        with Hdf5ContainerUtility._lock_shard(shard_path), h5py.File(shard_path, "a") as file:
+            if file.attrs.get("shards", shards) != shards:
+                raise Exception("The container {} was written with {} shards, but {} shards are configured."
+                                .format(shard_path, file.attrs["shards"], shards))
+            file.attrs["shards"] = shards
+            if "frame_index" not in file:
+                index_dtype = np.dtype([("frame", np.int64), ("source_frame", np.int64),
+                                        ("cam2world_matrix", np.float64, (4, 4)),
+                                        ("source_config", h5py.string_dtype())])
+                file.create_dataset("frame_index", shape=(0,), maxshape=(None,), dtype=index_dtype, chunks=(1024,))
+            frame_index = file["frame_index"]
+            # Outputs of a failed write behind the end of the frame index are overwritten
+            shard_frame = len(frame_index)
+            frame = shard_frame * shards + shard
+
+            for key, data in frame_data:
+                if isinstance(data, list):
+                    data = np.array(data)
+                if data.dtype.char == 'S':
+                    # Strings like the versions are the same for all frames
+                    file.attrs[key] = data
+                    continue
+                Hdf5ContainerUtility._write_to_dataset(file, key, shard_frame, data,
+                                                       **WriterUtility.get_hdf5_settings(key, hdf5_settings))
+
+            frame_index.resize(shard_frame + 1, axis=0)
+            frame_index[shard_frame] = (frame, frame_info["source_frame"], frame_info["cam2world_matrix"],
+                                        frame_info["source_config"])
+        print("Appended frame {} as frame {} to {}".format(frame_info["source_frame"], frame, shard_path))
+        return frame
+
+    @staticmethod
+    def _write_to_dataset(file, key: str, shard_frame: int, data: np.ndarray, compression: str = "gzip",
+                          compression_level: int = 4, shuffle: bool = False, chunks: Tuple[int, ...] = None,
+                          dtype: str = None):
+        """ Writes the data of one frame at the given position into the resizable dataset with the given key.
+
+        :param file: The hdf5 file handle. Type: hdf5.File
+        :param key: The key of the dataset.
+        :param shard_frame: The position of the frame inside the dataset.
+        :param data: The data of the frame.
+        :param compression: The compression filter: "gzip", "lzf" or None.
+        :param compression_level: The gzip level between 0 and 9.
+        :param shuffle: If True, the shuffle filter is applied before compressing.
+        :param chunks: The chunk shape of one frame, if None, every frame is stored as one chunk.
+        :param dtype: If given, numeric data is cast to this dtype before writing.
+        """
+        if dtype is not None and data.dtype.kind in "biuf":
+            data = data.astype(dtype)
+
+        if key not in file:
+            if chunks is None:
+                chunks = tuple(max(size, 1) for size in data.shape)
+            file.create_dataset(key, shape=(0,) + data.shape, maxshape=(None,) + data.shape, dtype=data.dtype,
+                                chunks=(1,) + tuple(chunks), compression=compression,
+                                compression_opts=compression_level if compression == "gzip" else None,
+                                shuffle=shuffle)
+        dataset = file[key]
+        if dataset.shape[1:] != data.shape or dataset.dtype != data.dtype:
+            raise Exception("The data of key {} has the shape {} and type {}, but the container stores {} and {}."
+                            .format(key, data.shape, data.dtype, dataset.shape[1:], dataset.dtype))
+
+        dataset.resize(max(dataset.shape[0], shard_frame + 1), axis=0)
+        if compression == "gzip" and data.size > 0 and data.dtype.kind in "biuf":
+            WriterUtility._write_gzip_chunks(dataset, data, compression_level, shuffle, (shard_frame,))
+        else:
+            dataset[shard_frame] = data
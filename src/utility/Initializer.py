@@ -11,6 +11,7 @@
 import addon_utils
 
 from src.utility.RendererUtility import RendererUtility
+from src.utility.AssetCache import AssetCache
 
 
 class Initializer:
@@ -108,7 +109,7 @@ def set_default_parameters():
 
         # Set number of cpu cores used for rendering (1 thread is always used for coordination => 1
         # cpu thread means GPU-only rendering)
-        RendererUtility.set_cpu_threads(1)
+        RendererUtility.set_cpu_threads(DefaultConfig.cpu_threads)
         RendererUtility.set_denoiser(DefaultConfig.denoiser)
 
         RendererUtility.set_simplify_subdivision_render(DefaultConfig.simplify_subdivision_render)
@@ -139,7 +140,7 @@ def cleanup():
 
     @staticmethod
     def _remove_all_data():
-        """ Remove all data blocks except opened scripts and the default scene. """
+        """ Remove all data blocks except opened scripts, the default scene and data blocks owned by the AssetCache. """
         # Go through all attributes of bpy.data
         for collection in dir(bpy.data):
             data_structure = getattr(bpy.data, collection)
@@ -147,8 +148,8 @@ def _remove_all_data():
             if isinstance(data_structure, bpy.types.bpy_prop_collection) and hasattr(data_structure, "remove") and collection not in ["texts"]:
                 # Go over all entities in that collection
                 for block in data_structure:
-                    # Remove everything besides the default scene
-                    if not isinstance(block, bpy.types.Scene) or block.name != "Scene":
+                    # Remove everything besides the default scene and the assets which are reused in the next run
+                    if (not isinstance(block, bpy.types.Scene) or block.name != "Scene") and not AssetCache.is_cached(block):
                         data_structure.remove(block)
 
     @staticmethod
@@ -4,6 +4,7 @@
 
 from src.provider.getter.Material import Material
 from src.utility.Utility import Utility
+from src.utility.AssetCache import AssetCache
 
 
 class MaterialLoaderUtility(object):
@@ -85,7 +86,7 @@ def create_image_node(nodes: bpy.types.Nodes, image_path: str, non_color_mode=Fa
         :return: bpy.type.Node: Return the newly constructed image node
         """
         image_node = nodes.new('ShaderNodeTexImage')
-        image_node.image = bpy.data.images.load(image_path, check_existing=True)
+        image_node.image = AssetCache.load_image(image_path)
         if non_color_mode:
             image_node.image.colorspace_settings.name = 'Non-Color'
         image_node.location.x = x_location
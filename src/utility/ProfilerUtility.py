@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import cProfile
+from typing import List, Dict, Union
+
+import bpy
+
+try:
+    import resource
+except ImportError:
+    # Not available on windows
+    resource = None
+
+
+class PipelineProfiler:
+    """ Collects a machine-readable profile of a pipeline run.
+
+    The profile is written in the chrome trace event format, so it can be opened directly in chrome://tracing or
+    https://ui.perfetto.dev, but it is also easy to parse for comparing many runs. For every module one complete event
+    is written containing:
+
+    - wall_time and cpu_time in seconds
+    - peak_rss_mb: The peak resident set size of the blender process after the module ran (not available on windows)
+    - bpy_data_before / bpy_data_after: The number of objects, meshes, materials and images before and after the module
+
+    Before that, the time spent on importing and on initializing each module is added as "import" and "init" events.
+    Heavy third-party libraries are imported lazily by the utilities, so their import time is attributed to the module
+    which uses them first, which might also happen while running it.
+
+    Additionally, selected modules can be profiled via cProfile, their stats are dumped next to the trace file as
+    <trace file name>_<module index>_<module name>.prof. If the module is run multiple times, the checkpoint
+    variation and the render chunk are appended, e.g. <...>_<module name>_variation1_chunk2.prof.
+    """
+
+    # The collections of bpy.data which are counted before and after each module
+    counted_data_collections = ["objects", "meshes", "materials", "images"]
+
+    def __init__(self, output_path: str, cprofile_modules: List[str] = None):
+        """
+        :param output_path: The path of the json file the trace should be written to.
+        :param cprofile_modules: A list of module names (e.g. "loader.ObjectLoader" or just "ObjectLoader"), which \
+                                 should be profiled via cProfile.
+        """
+        self.output_path = output_path
+        self.cprofile_modules = cprofile_modules if cprofile_modules is not None else []
+        self.events = []
+        self._start = time.time()
+        # The checkpoint variation and the render chunk the modules are currently run for, set by the Pipeline
+        self.variation = 0
+        self.render_chunk = None
+
+    @staticmethod
+    def _count_data_blocks() -> Dict[str, int]:
+        """ Counts the data blocks in the collections of bpy.data which are relevant for the profile.
+
+        :return: A dict mapping from collection name to the number of data blocks.
+        """
+        return {name: len(getattr(bpy.data, name)) for name in PipelineProfiler.counted_data_collections}
+
+    @staticmethod
+    def _get_peak_rss_mb() -> Union[float, None]:
+        """ Returns the peak resident set size of the current process.
+
+        :return: The peak rss in MB or None, if it can not be determined on this platform.
+        """
+        if resource is None:
+            return None
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # On mac os the value is given in bytes, on linux in kilobytes
+        return peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+    def _use_cprofile(self, module_name: str) -> bool:
+        """ Checks if the module with the given name should be profiled via cProfile.
+
+        :param module_name: The full name of the module, e.g. "loader.ObjectLoaderModule".
+        :return: True, if cProfile should be used.
+        """
+        # Modules can be selected with or without their category and "Module" suffix
+        short_name = module_name[:-len("Module")] if module_name.endswith("Module") else module_name
+        candidates = {module_name, short_name, module_name.split(".")[-1], short_name.split(".")[-1]}
+        return any(candidate in self.cprofile_modules for candidate in candidates)
+
+    def add_event(self, name: str, category: str, start: float, duration: float, args: dict = None):
+        """ Adds a complete event to the trace.
+
+        :param name: The name of the event.
+        :param category: The category of the event, e.g. "module".
+        :param start: The start time as returned by time.time().
+        :param duration: The duration in seconds.
+        :param args: Additional information, which is stored with the event.
+        """
+        self.events.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._start) * 1e6,
+            "dur": duration * 1e6,
+            "pid": os.getpid(),
+            "tid": 0,
+            "args": args if args is not None else {}
+        })
+
+    def run_module(self, module, module_name: str, module_index: int):
+        """ Runs the given module and adds its profile to the trace.
+
+        :param module: The module to run.
+        :param module_name: The full name of the module, e.g. "loader.ObjectLoaderModule".
+        :param module_index: The index of the module inside the pipeline.
+        """
+        data_before = PipelineProfiler._count_data_blocks()
+        profile = cProfile.Profile() if self._use_cprofile(module_name) else None
+
+        start, cpu_start = time.time(), time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            module.run()
+        finally:
+            if profile is not None:
+                profile.disable()
+            wall_time, cpu_time = time.time() - start, time.process_time() - cpu_start
+
+            args = {
+                "module_index": module_index,
+                "wall_time": wall_time,
+                "cpu_time": cpu_time,
+                "peak_rss_mb": PipelineProfiler._get_peak_rss_mb(),
+                "bpy_data_before": data_before,
+                "bpy_data_after": PipelineProfiler._count_data_blocks()
+            }
+            # Modules run once per variation and render chunk, so each run gets its own stats file
+            run_suffix = ""
+            if self.variation > 0:
+                args["variation"] = self.variation
+                run_suffix += "_variation{}".format(self.variation)
+            if self.render_chunk is not None:
+                args["render_chunk"] = self.render_chunk
+                run_suffix += "_chunk{}".format(self.render_chunk)
+            if profile is not None:
+                stats_path = "{}_{}_{}{}.prof".format(os.path.splitext(self.output_path)[0], module_index,
+                                                      module_name, run_suffix)
+                profile.dump_stats(stats_path)
+                args["cprofile_stats"] = stats_path
+            self.add_event(module_name, "module", start, wall_time, args)
+
+    def save(self):
+        """ Writes the collected trace to the output path. """
+        if os.path.dirname(self.output_path):
+            os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+        with open(self.output_path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f, indent=2)
+        print("Wrote profile to " + self.output_path)
@@ -0,0 +1,192 @@
+from typing import Union
+
+import bpy
+import numpy as np
+
+from src.utility.Utility import Utility
+
+
+class RenderCaptureUtility:
+    """ Keeps the rendered color images in memory instead of writing them to files and reading them back.
+
+    Every frame is rendered separately and its pixels are copied from the image of a compositor Viewer node into a
+    numpy array. As blender only supports one active Viewer node, only the color image can be captured, all other
+    outputs (distance, normals, ...) are still written by their File Output nodes.
+
+    The captured images are converted in the same way as the file output: .exr keeps the linear float colors, PNG
+    and JPEG apply the sRGB curve of the Standard view transform (or nothing with Raw) and are quantized to the
+    configured color depth. The only difference to the files is blender's dithering of 8 bit images. Other view
+    transforms, like blender's default Filmic, can not be reproduced, so capturing fails for them, unless the view
+    transform is explicitly switched to Standard or Raw while capturing. Then the captured images look different from
+    the files rendered with the scene's view transform. See scripts/check_render_capture.py for a comparison with the
+    files.
+    """
+
+    # Maps the output key to a dict of the captured images per frame
+    _captured = {}
+
+    @staticmethod
+    def render(output_key: str, view_transform: Union[str, None] = None):
+        """ Renders all frames and keeps the color images in memory under the given output key.
+
+        :param output_key: The key of the color output.
+        :param view_transform: If given, the view transform ("Standard" or "Raw") used while capturing, look, \
+                               exposure, gamma and curves are disabled meanwhile. The color management of the \
+                               scene is restored afterwards. If None, the color management of the scene is used, \
+                               which then has to be supported, see _check_color_management().
+        """
+        scene = bpy.context.scene
+        if scene.render.use_multiview:
+            raise Exception("Capturing the rendered images in memory does not support stereo rendering.")
+        view_settings = scene.view_settings
+        previous_view_settings = (view_settings.view_transform, view_settings.look, view_settings.exposure,
+                                  view_settings.gamma, view_settings.use_curve_mapping)
+        if view_transform is not None:
+            if view_transform not in ["Standard", "Raw"]:
+                raise Exception("Only the Standard and Raw view transform can be used while capturing, not {}."
+                                .format(view_transform))
+            if previous_view_settings != (view_transform, "None", 0, 1, False):
+                print("Warning: The color management of the scene (view transform {}) is replaced by the view "
+                      "transform {} while capturing, so the images look different from the rendered files."
+                      .format(view_settings.view_transform, view_transform))
+            view_settings.view_transform = view_transform
+            view_settings.look = "None"
+            view_settings.exposure = 0
+            view_settings.gamma = 1
+            view_settings.use_curve_mapping = False
+        try:
+            RenderCaptureUtility._check_color_management()
+            RenderCaptureUtility._render_frames(output_key)
+        finally:
+            view_settings.view_transform, view_settings.look, view_settings.exposure, view_settings.gamma, \
+                view_settings.use_curve_mapping = previous_view_settings
+
+    @staticmethod
+    def _render_frames(output_key: str):
+        """ Renders all frames and copies the color images from the viewer image.
+
+        :param output_key: The key of the color output.
+        """
+        scene = bpy.context.scene
+        viewer_node = RenderCaptureUtility._add_viewer_node()
+        # Drop the images of the previous rendering
+        captured = RenderCaptureUtility._captured[output_key] = {}
+        width = scene.render.resolution_x * scene.render.resolution_percentage // 100
+        height = scene.render.resolution_y * scene.render.resolution_percentage // 100
+        # All frames are copied into the same buffer, before being converted
+        buffer = np.empty(height * width * 4, dtype=np.float32)
+        try:
+            for frame in range(scene.frame_start, scene.frame_end):
+                scene.frame_set(frame)
+                bpy.ops.render.render(animation=False, write_still=False)
+                viewer_image = bpy.data.images["Viewer Node"]
+                if len(viewer_image.pixels) != len(buffer):
+                    raise Exception("The viewer image has the size {}, but the resolution is {}x{}."
+                                    .format(tuple(viewer_image.size), width, height))
+                viewer_image.pixels.foreach_get(buffer)
+                captured[frame] = RenderCaptureUtility._convert(buffer.reshape(height, width, 4))
+        finally:
+            scene.node_tree.nodes.remove(viewer_node)
+
+    @staticmethod
+    def _check_color_management():
+        """ Makes sure the colors can be converted like blender does it for the file output. """
+        view_settings = bpy.context.scene.view_settings
+        if bpy.context.scene.render.image_settings.file_format != "OPEN_EXR" and \
+                (view_settings.view_transform not in ["Standard", "Raw"] or view_settings.look != "None" or
+                 view_settings.exposure != 0 or view_settings.gamma != 1 or view_settings.use_curve_mapping):
+            raise Exception("Capturing the rendered images in memory only supports the Standard and Raw view "
+                            "transform without look, exposure, gamma or curves, the view transform is {}. Change "
+                            "the color management of the scene or set capture_view_transform: \"Standard\" "
+                            "explicitly, to capture with the Standard view transform instead. Then the images look "
+                            "different from the rendered files."
+                            .format(view_settings.view_transform))
+
+    @staticmethod
+    def _add_viewer_node() -> bpy.types.Node:
+        """ Adds a Viewer node, which gets the same image as the Composite node.
+
+        :return: The new Viewer node.
+        """
+        bpy.context.scene.use_nodes = True
+        nodes = bpy.context.scene.node_tree.nodes
+        links = bpy.context.scene.node_tree.links
+        composite_node = Utility.get_the_one_node_with_type(nodes, "CompositorNodeComposite")
+        if not composite_node.inputs["Image"].is_linked:
+            raise Exception("The composite node is not connected, so there is nothing to capture.")
+
+        viewer_node = nodes.new("CompositorNodeViewer")
+        viewer_node.use_alpha = True
+        # The image might have been modified before the composite node, e.g. by the denoiser
+        links.new(composite_node.inputs["Image"].links[0].from_socket, viewer_node.inputs["Image"])
+        nodes.active = viewer_node
+        return viewer_node
+
+    @staticmethod
+    def _convert(pixels: np.ndarray) -> np.ndarray:
+        """ Converts the linear RGBA pixels of the viewer image like they would be stored in the output file.
+
+        :param pixels: The pixels of shape [height, width, 4], starting with the bottom row.
+        :return: The image of shape [height, width, channels].
+        """
+        image_settings = bpy.context.scene.render.image_settings
+        # Blender stores the rows from bottom to top
+        pixels = pixels[::-1]
+        if not (bpy.context.scene.render.film_transparent and image_settings.color_mode == "RGBA"):
+            pixels = pixels[:, :, :3]
+        if image_settings.file_format == "OPEN_EXR":
+            return pixels.copy()
+
+        pixels = np.clip(pixels, 0, 1)
+        if bpy.context.scene.view_settings.view_transform == "Standard":
+            # The sRGB curve is only applied to the colors, not to the alpha channel
+            colors = pixels[:, :, :3]
+            pixels[:, :, :3] = np.where(colors <= 0.0031308, colors * 12.92, 1.055 * np.power(colors, 1 / 2.4) - 0.055)
+        if image_settings.color_depth == "16":
+            return np.round(pixels * 65535).astype(np.uint16)
+        return np.round(pixels * 255).astype(np.uint8)
+
+    @staticmethod
+    def has_frame(output_key: str, frame: int) -> bool:
+        """ Returns whether the image of the given frame was captured for the given output key.
+
+        :param output_key: The key of the output.
+        :param frame: The frame number.
+        :return: True, if the image is in memory.
+        """
+        return frame in RenderCaptureUtility._captured.get(output_key, {})
+
+    @staticmethod
+    def get_frame(output_key: str, frame: int, num_channels: int = 3) -> np.ndarray:
+        """ Returns the captured image of the given frame.
+
+        :param output_key: The key of the output.
+        :param frame: The frame number.
+        :param num_channels: Number of channels to return, like load_image().
+        :return: The image.
+        """
+        if not RenderCaptureUtility.has_frame(output_key, frame):
+            raise Exception("There is no captured image for the output {} in frame {}.".format(output_key, frame))
+        return RenderCaptureUtility._captured[output_key][frame][:, :, :num_channels]
+
+    @staticmethod
+    def discard(output_key: str):
+        """ Frees the captured images of the given output key.
+
+        :param output_key: The key of the output.
+        """
+        RenderCaptureUtility._captured.pop(output_key, None)
+
+    @staticmethod
+    def save_frame(output_key: str, frame: int, file_path: str):
+        """ Writes the captured image of the given frame to a file, the format is determined by the file ending.
+
+        :param output_key: The key of the output.
+        :param frame: The frame number.
+        :param file_path: The path of the new file.
+        """
+        # Imported here, as imageio is slow to import and not needed by most modules
+        import imageio
+
+        # Keeps the alpha channel, if it was captured
+        imageio.imwrite(file_path, RenderCaptureUtility.get_frame(output_key, frame, num_channels=4))
@@ -1,5 +1,5 @@
 import os
-from typing import Union, Dict, List, Set
+from typing import Union, Dict, List, Set, Iterator
 
 import mathutils
 import math
@@ -10,9 +10,22 @@
 from src.utility.BlenderUtility import get_all_blender_mesh_objects
 from src.utility.Utility import Utility
 from src.utility.WriterUtility import WriterUtility
+from src.utility.TempOutputUtility import TempOutputUtility
+from src.utility.RenderCaptureUtility import RenderCaptureUtility
 
 class RendererUtility:
 
+    # The fastest lossless file format and codec (exr codec or png compression) per output key, used for the file
+    # format or codec "auto". Measured via scripts/benchmark_output_formats.py for a temporary directory in the
+    # shared memory, where writing uncompressed files is the fastest. Run the benchmark to get values for other setups.
+    auto_output_formats = {
+        "colors": {"file_format": "PNG", "codec": 0},
+        "diffuse": {"file_format": "PNG", "codec": 0},
+        "distance": {"file_format": "OPEN_EXR", "codec": "NONE"},
+        "depth": {"file_format": "OPEN_EXR", "codec": "NONE"},
+        "normals": {"file_format": "OPEN_EXR", "codec": "NONE"}
+    }
+
     @staticmethod
     def init():
         """ Initializes the renderer.
@@ -206,7 +219,7 @@ def set_samples(samples: int):
     @staticmethod
     def enable_distance_output(output_dir: Union[str, None] = None, file_prefix: str = "distance_",
                                output_key: str = "distance", distance_start: float = 0.1, distance_range: float = 25.0,
-                               distance_falloff: str = "LINEAR"):
+                               distance_falloff: str = "LINEAR", codec: Union[str, None] = None):
         """ Enables writing distance images.
 
         Distance images will be written in the form of .exr files during the next rendering.
@@ -218,13 +231,15 @@ def enable_distance_output(output_dir: Union[str, None] = None, file_prefix: str
         :param distance_range: Total distance in which the distance is measured. \
                                distance_end = distance_start + distance_range.
         :param distance_falloff: Type of transition used to fade distance. Available: [LINEAR, QUADRATIC, INVERSE_QUADRATIC]
+        :param codec: The exr codec, e.g. "ZIP" or "NONE". "auto" uses the fastest lossless codec, see \
+                      auto_output_formats. If None, blender's default is used.
         """
         if output_dir is None:
             output_dir = Utility.get_temporary_directory()
 
         bpy.context.scene.render.use_compositing = True
         bpy.context.scene.use_nodes = True
-        GlobalStorage.add("renderer_distance_end", distance_start + distance_range)
+        GlobalStorage.set("renderer_distance_end", distance_start + distance_range)
 
         tree = bpy.context.scene.node_tree
         links = tree.links
@@ -250,6 +265,7 @@ def enable_distance_output(output_dir: Union[str, None] = None, file_prefix: str
         output_file.base_path = output_dir
         output_file.format.file_format = "OPEN_EXR"
         output_file.file_slots.values()[0].path = file_prefix
+        RendererUtility._set_codec(output_file.format, codec, output_key, "distance")
 
         # Feed the Z-Buffer or Mist output of the render layer to the input of the file IO layer
         links.new(final_output, output_file.inputs['Image'])
@@ -261,7 +277,7 @@ def enable_distance_output(output_dir: Union[str, None] = None, file_prefix: str
         })
 
     @staticmethod
-    def enable_depth_output(output_dir, file_prefix="depth_", output_key="depth"):
+    def enable_depth_output(output_dir, file_prefix="depth_", output_key="depth", codec=None):
         """ Enables writing depth images.
 
         Depth images will be written in the form of .exr files during the next rendering.
@@ -269,6 +285,8 @@ def enable_depth_output(output_dir, file_prefix="depth_", output_key="depth"):
         :param output_dir: The directory to write files to.
         :param file_prefix: The prefix to use for writing the files.
         :param output_key: The key to use for registering the depth output.
+        :param codec: The exr codec, e.g. "ZIP" or "NONE". "auto" uses the fastest lossless codec, see \
+                      auto_output_formats. If None, blender's default is used.
         """
         bpy.context.scene.render.use_compositing = True
         bpy.context.scene.use_nodes = True
@@ -286,6 +304,7 @@ def enable_depth_output(output_dir, file_prefix="depth_", output_key="depth"):
         output_file.base_path = output_dir
         output_file.format.file_format = "OPEN_EXR"
         output_file.file_slots.values()[0].path = file_prefix
+        RendererUtility._set_codec(output_file.format, codec, output_key, "depth")
 
         # Feed the Z-Buffer output of the render layer to the input of the file IO layer
         links.new(render_layer_node.outputs["Depth"], output_file.inputs['Image'])
@@ -298,7 +317,7 @@ def enable_depth_output(output_dir, file_prefix="depth_", output_key="depth"):
 
     @staticmethod
     def enable_normals_output(output_dir: Union[str, None] = None, file_prefix: str = "normals_",
-                              output_key: str = "normals"):
+                              output_key: str = "normals", codec: Union[str, None] = None):
         """ Enables writing normal images.
 
         Normal images will be written in the form of .exr files during the next rendering.
@@ -306,6 +325,8 @@ def enable_normals_output(output_dir: Union[str, None] = None, file_prefix: str
         :param output_dir: The directory to write files to, if this is None the temporary directory is used.
         :param file_prefix: The prefix to use for writing the files.
         :param output_key: The key to use for registering the normal output.
+        :param codec: The exr codec, e.g. "ZIP" or "NONE". "auto" uses the fastest lossless codec, see \
+                      auto_output_formats. If None, blender's default is used.
         """
         if output_dir is None:
             output_dir = Utility.get_temporary_directory()
@@ -400,6 +421,7 @@ def enable_normals_output(output_dir: Union[str, None] = None, file_prefix: str
         output_file.base_path = output_dir
         output_file.format.file_format = "OPEN_EXR"
         output_file.file_slots.values()[0].path = file_prefix
+        RendererUtility._set_codec(output_file.format, codec, output_key, "normals")
         output_file.location.x = space_between_nodes_x * 15
         links.new(combine_rgba.outputs["Image"], output_file.inputs["Image"])
 
@@ -410,7 +432,8 @@ def enable_normals_output(output_dir: Union[str, None] = None, file_prefix: str
         })
 
     @staticmethod
-    def enable_diffuse_color_output(output_dir: str, file_prefix: str = "diffuse_", output_key: str = "diffuse"):
+    def enable_diffuse_color_output(output_dir: str, file_prefix: str = "diffuse_", output_key: str = "diffuse",
+                                    codec: Union[int, str, None] = None):
         """ Enables writing diffuse color (albedo) images.
 
         Diffuse color images will be written in the form of .png files during the next rendering.
@@ -418,6 +441,8 @@ def enable_diffuse_color_output(output_dir: str, file_prefix: str = "diffuse_",
         :param output_dir: The directory to write files to.
         :param file_prefix: The prefix to use for writing the files.
         :param output_key: The key to use for registering the diffuse color output.
+        :param codec: The png compression between 0 and 100. "auto" uses the fastest lossless compression, see \
+                      auto_output_formats. If None, blender's default is used.
         """
         bpy.context.scene.render.use_compositing = True
         bpy.context.scene.use_nodes = True
@@ -432,6 +457,7 @@ def enable_diffuse_color_output(output_dir: str, file_prefix: str = "diffuse_",
         output_file.base_path = output_dir
         output_file.format.file_format = "PNG"
         output_file.file_slots.values()[0].path = file_prefix
+        RendererUtility._set_codec(output_file.format, codec, output_key, "diffuse")
         links.new(final_output, output_file.inputs['Image'])
         
         Utility.add_output_entry({
@@ -458,7 +484,9 @@ def map_file_format_to_file_ending(file_format: str) -> str:
 
     @staticmethod
     def render(output_dir: Union[str, None] = None, file_prefix: str = "rgb_", output_key: str = "colors",
-               load_keys: Set = None, return_data: bool = True) -> Dict[str, List[np.ndarray]]:
+               load_keys: Set = None, return_data: bool = True, stream: bool = False,
+               capture_in_memory: bool = False, capture_view_transform: Union[str, None] = None) \
+            -> Union[Dict[str, List[np.ndarray]], Iterator[Dict[str, np.ndarray]]]:
         """ Render all frames.
 
         This will go through all frames from scene.frame_start to scene.frame_end and render each of them.
@@ -469,7 +497,14 @@ def render(output_dir: Union[str, None] = None, file_prefix: str = "rgb_", outpu
         :param output_key: The key to use for registering the output.
         :param load_keys: Set of output keys to load when available
         :param return_data: Whether to load and return generated data. Backwards compatibility to config-based pipeline.
-        :return: dict of lists of raw renderer output. Keys can be 'distance', 'colors', 'normals'
+        :param stream: If true, an iterator returning the data frame by frame is returned instead of loading all frames
+                       at once, see WriterUtility.iterate_registered_outputs().
+        :param capture_in_memory: If true, the color images are kept in memory instead of being written to files and \
+                                  read again, see RenderCaptureUtility. The other outputs are still written to files.
+        :param capture_view_transform: If given, the view transform used while capturing the images in memory, \
+                                       "Standard" or "Raw". If None, the color management of the scene is kept, \
+                                       which then has to use one of them.
+        :return: dict of lists of raw renderer output. Keys can be 'distance', 'colors', 'normals'. With stream, an iterator of dicts per frame.
         """
         if output_dir is None:
             output_dir = Utility.get_temporary_directory()
@@ -483,7 +518,11 @@ def render(output_dir: Union[str, None] = None, file_prefix: str = "rgb_", outpu
                         RendererUtility.map_file_format_to_file_ending(bpy.context.scene.render.image_settings.file_format),
                 "version": "2.0.0"
             })
+            # The path is kept, so the images can still be written to files later on
+            Utility.find_registered_output_by_key(output_key)["in_memory"] = capture_in_memory
             load_keys.add(output_key)
+        elif capture_in_memory:
+            raise Exception("An output key is required to capture the rendered images in memory.")
 
         bpy.context.scene.render.filepath = os.path.join(output_dir, file_prefix)
 
@@ -492,25 +531,39 @@ def render(output_dir: Union[str, None] = None, file_prefix: str = "rgb_", outpu
             if len(get_all_blender_mesh_objects()) == 0:
                 raise Exception("There are no mesh-objects to render, "
                                 "please load an object before invoking the renderer.")
-            # As frame_end is pointing to the next free frame, decrease it by one, as
-            # blender will render all frames in [frame_start, frame_ned]
-            bpy.context.scene.frame_end -= 1
-            bpy.ops.render.render(animation=True, write_still=True)
-            # Revert changes
-            bpy.context.scene.frame_end += 1
+            # Wait, if the temporary files exceed the size limit
+            TempOutputUtility.wait_for_space()
+            if capture_in_memory:
+                RenderCaptureUtility.render(output_key, capture_view_transform)
+            else:
+                # As frame_end is pointing to the next free frame, decrease it by one, as
+                # blender will render all frames in [frame_start, frame_ned]
+                bpy.context.scene.frame_end -= 1
+                bpy.ops.render.render(animation=True, write_still=True)
+                # Revert changes
+                bpy.context.scene.frame_end += 1
         
-        return WriterUtility.load_registered_outputs(load_keys) if return_data else {}
+        if not return_data:
+            return {}
+        return WriterUtility.iterate_registered_outputs(load_keys) if stream else WriterUtility.load_registered_outputs(load_keys)
         
     @staticmethod
     def set_output_format(file_format: str, color_depth: int = 8, enable_transparency: bool = False,
-                          jpg_quality: int = 95):
+                          jpg_quality: int = 95, codec: Union[int, str, None] = None, output_key: str = "colors"):
         """ Sets the output format to use for rendering.
 
-        :param file_format: The file format to use, e.q. "PNG", "JPEG" or "OPEN_EXR".
+        :param file_format: The file format to use, e.q. "PNG", "JPEG" or "OPEN_EXR". "auto" uses the fastest lossless
+                            file format and codec for the given output key, see auto_output_formats.
         :param color_depth: The color depth.
         :param enable_transparency: If true, the output will contain a alpha channel and the background will be set transparent.
         :param jpg_quality: The quality to use, if file format is set to "JPEG".
+        :param codec: The exr codec or png compression. "auto" uses the fastest lossless codec, see \
+                      auto_output_formats. If None, the codec is not changed.
+        :param output_key: The key of the rendered output, only used to look up the "auto" settings.
         """
+        if file_format == "auto":
+            file_format = RendererUtility.get_auto_output_format(output_key, "colors")["file_format"]
+            codec = "auto"
         # In case a previous renderer changed these settings
         # Store as RGB by default unless the user specifies store_alpha as true in yaml
         bpy.context.scene.render.image_settings.color_mode = "RGBA" if enable_transparency else "RGB"
@@ -518,10 +571,48 @@ def set_output_format(file_format: str, color_depth: int = 8, enable_transparenc
         bpy.context.scene.render.film_transparent = enable_transparency
         bpy.context.scene.render.image_settings.file_format = file_format
         bpy.context.scene.render.image_settings.color_depth = str(color_depth)
+        RendererUtility._set_codec(bpy.context.scene.render.image_settings, codec, output_key, "colors")
 
         # only influences jpg quality
         bpy.context.scene.render.image_settings.quality = jpg_quality
 
+    @staticmethod
+    def get_auto_output_format(output_key: str, default_key: str) -> Dict[str, Union[str, int]]:
+        """ Returns the fastest lossless file format and codec for the given output key.
+
+        :param output_key: The key of the output.
+        :param default_key: The key to use, if the output key is not in auto_output_formats, e.g. "colors".
+        :return: A dict with the "file_format" and the "codec".
+        """
+        if output_key in RendererUtility.auto_output_formats:
+            return RendererUtility.auto_output_formats[output_key]
+        return RendererUtility.auto_output_formats[default_key]
+
+    @staticmethod
+    def _set_codec(image_settings: bpy.types.ImageFormatSettings, codec: Union[int, str, None], output_key: str,
+                   default_key: str):
+        """ Sets the exr codec or the png compression of the given image settings.
+
+        :param image_settings: The image settings of the scene or of a File Output node.
+        :param codec: The exr codec or png compression, "auto" uses the fastest lossless one. If None, nothing is changed.
+        :param output_key: The key of the output, used to look up the "auto" codec.
+        :param default_key: The key to use, if the output key is not in auto_output_formats.
+        """
+        if codec == "auto":
+            auto_format = RendererUtility.get_auto_output_format(output_key, default_key)
+            if auto_format["file_format"] != image_settings.file_format:
+                raise Exception("The auto codec of the output {} is meant for {} files, but {} files are written."
+                                .format(output_key, auto_format["file_format"], image_settings.file_format))
+            codec = auto_format["codec"]
+        if codec is None:
+            return
+        if image_settings.file_format == "OPEN_EXR":
+            image_settings.exr_codec = codec
+        elif image_settings.file_format == "PNG":
+            image_settings.compression = int(codec)
+        else:
+            raise Exception("A codec can only be set for exr and png files, not for {}.".format(image_settings.file_format))
+
     @staticmethod
     def enable_motion_blur(motion_blur_length: float = 0.5, rolling_shutter_type: str = "NONE",
                            rolling_shutter_length: float = 0.1):
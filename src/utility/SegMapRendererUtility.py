@@ -1,6 +1,6 @@
 import csv
 import os
-from typing import List, Tuple, Union, Dict
+from typing import List, Tuple, Union, Dict, Iterator
 
 import bpy
 import mathutils
@@ -87,7 +87,8 @@ def render(output_dir: str, temp_dir: str, used_attributes: Union[str, List[str]
                used_default_values: Union[Dict[str, str]] = None, file_prefix: str = "segmap_",
                output_key: str = "segmap", segcolormap_output_file_prefix: str = "class_inst_col_map",
                segcolormap_output_key: str = "segcolormap", use_alpha_channel: bool = False,
-               render_colorspace_size_per_dimension: int = 2048, return_data: bool = True) -> Dict[str, List[np.ndarray]]:
+               render_colorspace_size_per_dimension: int = 2048, return_data: bool = True, stream: bool = False) \
+            -> Union[Dict[str, List[np.ndarray]], Iterator[Dict[str, np.ndarray]]]:
         """ Renders segmentation maps for all frames
 
         :param output_dir: The directory to write images to.
@@ -105,7 +106,9 @@ def render(output_dir: str, temp_dir: str, used_attributes: Union[str, List[str]
                                                      [0, 2048] ** 3 as our color space which allows ~8 billion \
                                                      different colors/objects. This should be enough.
         :param return_data: Whether to load and return generated data. Backwards compatibility to config-based pipeline.
-        :return: dict of lists of segmaps and (for instance segmentation) segcolormaps
+        :param stream: If true, an iterator returning the data frame by frame is returned instead of loading all frames
+                       at once, see WriterUtility.iterate_registered_outputs().
+        :return: dict of lists of segmaps and (for instance segmentation) segcolormaps. With stream, an iterator of dicts per frame.
         """
         with Utility.UndoAfterExecution():
             RendererUtility.init()
@@ -170,6 +173,8 @@ def render(output_dir: str, temp_dir: str, used_attributes: Union[str, List[str]
                     file_path = temporary_segmentation_file_path + ("%04d" % frame) + suffix + ".exr"
                     segmentation = load_image(file_path)
                     print(file_path, segmentation.shape)
+                    # The intermediate rendering is not needed anymore, so free the space in the temp dir
+                    os.remove(file_path)
 
                     segmap = Utility.map_back_from_equally_spaced_equidistant_values(segmentation,
                                                                                      num_splits_per_dimension,
@@ -323,4 +328,6 @@ def render(output_dir: str, temp_dir: str, used_attributes: Union[str, List[str]
                                     unique_for_camposes=False)
             load_keys.add(segcolormap_output_key)
         
-        return WriterUtility.load_registered_outputs(load_keys) if return_data else {}
+        if not return_data:
+            return {}
+        return WriterUtility.iterate_registered_outputs(load_keys) if stream else WriterUtility.load_registered_outputs(load_keys)
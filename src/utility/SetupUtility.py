@@ -2,11 +2,17 @@
 import sys
 from sys import platform
 import subprocess
+import hashlib
+import json
 
 class SetupUtility:
 
     # Remember already installed packages, so we do not have to call pip freeze multiple times
     installed_packages = None
+    # True, if pip has been called in this process to collect the installed packages
+    pip_initialized = False
+    # The name of the manifest inside the custom-python-packages dir, which stores the installed packages between runs
+    pip_manifest_name = "blenderproc_pip_manifest.json"
 
     @staticmethod
     def setup(user_required_packages=None, blender_path=None, major_version=None, reinstall_packages=False, debug_args=None):
@@ -63,7 +69,9 @@ def setup_temp_dir(temp_dir):
     def setup_pip(user_required_packages=None, blender_path=None, major_version=None, reinstall_packages=False):
         """ Makes sure the given user required and the general required python packages are installed in the blender proc env
 
-        At the first run all installed packages are collected via pip freeze.
+        At the first run all installed packages are collected via pip freeze and stored in a manifest inside the
+        custom-python-packages dir. Following runs only compare the requested packages with that manifest and only
+        call pip, if a package is missing. The manifest is invalidated, if the content of the package dirs changes.
         If a pip packages is already installed, it is skipped.
 
         :param user_required_packages: A list of pip packages that should be installed. The version number can be specified via the usual == notation.
@@ -103,23 +111,21 @@ def setup_pip(user_required_packages=None, blender_path=None, major_version=None
         else:
             raise Exception("This system is not supported yet: {}".format(platform))
 
+        # Read in the packages which were installed during previous runs, this avoids calling pip on every start up
+        if SetupUtility.installed_packages is None and not reinstall_packages:
+            SetupUtility.installed_packages = SetupUtility._load_pip_manifest(python_bin, packages_path, pre_python_package_path)
+
+        # Only call pip, if at least one of the requested packages is not already installed
+        if SetupUtility.installed_packages is not None and not reinstall_packages and \
+                all(SetupUtility._is_package_installed(package) for package in required_packages):
+            return packages_path
+
         # Init pip
         SetupUtility._ensure_pip(python_bin, packages_path, pre_python_package_path)
 
         # Install all packages
         for package in required_packages:
-            # Extract name and target version
-            if "==" in package:
-                package_name, package_version = package.lower().split('==')
-            else:
-                package_name, package_version = package.lower(), None
-
-            # If the package is given via git, extract package name from url
-            if package_name.startswith("git+"):
-                # Extract part after last slash
-                package_name = package_name[package_name.rfind("/") + 1:]
-                # Replace underscores with dashes as its done by pip
-                package_name = package_name.replace("_", "-")
+            package_name, package_version = SetupUtility._parse_package(package)
 
             # Check if package is installed
             already_installed = package_name in SetupUtility.installed_packages
@@ -137,11 +143,110 @@ def setup_pip(user_required_packages=None, blender_path=None, major_version=None
             # Only install if its not already installed (pip would check this itself, but at first downloads the requested package which of course always takes a while)
             if not already_installed or reinstall_packages:
                 print("Installing pip package {} {}".format(package_name, package_version))
-                subprocess.Popen([python_bin, "-m", "pip", "install", package, "--target", packages_path, "--upgrade"], env=dict(os.environ, PYTHONPATH=packages_path)).wait()
-                SetupUtility.installed_packages[package_name] = package_version
+                return_code = subprocess.Popen([python_bin, "-m", "pip", "install", package, "--target", packages_path, "--upgrade"], env=dict(os.environ, PYTHONPATH=packages_path)).wait()
+                # Failed installations must not end up in the manifest, so they are retried in the next run
+                if return_code == 0:
+                    SetupUtility.installed_packages[package_name] = package_version
 
+        SetupUtility._save_pip_manifest(python_bin, packages_path, pre_python_package_path)
         return packages_path
 
+    @staticmethod
+    def _parse_package(package):
+        """ Extracts the name and the requested version of the given pip package.
+
+        :param package: The pip package, the version number can be specified via the usual == notation.
+        :return: The package name and the version, which is None if no specific version is requested.
+        """
+        # Extract name and target version
+        if "==" in package:
+            package_name, package_version = package.lower().split('==')
+        else:
+            package_name, package_version = package.lower(), None
+
+        # If the package is given via git, extract package name from url
+        if package_name.startswith("git+"):
+            # Extract part after last slash
+            package_name = package_name[package_name.rfind("/") + 1:]
+            # Replace underscores with dashes as its done by pip
+            package_name = package_name.replace("_", "-")
+        return package_name, package_version
+
+    @staticmethod
+    def _is_package_installed(package):
+        """ Checks if the given pip package is installed in the requested version.
+
+        :param package: The pip package, the version number can be specified via the usual == notation.
+        :return: True, if the package does not need to be installed.
+        """
+        package_name, package_version = SetupUtility._parse_package(package)
+        if package_name not in SetupUtility.installed_packages:
+            return False
+        return package_version is None or package_version == SetupUtility.installed_packages[package_name]
+
+    @staticmethod
+    def _pip_manifest_hash(python_bin, packages_path, pre_python_package_path, installed_packages):
+        """ Hashes the installed packages together with the current content of both package directories.
+
+        If something is installed or removed from outside of BlenderProc, the directory content changes and therefore
+        also the hash, which invalidates the manifest. The manifest itself and its temporary files
+        (<manifest>.<pid>.tmp) are not part of the listing.
+
+        :param python_bin: Path to python binary.
+        :param packages_path: Path where our pip packages are installed.
+        :param pre_python_package_path: Path that contains blender's default pip packages.
+        :param installed_packages: The dict of installed packages stored in the manifest.
+        :return: The hash as hex string.
+        """
+        content = [python_bin, sorted(installed_packages.items(), key=lambda item: item[0])]
+        for path in [packages_path, pre_python_package_path]:
+            # The manifest and the temporary manifests of other processes, which are currently saving it, are ignored
+            content.append(sorted(name for name in os.listdir(path) if not name.startswith(SetupUtility.pip_manifest_name)) if os.path.exists(path) else None)
+        return hashlib.sha1(json.dumps(content).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _load_pip_manifest(python_bin, packages_path, pre_python_package_path):
+        """ Reads the installed packages from the manifest, which was written in a previous run.
+
+        :param python_bin: Path to python binary.
+        :param packages_path: Path where our pip packages are installed.
+        :param pre_python_package_path: Path that contains blender's default pip packages.
+        :return: The dict of installed packages or None, if there is no valid manifest.
+        """
+        manifest_path = os.path.join(packages_path, SetupUtility.pip_manifest_name)
+        if not os.path.exists(manifest_path):
+            return None
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            installed_packages = manifest["installed_packages"]
+            if manifest["hash"] != SetupUtility._pip_manifest_hash(python_bin, packages_path, pre_python_package_path, installed_packages):
+                print("The pip manifest is outdated, the installed packages are collected again.")
+                return None
+        except (ValueError, KeyError, AttributeError):
+            print("The pip manifest is corrupted, the installed packages are collected again.")
+            return None
+        return installed_packages
+
+    @staticmethod
+    def _save_pip_manifest(python_bin, packages_path, pre_python_package_path):
+        """ Writes the currently installed packages into the manifest, so the next run does not need to call pip.
+
+        :param python_bin: Path to python binary.
+        :param packages_path: Path where our pip packages are installed.
+        :param pre_python_package_path: Path that contains blender's default pip packages.
+        """
+        manifest = {
+            "hash": SetupUtility._pip_manifest_hash(python_bin, packages_path, pre_python_package_path, SetupUtility.installed_packages),
+            "installed_packages": SetupUtility.installed_packages
+        }
+        # Write to a temporary file first, so parallel blender processes never read a half written manifest
+        manifest_path = os.path.join(packages_path, SetupUtility.pip_manifest_name)
+        tmp_manifest_path = "{}.{}.tmp".format(manifest_path, os.getpid())
+        with open(tmp_manifest_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_manifest_path, manifest_path)
+
     @staticmethod
     def _ensure_pip(python_bin, packages_path, pre_python_package_path):
         """ Make sure pip is installed and read in the already installed packages
@@ -150,7 +255,7 @@ def _ensure_pip(python_bin, packages_path, pre_python_package_path):
         :param packages_path: Path where our pip packages should be installed
         :param pre_python_package_path: Path that contains blender's default pip packages
         """
-        if SetupUtility.installed_packages is None:
+        if not SetupUtility.pip_initialized:
             subprocess.Popen([python_bin, "-m", "ensurepip"], env=dict(os.environ, PYTHONPATH="")).wait()
             # Make sure pip is up-to-date
             subprocess.Popen([python_bin, "-m", "pip", "install", "--upgrade", "pip"], env=dict(os.environ, PYTHONPATH="")).wait()
@@ -168,3 +273,4 @@ def _ensure_pip(python_bin, packages_path, pre_python_package_path):
             installed_packages_name = [ele[2:] if ele.startswith("b'") else ele for ele in installed_packages_name]
             installed_packages_versions = [ele[:-1] if ele.endswith("'") else ele for ele in installed_packages_versions]
             SetupUtility.installed_packages = dict(zip(installed_packages_name, installed_packages_versions))
+            SetupUtility.pip_initialized = True
@@ -0,0 +1,161 @@
+import os
+import time
+from typing import Any, Dict, Set, Union, List
+
+import bpy
+
+from src.utility.Utility import Utility
+from src.utility.RenderCaptureUtility import RenderCaptureUtility
+
+
+class TempOutputUtility:
+    """ Tracks which consumers still need the registered outputs and deletes the temporary files after the last one.
+
+    Consumers (usually writers) declare which output keys they are going to read, after they have read the files of
+    all frames, they release them. As soon as all consumers of a key have released a file, it is deleted. Only files
+    inside the temporary directory are deleted, outputs written into the output directory are never touched. Outputs
+    without any consumer are kept, so nothing is deleted when using the python API without declaring consumers.
+
+    Additionally, a size limit for the temporary files can be set. Before rendering, the renderer then waits until
+    the other processes sharing the temporary root directory (e.g. the workers of a batch) have freed enough space.
+    """
+
+    # Maps each consumer to the set of keys it reads, None means all keys
+    _consumers = {}
+    # Maps each temporary file (or captured output) to the consumers, which have already released it
+    _released = {}
+    # The maximum size of the temporary root directory in MB, None means unlimited
+    size_limit_mb = None
+    # The time in seconds, after which the renderer stops waiting, if the usage has not decreased meanwhile
+    size_limit_timeout = 300
+
+    @staticmethod
+    def reset():
+        """ Removes all consumers, this is done at the start of each pipeline. """
+        TempOutputUtility._consumers = {}
+        TempOutputUtility._released = {}
+
+    @staticmethod
+    def add_consumer(consumer: Any, keys: Union[Set[str], None] = None):
+        """ Declares that the given consumer is going to read the outputs with the given keys.
+
+        :param consumer: The consumer, usually the writer module itself.
+        :param keys: The output keys the consumer reads, None means all outputs.
+        """
+        TempOutputUtility._consumers[consumer] = set(keys) if keys is not None else None
+
+    @staticmethod
+    def release(consumer: Any):
+        """ Marks the files of all current frames of the outputs read by the given consumer as released.
+
+        Files, which have been released by all their consumers, are deleted.
+
+        :param consumer: The consumer, which has finished reading its outputs.
+        """
+        if consumer not in TempOutputUtility._consumers:
+            raise Exception("The consumer {} was never added to the TempOutputUtility.".format(consumer))
+        keys = TempOutputUtility._consumers[consumer]
+        temp_dir = os.path.abspath(Utility.get_temporary_directory())
+
+        for output in Utility.get_registered_outputs():
+            if keys is not None and output["key"] not in keys:
+                continue
+            consumers = [other for other, other_keys in TempOutputUtility._consumers.items()
+                         if other_keys is None or output["key"] in other_keys]
+            if output.get("in_memory", False):
+                # Images captured by the renderer are freed in the same way as the files
+                released = TempOutputUtility._released.setdefault(("in_memory", output["key"]), set())
+                released.add(consumer)
+                if all(other in released for other in consumers):
+                    RenderCaptureUtility.discard(output["key"])
+                    del TempOutputUtility._released[("in_memory", output["key"])]
+            for path in TempOutputUtility._get_output_files(output):
+                if not os.path.abspath(path).startswith(temp_dir + os.sep):
+                    continue
+                released = TempOutputUtility._released.setdefault(path, set())
+                released.add(consumer)
+                if all(other in released for other in consumers):
+                    os.remove(path)
+                    del TempOutputUtility._released[path]
+
+    @staticmethod
+    def _get_output_files(output: Dict[str, Any]) -> List[str]:
+        """ Returns all existing files of the given output for the current frames, including stereo images.
+
+        :param output: The registered output.
+        :return: The list of paths.
+        """
+        paths = set()
+        for frame in range(bpy.context.scene.frame_start, bpy.context.scene.frame_end):
+            path = Utility.resolve_path(output["path"] % frame if "%" in output["path"] else output["path"])
+            path_split = path.split(".")
+            paths.update([path, "{}_L.{}".format(path_split[0], path_split[1]),
+                          "{}_R.{}".format(path_split[0], path_split[1])])
+        return sorted(path for path in paths if os.path.exists(path))
+
+    @staticmethod
+    def get_directory_size(path: str) -> int:
+        """ Returns the size of all files inside the given directory.
+
+        :param path: The path of the directory.
+        :return: The size in bytes.
+        """
+        size = 0
+        for root, _, files in os.walk(path):
+            for file in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, file))
+                except FileNotFoundError:
+                    # Removed meanwhile
+                    pass
+        return size
+
+    @staticmethod
+    def get_shared_temp_root() -> str:
+        """ Returns the temporary directory shared by all processes started by the same run.py call.
+
+        The workers of a batch use the sub directories worker_<i> of it, see run.py.
+
+        :return: The path of the shared temporary directory.
+        """
+        temp_dir = os.path.abspath(Utility.get_temporary_directory())
+        name = os.path.basename(temp_dir)
+        if name.startswith("worker_") and name[len("worker_"):].isdigit():
+            return os.path.dirname(temp_dir)
+        return temp_dir
+
+    @staticmethod
+    def wait_for_space():
+        """ Waits until the size of the shared temporary root directory is below the size limit.
+
+        Only the files inside the temporary root directory are counted, so the limit covers all workers of a batch,
+        but not unrelated files on the same file system. Only the space used by other processes is waited for, as
+        the files of this process are not freed while waiting. If the usage did not decrease for
+        size_limit_timeout seconds, the rendering starts anyway.
+        """
+        if TempOutputUtility.size_limit_mb is None:
+            return
+        temp_dir = Utility.get_temporary_directory()
+        temp_root = TempOutputUtility.get_shared_temp_root()
+        limit = TempOutputUtility.size_limit_mb * 1024 * 1024
+        last_progress = time.time()
+        last_used = None
+        while True:
+            used = TempOutputUtility.get_directory_size(temp_root)
+            if used <= limit:
+                return
+            if TempOutputUtility.get_directory_size(temp_dir) >= limit:
+                print("Warning: The temporary files of this process alone exceed the limit of {} MB."
+                      .format(TempOutputUtility.size_limit_mb))
+                return
+            if last_used is None:
+                print("The temporary files use {:.1f} MB, which is more than the limit of {} MB, waiting for "
+                      "other processes to free space".format(used / 1024 / 1024, TempOutputUtility.size_limit_mb))
+            elif used < last_used:
+                last_progress = time.time()
+            elif time.time() - last_progress > TempOutputUtility.size_limit_timeout:
+                print("Warning: The size of the temporary files did not decrease for {} seconds, rendering "
+                      "anyway.".format(TempOutputUtility.size_limit_timeout))
+                return
+            last_used = used
+            time.sleep(1)
@@ -8,7 +8,6 @@
 import time
 import inspect
 import importlib
-import git
 
 from src.main.GlobalStorage import GlobalStorage
 from src.utility.Config import Config
@@ -19,9 +18,11 @@ class Utility:
     working_dir = ""
     temp_dir = ""
     used_temp_id = None
+    # The index of all modules inside src, see get_module_registry()
+    _module_registry = None
 
     @staticmethod
-    def initialize_modules(module_configs):
+    def initialize_modules(module_configs, profiler=None):
         """ Initializes the modules described in the given configuration.
 
         Example for module_configs:
@@ -45,12 +46,14 @@ def initialize_modules(module_configs):
               "amount_of_repetitions": 3
             }, ...]
 
-        Here the name contains the path to the module class, starting from inside the src directory.
+        Here the name contains the path to the module class, starting from inside the src directory. The python file
+        of the module is looked up in the module registry, so only the configured modules are imported.
 
         Be aware that all attributes stored in the GlobalStorage are also accessible here, even though
         they are not copied into the new config.
 
         :param module_configs: A list of dicts, each one describing one module.
+        :param profiler: If given, the import and initialization time of every module is added to this PipelineProfiler.
         :return: a list of initialized modules
         """
         modules = []
@@ -73,39 +76,72 @@ def initialize_modules(module_configs):
                 amount_of_repetitions = Config(module_config).get_int("amount_of_repetitions")
 
             with Utility.BlockStopWatch("Initializing module " + module_config["module"]):
-                for i in range(amount_of_repetitions):
-                    module_class = None
-                    # For backwards compatibility we allow to specify a modules also without "Module" suffix.
-                    for suffix in ["Module", ""]:
-                        try:
-                            # Try to load the module using the current suffix
-                            module = importlib.import_module("src." + module_config["module"] + suffix)
-                        except ModuleNotFoundError:
-                            # Try next suffix
-                            continue
-
-                        # Check if the loaded module has a class with the same name
-                        class_name = module_config["module"].split(".")[-1] + suffix
-                        if hasattr(module, class_name):
-                            # Import file and extract class
-                            module_class = getattr(module, class_name)
-                            break
-
-                    # Throw an error if no module/class with the specified name + any suffix has been found
-                    if module_class is None:
-                        raise Exception("The module src." + module_config["module"] + " was not found!")
+                start = time.time()
+                module_class = Utility.get_module_class(module_config["module"])
+                if profiler is not None:
+                    profiler.add_event(module_config["module"], "import", start, time.time() - start)
 
+                for i in range(amount_of_repetitions):
+                    start = time.time()
                     # Create module
                     modules.append(module_class(Config(config)))
+                    if profiler is not None:
+                        profiler.add_event(module_config["module"], "init", start, time.time() - start)
 
         return modules
 
+    @staticmethod
+    def get_module_registry() -> Dict[str, Tuple[str, str]]:
+        """ Returns the index of all python files inside the src directory, without importing any of them.
+
+        The index is generated once by scanning the src directory and maps e.g. "writer.Hdf5Writer" to
+        ("src.writer.Hdf5Writer", "Hdf5Writer").
+
+        :return: A dict mapping the module name relative to src to the python module path and the expected class name.
+        """
+        if Utility._module_registry is None:
+            src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            registry = {}
+            for root, dirs, files in os.walk(src_dir):
+                dirs[:] = [d for d in dirs if d != "__pycache__"]
+                for file in files:
+                    if file.endswith(".py") and file != "__init__.py":
+                        rel_path = os.path.relpath(os.path.join(root, file[:-len(".py")]), src_dir)
+                        name = rel_path.replace(os.path.sep, ".")
+                        registry[name] = ("src." + name, file[:-len(".py")])
+            Utility._module_registry = registry
+        return Utility._module_registry
+
+    @staticmethod
+    def get_module_class(module_name: str) -> type:
+        """ Imports the module with the given name and returns its class.
+
+        For backwards compatibility, modules can also be specified without their "Module" suffix.
+
+        :param module_name: The name of the module relative to src, e.g. "renderer.RgbRenderer".
+        :return: The class of the module.
+        """
+        registry = Utility.get_module_registry()
+        for suffix in ["Module", ""]:
+            if module_name + suffix in registry:
+                module_path, class_name = registry[module_name + suffix]
+                module = importlib.import_module(module_path)
+                # Check if the loaded module has a class with the same name
+                if hasattr(module, class_name):
+                    return getattr(module, class_name)
+
+        # Throw an error if no module/class with the specified name + any suffix has been found
+        raise Exception("The module src." + module_name + " was not found!")
+
     @staticmethod
     def get_current_version():
         """ Gets the git commit hash.
 
         :return: a string, the BlenderProc version, or None if unavailable
         """
+        # Imported here, as gitpython is slow to import and only needed by the writers
+        import git
+
         try:
             repo = git.Repo(search_parent_directories=True)
         except git.InvalidGitRepositoryError as e:
@@ -1,5 +1,6 @@
 import os
-from typing import List, Dict, Union, Any, Set, Tuple
+import shutil
+from typing import List, Dict, Union, Any, Set, Tuple, Iterable, Iterator
 from collections import defaultdict
 
 from src.utility.SetupUtility import SetupUtility
@@ -9,15 +10,18 @@
 import csv
 import math
 import json
+import zlib
+import itertools
 
 import bpy
 import mathutils
-import h5py
 
-from src.utility.BlenderUtility import load_image
+from src.utility.BlenderUtility import load_image, load_images
 from src.utility.MathUtility import MathUtility
 from src.utility.Utility import Utility
 from src.utility.CameraUtility import CameraUtility
+from src.utility.AsyncWriterUtility import AsyncWriterUtility
+from src.utility.RenderCaptureUtility import RenderCaptureUtility
 
 
 class WriterUtility:
@@ -31,31 +35,72 @@ def load_registered_outputs(keys: Set[str]) -> Dict[str, List[np.ndarray]]:
         :return: dict of lists of raw loaded outputs. Keys can be 'distance', 'colors', 'normals'
         """
         output_data_dict = {}
-        reg_outputs = Utility.get_registered_outputs()
-
-        for reg_out in reg_outputs:
-            if reg_out['key'] in keys:
-                for frame_id in range(bpy.context.scene.frame_start, bpy.context.scene.frame_end):
-                    output_path = Utility.resolve_path(reg_out['path'] % frame_id)
-                    if not os.path.exists(output_path):
-                        # check for the stereo files
-                        output_paths = WriterUtility._get_stereo_path_pair(output_path)
-                        # convert to a tensor of shape [2, img_x, img_y, channels]
-                        # output_file[0] is the left image and output_file[1] the right image
-                        output_file = np.array([WriterUtility.load_output_file(path) for path in output_paths])
-                        # remove the stored files
-                        # TODO remove the files after loading, make sure that no writer uses theses files anymore
-                        # for path in output_paths:
-                        #    os.remove(path)
-                    else:
-                        output_file = WriterUtility.load_output_file(output_path)
-                        # remove the stored file
-                        # TODO remove the files after loading, make sure that no writer uses theses files anymore
-                        # os.remove(output_path)
-                    output_data_dict.setdefault(reg_out['key'], []).append(output_file)
-
+        for frame_data in WriterUtility.iterate_registered_outputs(keys):
+            for key, data in frame_data.items():
+                output_data_dict.setdefault(key, []).append(data)
         return output_data_dict
 
+    @staticmethod
+    def iterate_registered_outputs(keys: Set[str]) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Loads the registered outputs with the specified keys frame by frame.
+
+        In contrast to load_registered_outputs(), only the outputs of one frame are kept in memory. The result can
+        be given directly to save_to_hdf5(). The outputs are loaded when the next frame is requested, so the files
+        must not be overwritten before, e.g. by rendering again.
+
+        :param keys: set of output_key types to load
+        :return: An iterator, which returns for every frame a dict mapping the output keys to the loaded outputs.
+        """
+        reg_outputs = [reg_out for reg_out in Utility.get_registered_outputs() if reg_out['key'] in keys]
+        for frame_id in range(bpy.context.scene.frame_start, bpy.context.scene.frame_end):
+            frame_data = {}
+            for reg_out in reg_outputs:
+                output_path = reg_out['path'] % frame_id if '%' in reg_out['path'] else reg_out['path']
+                output_path = Utility.resolve_path(output_path)
+                if reg_out.get("in_memory", False) and RenderCaptureUtility.has_frame(reg_out['key'], frame_id):
+                    # Captured by the renderer, so there is no file to load
+                    output_file = RenderCaptureUtility.get_frame(reg_out['key'], frame_id)
+                elif not os.path.exists(output_path):
+                    # check for the stereo files
+                    output_paths = WriterUtility._get_stereo_path_pair(output_path)
+                    # convert to a tensor of shape [2, img_x, img_y, channels]
+                    # output_file[0] is the left image and output_file[1] the right image
+                    output_file = np.array(load_images(list(output_paths))
+                                           if output_paths[0].lower().endswith((".exr", ".png", ".jpg"))
+                                           else [WriterUtility.load_output_file(path) for path in output_paths])
+                else:
+                    output_file = WriterUtility.load_output_file(output_path)
+                # The files are not removed here, the TempOutputUtility removes them after their last consumer
+                frame_data[reg_out['key']] = output_file
+            yield frame_data
+
+    @staticmethod
+    def copy_output_file(output: Dict[str, Any], frame: int, target_path: str, link: bool = False):
+        """ Copies the file of the given registered output and frame, images captured in memory are encoded instead.
+
+        :param output: The registered output.
+        :param frame: The frame number.
+        :param target_path: The path of the copy.
+        :param link: If true, a hard link to the file is created instead of a copy. If that is not possible, e.g. as
+                     the target is on another file system, the file is copied.
+        """
+        if output.get("in_memory", False) and RenderCaptureUtility.has_frame(output["key"], frame):
+            RenderCaptureUtility.save_frame(output["key"], frame, target_path)
+            return
+
+        source_path = Utility.resolve_path(output["path"] % frame)
+        if link:
+            # An existing target would be overwritten by copying as well
+            if os.path.lexists(target_path):
+                os.remove(target_path)
+            try:
+                os.link(source_path, target_path)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(source_path, target_path)
+
     @staticmethod
     def _get_stereo_path_pair(file_path: str) -> Tuple[str, str]:
         """
@@ -71,11 +116,12 @@ def _get_stereo_path_pair(file_path: str) -> Tuple[str, str]:
         return path_l, path_r
 
     @staticmethod
-    def load_output_file(file_path: str, write_alpha_channel: bool = False) -> np.ndarray:
+    def load_output_file(file_path: str, write_alpha_channel: bool = False, keep_half_float: bool = False) -> np.ndarray:
         """ Tries to read in the file with the given path into a numpy array.
 
         :param file_path: The file path. Type: string.
         :param write_alpha_channel: Whether to load the alpha channel as well. Type: bool. Default: False
+        :param keep_half_float: Whether half float .exr images may be returned as float16, see load_image().
         :return: A numpy array containing the data of the file.
         """
         if not os.path.exists(file_path):
@@ -85,7 +131,8 @@ def load_output_file(file_path: str, write_alpha_channel: bool = False) -> np.nd
 
         if file_ending in ["exr", "png", "jpg"]:
             # num_channels is 4 if transparent_background is true in config
-            return load_image(file_path, num_channels=3 + (1 if write_alpha_channel else 0))
+            return load_image(file_path, num_channels=3 + (1 if write_alpha_channel else 0),
+                              keep_half_float=keep_half_float)
         elif file_ending in ["npy", "npz"]:
             return np.load(file_path)
         elif file_ending in ["csv"]:
@@ -216,14 +263,21 @@ def _get_shapenet_attribute(shapenet_obj: bpy.types.Object, attribute_name: str)
             return WriterUtility.get_common_attribute(shapenet_obj, attribute_name)
 
     @staticmethod
-    def save_to_hdf5(output_dir_path: str, output_data_dict: Dict[str, List[np.ndarray]],
-                     append_to_existing_output: bool = False, stereo_separate_keys: bool = False):
+    def save_to_hdf5(output_dir_path: str,
+                     output_data_dict: Union[Dict[str, List[np.ndarray]], Iterable[Dict[str, np.ndarray]]],
+                     append_to_existing_output: bool = False, stereo_separate_keys: bool = False,
+                     async_write: bool = False, async_writer_workers: Union[int, None] = None,
+                     max_in_flight_frames: Union[int, None] = None,
+                     hdf5_settings: Dict[str, Dict[str, Any]] = None, use_container: bool = False,
+                     container_shards: int = 1):
         """
         Saves the information provided inside of the output_data_dict into a .hdf5 container
 
         :param output_dir_path: The folder path in which the .hdf5 containers will be generated
         :param output_data_dict: The container, which keeps the different images, which should be saved to disc.
-                                 Each key will be saved as its own key in the .hdf5 container.
+                                 Each key will be saved as its own key in the .hdf5 container. Instead of a dict of
+                                 lists, also an iterable returning one dict per frame can be given, e.g. from
+                                 iterate_registered_outputs(), then only one frame is loaded at a time.
         :param append_to_existing_output: If this is True, the output_dir_path folder will be scanned for pre-existing
                                           .hdf5 containers and the numbering of the newly added containers, will start
                                           right where the last run left off.
@@ -231,19 +285,50 @@ def save_to_hdf5(output_dir_path: str, output_data_dict: Dict[str, List[np.ndarr
                                      won't be saved in one tensor [2, img_x, img_y, channels], where the img[0] is the
                                      left image and img[1] the right. They will be saved in separate keys: for example
                                      for colors in colors_0 and colors_1.
+        :param async_write: If this is True, the frames are compressed and written by background threads and this
+                            function returns as soon as all frames are queued. Call WriterUtility.flush() to wait
+                            until all files are written, in config mode the pipeline does this at the end.
+        :param async_writer_workers: The amount of threads, which compress and write frames in parallel. The threads
+                                     are shared by all writers, so only a larger amount than the current one
+                                     (by default 1) has an effect. If None, the current amount is kept.
+        :param max_in_flight_frames: The maximum amount of frames, which are queued or being written at the same time.
+                                     Shared by all writers like async_writer_workers, by default 2. If None, the
+                                     current amount is kept.
+        :param hdf5_settings: The compression, chunking and dtype per key, see WriterUtility.get_hdf5_settings().
+        :param use_container: If this is True, all frames are appended to one container.hdf5 file with one dataset
+                              of shape [frames, ...] per key and a frame index, see Hdf5ContainerUtility. If
+                              append_to_existing_output is False, an existing container is replaced.
+        :param container_shards: The amount of container files the frames are distributed to, only used with
+                                 use_container.
         """
-
         if not os.path.exists(output_dir_path):
             os.makedirs(output_dir_path)
 
-        amount_of_frames = 0
-        for data_block in output_data_dict.values():
-            if isinstance(data_block, list):
-                amount_of_frames = max([amount_of_frames, len(data_block)])
+        if isinstance(output_data_dict, dict):
+            amount_of_frames = 0
+            for data_block in output_data_dict.values():
+                if isinstance(data_block, list):
+                    amount_of_frames = max([amount_of_frames, len(data_block)])
+
+            if amount_of_frames != bpy.context.scene.frame_end - bpy.context.scene.frame_start:
+                raise Exception("The amount of images stored in the output_data_dict does not correspond with the "
+                                "amount of images specified by frame_start to frame_end.")
+            frame_iterator = WriterUtility._iterate_output_data_dict(output_data_dict)
+        else:
+            amount_of_frames = bpy.context.scene.frame_end - bpy.context.scene.frame_start
+            frame_iterator = iter(output_data_dict)
 
         # if append to existing output is turned on the existing folder is searched for the highest occurring
         # index, which is then used as starting point for this run
-        if append_to_existing_output:
+        if use_container:
+            # Imported here, as the container utility itself depends on this utility
+            from src.utility.Hdf5ContainerUtility import Hdf5ContainerUtility
+            Hdf5ContainerUtility.prepare(output_dir_path, container_shards, append_to_existing_output)
+            # The position of each frame in the container is only determined, while it is written
+            frame_offset = 0
+        elif append_to_existing_output:
+            # Files of a previous call might still be written in the background
+            AsyncWriterUtility.flush(output_dir_path)
             frame_offset = 0
             # Look for hdf5 file with highest index
             for path in os.listdir(output_dir_path):
@@ -254,42 +339,148 @@ def save_to_hdf5(output_dir_path: str, output_data_dict: Dict[str, List[np.ndarr
         else:
             frame_offset = 0
 
-        if amount_of_frames != bpy.context.scene.frame_end - bpy.context.scene.frame_start:
-            raise Exception("The amount of images stored in the output_data_dict does not correspond with the amount"
-                            "of images specified by frame_start to frame_end.")
+        if async_write and (async_writer_workers is not None or max_in_flight_frames is not None):
+            # The settings are only ever increased, so 1 keeps the current value
+            AsyncWriterUtility.configure(async_writer_workers if async_writer_workers is not None else 1,
+                                         max_in_flight_frames if max_in_flight_frames is not None else 1)
 
+        # The version is the same for all frames
+        blender_proc_version = Utility.get_current_version()
         for frame in range(bpy.context.scene.frame_start, bpy.context.scene.frame_end):
             # for each frame a new .hdf5 file is generated
             hdf5_path = os.path.join(output_dir_path, str(frame + frame_offset) + ".hdf5")
-            with h5py.File(hdf5_path, "w") as file:
-                # Go through all the output types
-                print(f"Merging data for frame {frame} into {hdf5_path}")
-
-                for key, data_block in output_data_dict.items():
-                    if frame < len(data_block):
-                        # get the current data block for the current frame
-                        used_data_block = data_block[frame]
-                        if stereo_separate_keys and (bpy.context.scene.render.use_multiview or
-                                                     used_data_block.shape[0] == 2):
-                            # stereo mode was activated
-                            WriterUtility._write_to_hdf_file(file, key + "_0", data_block[frame][0])
-                            WriterUtility._write_to_hdf_file(file, key + "_1", data_block[frame][1])
-                        else:
-                            WriterUtility._write_to_hdf_file(file, key, data_block[frame])
-                    else:
-                        raise Exception(f"There are more frames {frame} then there are blocks of information "
-                                        f" {len(data_block)} in the given list for key {key}.")
-                blender_proc_version = Utility.get_current_version()
-                if blender_proc_version:
-                    WriterUtility._write_to_hdf_file(file, "blender_proc_version", np.string_(blender_proc_version))
+
+            frame_dict = next(frame_iterator, None)
+            if frame_dict is None:
+                raise Exception(f"The given output data ended after {frame - bpy.context.scene.frame_start} frames, "
+                                f"but {amount_of_frames} frames are specified by frame_start to frame_end.")
+
+            frame_data = []
+            for key, used_data_block in frame_dict.items():
+                if stereo_separate_keys and (bpy.context.scene.render.use_multiview or
+                                             used_data_block.shape[0] == 2):
+                    # stereo mode was activated
+                    frame_data.append((key + "_0", used_data_block[0]))
+                    frame_data.append((key + "_1", used_data_block[1]))
+                else:
+                    frame_data.append((key, used_data_block))
+            if blender_proc_version:
+                frame_data.append(("blender_proc_version", np.string_(blender_proc_version)))
+
+            if use_container:
+                print(f"Appending data for frame {frame} to {output_dir_path}")
+                Hdf5ContainerUtility.append_frame(output_dir_path, frame_data,
+                                                  Hdf5ContainerUtility.get_frame_info(frame), container_shards,
+                                                  hdf5_settings, async_write)
+                continue
+
+            print(f"Merging data for frame {frame} into {hdf5_path}")
+            if async_write:
+                # Blocks, if there are already max_in_flight_frames frames queued
+                AsyncWriterUtility.submit(output_dir_path, WriterUtility._write_hdf5_file, hdf5_path, frame_data,
+                                          hdf5_settings)
+            else:
+                WriterUtility._write_hdf5_file(hdf5_path, frame_data, hdf5_settings)
+
+    @staticmethod
+    def _iterate_output_data_dict(output_data_dict: Dict[str, List[np.ndarray]]) -> Iterator[Dict[str, np.ndarray]]:
+        """ Returns the data of the given dict of lists frame by frame.
+
+        :param output_data_dict: The dict mapping the output keys to the lists of frames.
+        :return: An iterator, which returns for every frame a dict mapping the output keys to the data of the frame.
+        """
+        for frame in range(bpy.context.scene.frame_start, bpy.context.scene.frame_end):
+            frame_dict = {}
+            for key, data_block in output_data_dict.items():
+                if frame < len(data_block):
+                    # get the current data block for the current frame
+                    frame_dict[key] = data_block[frame]
+                else:
+                    raise Exception(f"There are more frames {frame} then there are blocks of information "
+                                    f" {len(data_block)} in the given list for key {key}.")
+            yield frame_dict
+
+    @staticmethod
+    def flush():
+        """ Waits until all frames, which are written in the background, are written and raises any error, which
+        occurred while writing.
+        """
+        AsyncWriterUtility.flush()
 
     @staticmethod
-    def _write_to_hdf_file(file, key: str, data: np.ndarray, compression: str = "gzip"):
+    def _write_hdf5_file(hdf5_path: str, frame_data: List[Tuple[str, np.ndarray]],
+                         hdf5_settings: Dict[str, Dict[str, Any]] = None):
+        """ Writes the given data of one frame into a new hdf5 file.
+
+        :param hdf5_path: The path of the hdf5 file.
+        :param frame_data: A list of (key, data) tuples.
+        :param hdf5_settings: The compression, chunking and dtype per key, see WriterUtility.get_hdf5_settings().
+        """
+        # Imported here, as h5py is slow to import and this utility is also used by all renderers
+        import h5py
+
+        with h5py.File(hdf5_path, "w") as file:
+            for key, data in frame_data:
+                WriterUtility._write_to_hdf_file(file, key, data, **WriterUtility.get_hdf5_settings(key, hdf5_settings))
+
+    @staticmethod
+    def get_hdf5_settings(key: str, hdf5_settings: Dict[str, Dict[str, Any]] = None) -> Dict[str, Any]:
+        """ Returns the settings used to store the dataset with the given key.
+
+        The hdf5_settings map keys (e.g. "colors", "distance") to their settings, all other keys use the settings
+        stored under "default". Each setting is optional:
+
+        - compression: "gzip" (default), "lzf" or "none".
+        - compression_level: The gzip level between 0 and 9. Default: 4.
+        - shuffle: If true, the shuffle filter is applied before compressing, this usually helps float data. Default: False
+        - chunks: The chunk shape as list or "auto" (default) to let h5py choose it.
+        - dtype: The data is cast to this dtype before writing, e.g. "float16" for normals or distance. Default: None
+
+        .. code-block:: yaml
+
+            {
+              "default": {"compression": "gzip", "compression_level": 4},
+              "colors": {"compression": "lzf"},
+              "distance": {"compression": "gzip", "shuffle": True, "dtype": "float16"}
+            }
+
+        :param key: The key of the dataset.
+        :param hdf5_settings: The settings per key.
+        :return: The keyword arguments for _write_to_hdf_file().
+        """
+        if hdf5_settings is None:
+            return {}
+        settings = hdf5_settings[key] if key in hdf5_settings else hdf5_settings.get("default", {})
+
+        unknown_settings = set(settings.keys()) - {"compression", "compression_level", "shuffle", "chunks", "dtype"}
+        if unknown_settings:
+            raise Exception("Unknown hdf5 settings for key {}: {}".format(key, ", ".join(sorted(unknown_settings))))
+
+        compression = settings.get("compression", "gzip")
+        if compression not in ["gzip", "lzf", "none"]:
+            raise Exception("Unknown hdf5 compression {} for key {}, available: gzip, lzf, none".format(compression, key))
+        chunks = settings.get("chunks", "auto")
+        return {
+            "compression": compression if compression != "none" else None,
+            "compression_level": settings.get("compression_level", 4),
+            "shuffle": settings.get("shuffle", False),
+            "chunks": tuple(chunks) if isinstance(chunks, list) else None,
+            "dtype": settings.get("dtype", None)
+        }
+
+    @staticmethod
+    def _write_to_hdf_file(file, key: str, data: np.ndarray, compression: str = "gzip", compression_level: int = 4,
+                           shuffle: bool = False, chunks: Tuple[int, ...] = None, dtype: str = None):
         """ Adds the given data as a new entry to the given hdf5 file.
 
         :param file: The hdf5 file handle. Type: hdf5.File
         :param key: The key at which the data should be stored in the hdf5 file.
         :param data: The data to store.
+        :param compression: The compression filter: "gzip", "lzf" or None.
+        :param compression_level: The gzip level between 0 and 9.
+        :param shuffle: If True, the shuffle filter is applied before compressing.
+        :param chunks: The chunk shape, if None, h5py chooses it when compressing.
+        :param dtype: If given, numeric data is cast to this dtype before writing.
         """
         if not isinstance(data, np.ndarray) and not isinstance(data, np.bytes_):
             if isinstance(data, list):
@@ -297,7 +488,48 @@ def _write_to_hdf_file(file, key: str, data: np.ndarray, compression: str = "gzi
             else:
                 raise Exception(f"This fct. expects the data for key {key} to be a np.ndarray not a {type(data)}!")
 
+        if dtype is not None and data.dtype.kind in "biuf":
+            data = data.astype(dtype)
+
         if data.dtype.char == 'S':
             file.create_dataset(key, data=data, dtype=data.dtype)
+        elif compression == "gzip" and data.ndim > 0 and data.size > 0 and data.dtype.kind in "biuf":
+            # Compress the chunks outside of h5py: zlib releases the GIL, while h5py serializes all calls, so this
+            # allows multiple background writers to compress in parallel. The result is the same as letting h5py
+            # compress the data, a gzip compressed dataset with the chunk shape chosen by h5py.
+            dataset = file.create_dataset(key, shape=data.shape, dtype=data.dtype, compression=compression,
+                                          compression_opts=compression_level, shuffle=shuffle, chunks=chunks)
+            WriterUtility._write_gzip_chunks(dataset, data, compression_level, shuffle)
+        elif compression is None:
+            file.create_dataset(key, data=data, chunks=chunks)
         else:
-            file.create_dataset(key, data=data, compression=compression)
+            file.create_dataset(key, data=data, compression=compression, shuffle=shuffle, chunks=chunks)
+
+    @staticmethod
+    def _write_gzip_chunks(dataset, data: np.ndarray, compression_level: int, shuffle: bool,
+                           offset_prefix: Tuple[int, ...] = ()):
+        """ Compresses the given data chunk by chunk via zlib and writes the chunks directly into the given dataset.
+
+        :param dataset: The gzip compressed and chunked hdf5 dataset. Type: h5py.Dataset
+        :param data: The data to write, its shape has to match the last dimensions of the dataset.
+        :param compression_level: The gzip level between 0 and 9.
+        :param shuffle: If True, the bytes are shuffled like the shuffle filter does it, before compressing.
+        :param offset_prefix: The position in the leading dimensions of the dataset, at which the data is written.
+                              E.g. (frame,) when writing one frame into a dataset of shape [frames, H, W, C].
+        """
+        chunk_shape = dataset.chunks[len(offset_prefix):]
+        # The leading dimensions have to be covered by exactly one chunk
+        if any(chunk_size != 1 for chunk_size in dataset.chunks[:len(offset_prefix)]):
+            raise Exception("The chunks of dataset {} have to be of size one in the leading dimensions.".format(dataset.name))
+        for offset in itertools.product(*[range(0, size, chunk_size) for size, chunk_size in zip(data.shape, chunk_shape)]):
+            chunk = data[tuple(slice(start, start + chunk_size) for start, chunk_size in zip(offset, chunk_shape))]
+            if chunk.shape != chunk_shape:
+                # Chunks at the border are always stored in full size
+                padded_chunk = np.zeros(chunk_shape, dtype=data.dtype)
+                padded_chunk[tuple(slice(0, size) for size in chunk.shape)] = chunk
+                chunk = padded_chunk
+            chunk_bytes = np.ascontiguousarray(chunk).tobytes()
+            if shuffle:
+                # The shuffle filter groups the n-th bytes of all elements together
+                chunk_bytes = np.frombuffer(chunk_bytes, dtype=np.uint8).reshape(-1, data.dtype.itemsize).T.tobytes()
+            dataset.id.write_direct_chunk(tuple(offset_prefix) + offset, zlib.compress(chunk_bytes, compression_level))
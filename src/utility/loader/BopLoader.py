@@ -13,6 +13,7 @@
 from src.utility.CameraUtility import CameraUtility
 from src.utility.MeshObjectUtility import MeshObject
 from src.utility.Utility import Utility
+from src.utility.AssetCache import AssetCache
 
 
 class BopLoader:
@@ -366,7 +367,7 @@ def _load_texture(cur_obj: bpy.types.Object, texture_file_path: str, bop_dataset
         if not os.path.exists(texture_file_path):
             raise Exception("The texture path for the ycbv object could not be loaded from the "
                             "file: {}".format(texture_file_path))
-        color_image.image = bpy.data.images.load(texture_file_path, check_existing=True)
+        color_image.image = AssetCache.load_image(texture_file_path)
 
         principled = Utility.get_the_one_node_with_type(nodes, "BsdfPrincipled")
         links.new(color_image.outputs["Color"], principled.inputs["Base Color"])
@@ -4,6 +4,7 @@
 
 from src.utility.MaterialLoaderUtility import MaterialLoaderUtility
 from src.utility.Utility import Utility
+from src.utility.AssetCache import AssetCache
 
 class CCMaterialLoader:
 
@@ -74,6 +75,12 @@ def load(folder_path: str = "resources/cctextures", used_assets: list = None, pr
                     if fill_used_empty_materials:
                         new_mat = MaterialLoaderUtility.find_cc_material_by_name(asset, add_custom_properties)
                     else:
+                        # if the material was already loaded in a previous batch run, a copy of it can be used
+                        if not preload:
+                            cached_mat = AssetCache.get_material(base_image_path)
+                            if cached_mat is not None:
+                                CCMaterialLoader._reuse_cached_material(cached_mat, asset, add_custom_properties)
+                                continue
                         new_mat = MaterialLoaderUtility.create_new_cc_material(asset, add_custom_properties)
 
                     # if preload then the material is only created but not filled
@@ -91,9 +98,26 @@ def load(folder_path: str = "resources/cctextures", used_assets: list = None, pr
                     CCMaterialLoader.create_material(new_mat, base_image_path, ambient_occlusion_image_path,
                                                      metallic_image_path, roughness_image_path, alpha_image_path,
                                                      normal_image_path, displacement_image_path)
+                    if not fill_used_empty_materials:
+                        AssetCache.add_material(base_image_path, new_mat)
         else:
             raise Exception("The folder path does not exist: {}".format(folder_path))
 
+    @staticmethod
+    def _reuse_cached_material(material: bpy.types.Material, material_name: str, add_custom_properties: dict):
+        """ Prepares the copy of a cached cc material, like it would have been newly created.
+
+        :param material: The copy of the cached material.
+        :param material_name: The name of the material
+        :param add_custom_properties: The custom properties, which should be added to the material
+        """
+        material.name = material_name
+        for key, value in add_custom_properties.items():
+            if key.startswith("cp_"):
+                material[key[len("cp_"):]] = value
+            else:
+                raise Exception("All cp have to start with cp_")
+
     @staticmethod
     def create_material(new_mat: bpy.types.Material, base_image_path: str, ambient_occlusion_image_path: str, metallic_image_path: str,
                         roughness_image_path: str, alpha_image_path: str, normal_image_path: str, displacement_image_path: str):
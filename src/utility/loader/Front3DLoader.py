@@ -11,6 +11,7 @@
 from src.utility.MaterialUtility import Material
 from src.utility.MeshObjectUtility import MeshObject
 from src.utility.Utility import Utility
+from src.utility.AssetCache import AssetCache
 from src.utility.loader.ObjectLoader import ObjectLoader
 
 
@@ -252,7 +253,7 @@ def _load_furniture_objs(data: dict, future_model_path: str, lamp_light_strength
                         image_node = mat.new_node('ShaderNodeTexImage')
                         # and load the texture.png
                         base_image_path = os.path.join(folder_path, "texture.png")
-                        image_node.image = bpy.data.images.load(base_image_path, check_existing=True)
+                        image_node.image = AssetCache.load_image(base_image_path)
                         mat.link(image_node.outputs['Color'], principled_node.inputs['Base Color'])
                         # if the object is a lamp, do the same as for the ceiling and add an emission shader
                         if is_lamp:
@@ -5,6 +5,7 @@
 import bpy
 
 from src.utility.Utility import Utility
+from src.utility.AssetCache import AssetCache
 
 
 class HavenEnvironmentLoader:
@@ -52,7 +53,7 @@ def set_world_background_hdr_img(path_to_hdr_file):
 
         # add a texture node and load the image and link it
         texture_node = nodes.new(type="ShaderNodeTexEnvironment")
-        texture_node.image = bpy.data.images.load(path_to_hdr_file, check_existing=True)
+        texture_node.image = AssetCache.load_image(path_to_hdr_file)
 
         # get the one output node of the world shader
         output_node = Utility.get_the_one_node_with_type(nodes, "Output")
@@ -1,10 +1,10 @@
 import os
-import os
 from typing import List
 
 import bpy
 
 from src.utility.MeshObjectUtility import MeshObject
+from src.utility.AssetCache import AssetCache
 
 
 class ObjectLoader:
@@ -34,6 +34,12 @@ def load(filepath: str, cached_objects: dict = None, **kwargs) -> List[MeshObjec
                     cached_objects[filepath] = loaded_objects
                     return loaded_objects
             else:
+                # reuse the meshes, if this file has already been loaded in a previous batch run
+                import_settings = str(sorted(kwargs.items()))
+                reused_objects = AssetCache.get_objects(filepath, import_settings)
+                if reused_objects is not None:
+                    return MeshObject.convert_to_meshes(reused_objects)
+
                 # save all selected objects
                 previously_selected_objects = set(bpy.context.selected_objects)
                 if filepath.endswith('.obj'):
@@ -50,6 +56,8 @@ def load(filepath: str, cached_objects: dict = None, **kwargs) -> List[MeshObjec
                         obj.data.materials.append(mat)
 
                 # return all currently selected objects
-                return MeshObject.convert_to_meshes(list(set(bpy.context.selected_objects) - previously_selected_objects))
+                loaded_objects = list(set(bpy.context.selected_objects) - previously_selected_objects)
+                AssetCache.add_objects(filepath, loaded_objects, import_settings)
+                return MeshObject.convert_to_meshes(loaded_objects)
         else:
             raise Exception("The given filepath does not exist: {}".format(filepath))
\ No newline at end of file
@@ -8,6 +8,7 @@
 from src.utility.LabelIdMapping import LabelIdMapping
 from src.utility.MeshObjectUtility import MeshObject
 from src.utility.Utility import Utility
+from src.utility.AssetCache import AssetCache
 from src.utility.loader.ObjectLoader import ObjectLoader
 
 
@@ -86,7 +87,7 @@ def _random_sample_materials_for_each_obj(loaded_objects: List[MeshObject], text
                     image_paths.sort()
                     image_path = random.choice(image_paths)
                     if os.path.exists(image_path):
-                        texture_node.image = bpy.data.images.load(image_path, check_existing=True)
+                        texture_node.image = AssetCache.load_image(image_path)
                     else:
                         raise Exception("No image was found for this entity: {}, "
                                         "material name: {}".format(obj.get_name(), mat_name))
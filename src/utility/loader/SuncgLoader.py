@@ -13,6 +13,7 @@
 from src.utility.EntityUtility import Entity
 from src.utility.MeshObjectUtility import MeshObject
 from src.utility.Utility import Utility
+from src.utility.AssetCache import AssetCache
 from src.utility.loader.ObjectLoader import ObjectLoader
 from typing import Tuple
 
@@ -116,7 +117,8 @@ def _rename_materials():
         """
         # TODO: should only be done to suncg materials
         for material in bpy.data.materials:
-            if material.use_nodes:
+            # AssetCache.is_cached() recognizes the pristine copies by their cache_marker property, not by their name
+            if material.use_nodes and not AssetCache.is_cached(material):
                 nodes = material.node_tree.nodes
                 textures = Utility.get_nodes_with_type(nodes, "ShaderNodeTexImage")
                 if len(textures) == 1:
@@ -392,7 +394,7 @@ def _adjust_material_nodes(mat: Material, adjustments: dict):
 
             image_node = mat.get_the_one_node_with_type("ShaderNodeTexImage")
             if os.path.exists(image_path):
-                image_node.image = bpy.data.images.load(image_path, check_existing=True)
+                image_node.image = AssetCache.load_image(image_path)
             else:
                 print("Warning: Cannot load texture, path does not exist: {}, remove image node again".format(image_path))
                 mat.remove_node(image_node)
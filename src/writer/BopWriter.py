@@ -1,5 +1,6 @@
 from src.writer.WriterInterface import WriterInterface
 from src.utility.BopWriterUtility import BopWriterUtility
+from src.utility.TempOutputUtility import TempOutputUtility
 
 class BopWriter(WriterInterface):
     """ Saves the synthesized dataset in the BOP format. The dataset is split
@@ -37,10 +38,23 @@ class BopWriter(WriterInterface):
           - Original bop annotations and models are in mm. If true, we convert the gt annotations to mm here. This
             is needed if BopLoader option mm2m is used. Default: True
           - bool
+        * - append_log
+          - If true, the GT annotations and camera info of the new frames are appended to the log scene_log.jsonl of
+            the chunk, instead of reading and rewriting its scene_gt.json and scene_camera.json. This keeps appending
+            single frames to large chunks cheap. The log is merged into the json files, when the chunk is full, when
+            writing without append_log or via compact_logs_at_end. Until then, the BOP toolkit can not read the last,
+            partial chunk. Default: False
+          - bool
+        * - compact_logs_at_end
+          - If true, the logs of all chunks are merged into their scene_gt.json and scene_camera.json after writing,
+            like BopWriterUtility.compact_chunk_logs() does it, so the dataset can be read by the BOP toolkit. Merging
+            reads and rewrites the last chunk, so only set it for the last of many appending runs. Default: False
+          - bool
     """
 
     def __init__(self, config):
         WriterInterface.__init__(self, config)
+        TempOutputUtility.add_consumer(self, {"colors", "distance"})
         
         # Parse configuration.
         self._dataset = self.config.get_string("dataset", "")
@@ -59,6 +73,10 @@ def __init__(self, config):
         # Output translation gt in mm
         self._mm2m = self.config.get_bool("m2mm", True)
 
+        # Append the annotations to a log, which is merged when the chunk is full
+        self._append_log = self.config.get_bool("append_log", False)
+        self._compact_logs_at_end = self.config.get_bool("compact_logs_at_end", False)
+
     def run(self):
         """ Stores frames and annotations for objects from the specified dataset.
         """
@@ -68,8 +86,13 @@ def run(self):
         else:
             BopWriterUtility.write(output_dir = self._determine_output_dir(False), 
                                 dataset = self._dataset, 
-                                append_to_existing_output = self._append_to_existing_output, 
+                                append_to_existing_output = self._append_to_existing_output or not self._is_first_render_chunk(), 
                                 depth_scale = self._depth_scale, 
                                 save_world2cam = self._save_world2cam, 
                                 ignore_dist_thres = self._ignore_dist_thres, 
-                                m2mm = self._mm2m)
\ No newline at end of file
+                                m2mm = self._mm2m,
+                                async_write = self._async_write,
+                                append_log = self._append_log)
+            if self._compact_logs_at_end:
+                BopWriterUtility.compact_chunk_logs(self._determine_output_dir(False), self._dataset)
+            TempOutputUtility.release(self)
\ No newline at end of file
@@ -2,6 +2,7 @@
 
 from src.utility.CocoWriterUtility import CocoWriterUtility
 from src.writer.WriterInterface import WriterInterface
+from src.utility.TempOutputUtility import TempOutputUtility
 
 class CocoAnnotationsWriter(WriterInterface):
     """ Writes Coco Annotations in to a file.
@@ -36,8 +37,28 @@ class CocoAnnotationsWriter(WriterInterface):
             no collisions. Default: False.
           - bool
         * - mask_encoding_format
-          - Encoding format of the binary masks. Default: 'rle'. Available: 'rle', 'polygon'.
+          - Encoding format of the binary masks. Default: 'rle'. Available: 'rle', 'compressed_rle' (the string
+            encoding of pycocotools, which is much smaller), 'polygon'.
           - string
+        * - annotation_workers
+          - The amount of processes, which generate the annotations of the frames in parallel. The results are merged
+            in the order of the frames, so the ids do not depend on it. The processes are forked, so this is only
+            used on systems supporting fork, e.g. linux. The rgb images are copied by the same amount of threads.
+            Especially useful for the polygon encoding. Can not be combined with async_write, as the processes
+            would be forked from a background thread. Default: 1.
+          - int
+        * - link_images
+          - If true, the rgb images are hard linked into the output directory instead of copied, if both are on the
+            same file system. Blender overwrites files in place, so only use this, if the temporary images are not
+            rendered again afterwards, e.g. as they are deleted after writing. Default: False.
+          - bool
+        * - sharded_output
+          - If true, the annotations of every run (or render chunk) are written into a new shard
+            coco_annotations_shard_xxxxxx.json. Appending then only reads and rewrites the small index file
+            coco_annotations_index.json, which holds the categories, the next free ids and the list of shards,
+            instead of the whole dataset. Merge the shards into one coco_annotations.json via
+            scripts/merge_coco_shards.py. Default: False.
+          - bool
     """
 
     def __init__(self, config):
@@ -47,9 +68,17 @@ def __init__(self, config):
         self._supercategory = self.config.get_string("supercategory", "coco_annotations")
         self.segmap_output_key = self.config.get_string("segmap_output_key", "segmap")
         self.segcolormap_output_key = self.config.get_string("segcolormap_output_key", "segcolormap")
+        TempOutputUtility.add_consumer(self, {self.rgb_output_key, self.segmap_output_key, self.segcolormap_output_key})
         self._coco_data_dir = os.path.join(self._determine_output_dir(False), 'coco_data')
         self.mask_encoding_format = self.config.get_string("mask_encoding_format", "rle")
         self._append_to_existing_output = self.config.get_bool("append_to_existing_output", False)
+        self._annotation_workers = self.config.get_int("annotation_workers", 1)
+        if self._async_write and self._annotation_workers > 1:
+            raise Exception("The CocoAnnotationsWriter does not support async_write together with "
+                            "annotation_workers > 1, as forking the workers from a background thread might "
+                            "deadlock them.")
+        self._link_images = self.config.get_bool("link_images", False)
+        self._sharded_output = self.config.get_bool("sharded_output", False)
 
     def run(self):
         """ Writes coco annotations in the following steps:
@@ -66,7 +95,12 @@ def run(self):
         CocoWriterUtility.write(self._coco_data_dir,
                                 mask_encoding_format = self.mask_encoding_format,
                                 supercategory = self._supercategory,
-                                append_to_existing_output = self._append_to_existing_output,
+                                append_to_existing_output = self._append_to_existing_output or not self._is_first_render_chunk(),
                                 segmap_output_key = self.segmap_output_key,
                                 segcolormap_output_key = self.segcolormap_output_key,
-                                rgb_output_key = self.rgb_output_key)
\ No newline at end of file
+                                rgb_output_key = self.rgb_output_key,
+                                async_write = self._async_write,
+                                workers = self._annotation_workers,
+                                link_images = self._link_images,
+                                sharded = self._sharded_output)
+        TempOutputUtility.release(self)
\ No newline at end of file
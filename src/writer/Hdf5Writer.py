@@ -4,14 +4,18 @@
 SetupUtility.setup_pip(["h5py"])
 
 import os
+from typing import Dict, Any, List
 
 import bpy
-import h5py
 import numpy as np
 
 from src.main.GlobalStorage import GlobalStorage
 from src.writer.WriterInterface import WriterInterface
 from src.utility.Utility import Utility
+from src.utility.AsyncWriterUtility import AsyncWriterUtility
+from src.utility.Hdf5ContainerUtility import Hdf5ContainerUtility
+from src.utility.RenderCaptureUtility import RenderCaptureUtility
+from src.utility.TempOutputUtility import TempOutputUtility
 
 
 class Hdf5Writer(WriterInterface):
@@ -31,11 +35,28 @@ class Hdf5Writer(WriterInterface):
             with already existing hdf5 files in the output directory. Default: False
           - bool
         * - compression
-          - The compression technique that should be used when storing data in a hdf5 file.
+          - The compression technique that should be used when storing data in a hdf5 file, if not specified
+            differently in hdf5_settings. Available: ["gzip", "lzf", "none"]. Default: "gzip"
           - string
+        * - hdf5_settings
+          - The compression, compression_level, shuffle, chunks and dtype per output key. Keys, which are not
+            listed, use the settings under "default". See WriterUtility.get_hdf5_settings() for all options.
+            Casting e.g. "normals" or "distance" to "float16" is lossy. Default: {}
+          - dict
         * - delete_temporary_files_afterwards
-          - True, if all temporary files should be deleted after merging. Default value: True.
+          - True, if all temporary files should be deleted after merging. Files, which are also read by other
+            writers, are only deleted after all of them have read them. Default value: True.
           - bool
+        * - use_container
+          - If true, all frames are appended to one container.hdf5 file, which stores every output as one dataset
+            of shape [frames, ...] together with a frame index holding the camera pose and source config of every
+            frame. Appending does not scan the output directory and multiple processes can append to the same
+            container. If append_to_existing_output is false, an existing container is replaced. Default: False
+          - bool
+        * - container_shards
+          - The amount of container files (container_000.hdf5, ...) the frames are distributed to, e.g. to allow
+            multiple readers or background writers to work in parallel. Only used with use_container. Default: 1
+          - int
         * - stereo_separate_keys
           - If true, stereo images are saved as two separate images \*_0 and \*_1. Default: False
             (stereo images are combined into one np.array (2, ...)).
@@ -45,14 +66,29 @@ class Hdf5Writer(WriterInterface):
     def __init__(self, config):
         WriterInterface.__init__(self, config)
         self._append_to_existing_output = self.config.get_bool("append_to_existing_output", False)
+        self._use_container = self.config.get_bool("use_container", False)
+        self._container_shards = self.config.get_int("container_shards", 1)
+        # Merges all registered outputs
+        TempOutputUtility.add_consumer(self)
         self._output_dir = self._determine_output_dir(False)
+        self._hdf5_settings = dict(self.config.get_raw_dict("hdf5_settings", {}))
+        if "default" not in self._hdf5_settings:
+            self._hdf5_settings["default"] = {"compression": self.config.get_string("compression", "gzip")}
 
     def run(self):
         if self._avoid_output:
             print("Avoid output is on, no output produced!")
             return
 
-        if self._append_to_existing_output:
+        if self._use_container:
+            # The position of each frame in the container is only determined, while it is written
+            frame_offset = 0
+        elif not self._is_first_render_chunk():
+            # The files of the further render chunks continue the numbering of the first one
+            frame_offset = self._frame_offset
+        elif self._append_to_existing_output:
+            # Files of previous runs might still be written in the background
+            AsyncWriterUtility.flush(self._output_dir)
             frame_offset = 0
             # Look for hdf5 file with highest index
             for path in os.listdir(self._output_dir):
@@ -62,61 +98,106 @@ def run(self):
                         frame_offset = max(frame_offset, int(index) + 1)
         else:
             frame_offset = 0
+        self._frame_offset = frame_offset
 
-        # Go through all frames
-        for frame in range(bpy.context.scene.frame_start, bpy.context.scene.frame_end):
+        if not GlobalStorage.is_in_storage("output"):
+            print("No output was designed in prior models!")
+            return
 
-            # Create output hdf5 file
+        # The version is the same for all frames
+        blender_proc_version = Utility.get_current_version()
+        outputs = GlobalStorage.get("output")
+        frames = range(bpy.context.scene.frame_start, bpy.context.scene.frame_end)
+        # If the data is stored as float16 anyway, half float images do not have to be converted to float32
+        keep_half_float = {output_type["key"]: WriterUtility.get_hdf5_settings(output_type["key"], self._hdf5_settings)
+                           .get("dtype") == "float16" for output_type in outputs}
+        output_paths = [[self._get_output_paths(output_type, frame) for output_type in outputs] for frame in frames]
+        # The files of the next frames are loaded in the background, while the current frame is postprocessed and
+        # written. Postprocessing might need bpy, so it is always done here.
+        loaded_frames = self._prefetch_output_files(
+            [[(path, output_type["key"], keep_half_float[output_type["key"]])
+              for output_type, paths in zip(outputs, frame_paths) for path in paths]
+             for frame_paths in output_paths])
+        if self._use_container:
+            # Only done after all outputs were found, so a missing file does not remove an existing container
+            Hdf5ContainerUtility.prepare(self._output_dir, self._container_shards,
+                                         self._append_to_existing_output or not self._is_first_render_chunk())
+
+        # Go through all frames
+        for frame, frame_paths, loaded_files in zip(frames, output_paths, loaded_frames):
             hdf5_path = os.path.join(self._output_dir, str(frame + frame_offset) + ".hdf5")
-            with h5py.File(hdf5_path, "w") as f:
 
-                if not GlobalStorage.is_in_storage("output"):
-                    print("No output was designed in prior models!")
-                    return
-                # Go through all the output types
+            frame_data = []
+            if self._use_container:
+                print("Appending data for frame " + str(frame) + " to " + self._output_dir)
+            else:
                 print("Merging data for frame " + str(frame) + " into " + hdf5_path)
-
-                for output_type in GlobalStorage.get("output"):
-                    # Build path (path attribute is format string)
-                    file_path = output_type["path"]
-                    if '%' in file_path:
-                        file_path = file_path % frame
-
-                    # Check if file exists
-                    if not os.path.exists(file_path):
-                        # If not try stereo suffixes
-                        path_l, path_r = WriterUtility._get_stereo_path_pair(file_path)
-                        if not os.path.exists(path_l) or not os.path.exists(path_r):
-                            raise Exception("File not found: " + file_path)
-                        else:
-                            use_stereo = True
-                    else:
-                        use_stereo = False
-
-                    if use_stereo:
-                        path_l, path_r = WriterUtility._get_stereo_path_pair(file_path)
-
-                        img_l, new_key, new_version = self._load_and_postprocess(path_l, output_type["key"],
-                                                                                   output_type["version"])
-                        img_r, new_key, new_version = self._load_and_postprocess(path_r, output_type["key"],
-                                                                                   output_type["version"])
-
-                        if self.config.get_bool("stereo_separate_keys", False):
-                            WriterUtility._write_to_hdf_file(f, new_key + "_0", img_l)
-                            WriterUtility._write_to_hdf_file(f, new_key + "_1", img_r)
-                        else:
-                            data = np.array([img_l, img_r])
-                            WriterUtility._write_to_hdf_file(f, new_key, data)
-
-                    else:
-                        data, new_key, new_version = self._load_and_postprocess(file_path, output_type["key"],
-                                                                                output_type["version"])
-
-                        WriterUtility._write_to_hdf_file(f, new_key, data)
-
-                    WriterUtility._write_to_hdf_file(f, new_key + "_version", np.string_([new_version]))
-
-                blender_proc_version = Utility.get_current_version()
-                if blender_proc_version:
-                    WriterUtility._write_to_hdf_file(f, "blender_proc_version", np.string_(blender_proc_version))
-
+            loaded_files = iter(loaded_files)
+            for output_type, paths in zip(outputs, frame_paths):
+                if not paths:
+                    # Images captured in memory by the renderer do not have to be loaded
+                    data = RenderCaptureUtility.get_frame(output_type["key"], frame,
+                                                          num_channels=4 if self.write_alpha_channel else 3)
+                    data, new_key, new_version = self._postprocess(data, output_type["key"], output_type["version"],
+                                                                   "memory")
+                    frame_data.append((new_key, data))
+                    frame_data.append((new_key + "_version", np.string_([new_version])))
+                    continue
+
+                images = []
+                for path in paths:
+                    data, new_key, new_version = self._postprocess(next(loaded_files), output_type["key"],
+                                                                   output_type["version"], path)
+                    images.append(data)
+
+                if len(images) == 1:
+                    frame_data.append((new_key, images[0]))
+                elif self.config.get_bool("stereo_separate_keys", False):
+                    frame_data.append((new_key + "_0", images[0]))
+                    frame_data.append((new_key + "_1", images[1]))
+                else:
+                    frame_data.append((new_key, np.array(images)))
+
+                frame_data.append((new_key + "_version", np.string_([new_version])))
+
+            if blender_proc_version:
+                frame_data.append(("blender_proc_version", np.string_(blender_proc_version)))
+
+            if self._use_container:
+                Hdf5ContainerUtility.append_frame(self._output_dir, frame_data,
+                                                  Hdf5ContainerUtility.get_frame_info(frame), self._container_shards,
+                                                  self._hdf5_settings, self._async_write)
+            elif self._async_write:
+                AsyncWriterUtility.submit(self._output_dir, WriterUtility._write_hdf5_file, hdf5_path, frame_data,
+                                          self._hdf5_settings)
+            else:
+                WriterUtility._write_hdf5_file(hdf5_path, frame_data, self._hdf5_settings)
+
+        if self.config.get_bool("delete_temporary_files_afterwards", True):
+            TempOutputUtility.release(self)
+
+    @staticmethod
+    def _get_output_paths(output_type: Dict[str, Any], frame: int) -> List[str]:
+        """ Returns the files of the given registered output in the given frame.
+
+        :param output_type: The registered output.
+        :param frame: The frame number.
+        :return: The path of the file, the paths of the left and right stereo images or an empty list, if the image \
+                 was captured in memory by the renderer.
+        """
+        if output_type.get("in_memory", False) and RenderCaptureUtility.has_frame(output_type["key"], frame):
+            return []
+
+        # Build path (path attribute is format string)
+        file_path = output_type["path"]
+        if '%' in file_path:
+            file_path = file_path % frame
+
+        # Check if file exists
+        if os.path.exists(file_path):
+            return [file_path]
+        # If not try stereo suffixes
+        path_l, path_r = WriterUtility._get_stereo_path_pair(file_path)
+        if not os.path.exists(path_l) or not os.path.exists(path_r):
+            raise Exception("File not found: " + file_path)
+        return [path_l, path_r]
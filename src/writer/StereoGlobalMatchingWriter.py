@@ -10,10 +10,11 @@
 
 from src.main.GlobalStorage import GlobalStorage
 from src.renderer.RendererInterface import RendererInterface
-from src.utility.BlenderUtility import load_image
+from src.utility.BlenderUtility import load_images
 from src.utility.SGMUtility import fill_in_fast
 from src.utility.SGMUtility import resize
 from src.utility.Utility import Utility
+from src.utility.TempOutputUtility import TempOutputUtility
 
 
 class StereoGlobalMatchingWriter(RendererInterface):
@@ -65,6 +66,7 @@ def __init__(self, config):
         self.rgb_output_key = self.config.get_string("rgb_output_key", "colors")
         if self.rgb_output_key is None:
             raise Exception("RGB output is not registered, please register the RGB renderer before this module.")
+        TempOutputUtility.add_consumer(self, {self.rgb_output_key})
 
         self.output_dir = self._determine_output_dir()
         if not os.path.exists(self.output_dir):
@@ -186,8 +188,7 @@ def run(self):
             path_l = "{}_L.{}".format(path_split[0], path_split[1])
             path_r = "{}_R.{}".format(path_split[0], path_split[1])
 
-            imgL = load_image(path_l % frame)
-            imgR = load_image(path_r % frame)
+            imgL, imgR = load_images([path_l % frame, path_r % frame])
 
             depth, disparity = self.sgm(imgL, imgR)
 
@@ -195,6 +196,7 @@ def run(self):
 
             if self.config.get_bool("output_disparity", False):
                 np.save(os.path.join(self.output_dir, "disparity_%04d") % frame, disparity)
+        TempOutputUtility.release(self)
         Utility.register_output(self._determine_output_dir(), "stereo-depth_", "stereo-depth", ".npy", "1.0.0")
         if self.config.get_bool("output_disparity", False):
             Utility.register_output(self._determine_output_dir(), "disparity_", "disparity", ".npy", "1.0.0")
@@ -1,14 +1,20 @@
 import os
 import csv
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Iterator, Iterable
+
 import numpy as np
 
 import mathutils
 
 from src.main.Module import Module
+from src.main.GlobalStorage import GlobalStorage
 from src.utility.MathUtility import MathUtility
 from src.utility.Utility import Utility
 from src.utility.WriterUtility import WriterUtility
+from src.utility.AsyncWriterUtility import AsyncWriterUtility
 
 class WriterInterface(Module):
     """
@@ -45,6 +51,29 @@ class WriterInterface(Module):
         * - write_alpha_channel
           - If true, the alpha channel will be written to file. Default: False.
           - bool
+        * - async_write
+          - If true, the compression, encoding and writing of the files is done in a background thread, so the next
+            modules (or the next scene in the batch mode) can already run meanwhile. All pending writes are finished
+            at the end of the pipeline. Only supported by the Hdf5Writer, CocoAnnotationsWriter and BopWriter.
+            Default: False.
+          - bool
+        * - async_writer_workers
+          - The amount of background threads used for writing, shared by all writers, so the largest value of
+            all writers is used. Default: 1.
+          - int
+        * - async_writer_queue_size
+          - The maximum amount of pending writes, shared by all writers. If the queue is full, the writer waits for
+            the oldest write to finish. Higher values need more memory. The largest value of all writers is used.
+            Default: 2.
+          - int
+        * - loader_threads
+          - The amount of threads, which load the registered output files in the background, while the previous
+            frames are postprocessed and written. Only used by the Hdf5Writer. Default: 4.
+          - int
+        * - prefetch_frames
+          - The amount of frames, whose files are loaded ahead of the frame, which is currently postprocessed and
+            written. Higher values need more memory. Only used by the Hdf5Writer. Default: 2.
+          - int
     """
     def __init__(self, config):
         Module.__init__(self, config)
@@ -55,6 +84,24 @@ def __init__(self, config):
         self.name_to_id = {}
         self.destination_frame = self.config.get_list("destination_frame", ["X", "Y", "Z"])
         self.write_alpha_channel = self.config.get_bool("write_alpha_channel", False)
+        self._async_write = self.config.get_bool("async_write", False)
+        if self._async_write:
+            AsyncWriterUtility.configure(self.config.get_int("async_writer_workers", 1),
+                                         self.config.get_int("async_writer_queue_size", 2))
+        self._loader_threads = self.config.get_int("loader_threads", 4)
+        self._prefetch_frames = self.config.get_int("prefetch_frames", 2)
+        if self._loader_threads < 1:
+            raise Exception("The amount of loader threads has to be at least one.")
+
+    @staticmethod
+    def _is_first_render_chunk() -> bool:
+        """ Returns whether the frames of the first render chunk are written. Without chunks, this is always true.
+
+        The writers append the frames of all further chunks to the output of the first chunk, see Pipeline.
+
+        :return: True, if this is the first (or only) render chunk.
+        """
+        return not GlobalStorage.is_in_storage("render_chunk") or GlobalStorage.get("render_chunk") == 0
 
     def write_attributes_to_file(self, item_writer, items, default_file_prefix, default_output_key, default_attributes, version="1.0.0"):
         """ Writes the state of the given items to a file with the configured prefix.
@@ -95,17 +142,62 @@ def _apply_postprocessing(self, output_key, data, version):
 
         return data, new_key, new_version
 
-    def _load_and_postprocess(self, file_path, key, version = "1.0.0"):
+    def _load_and_postprocess(self, file_path, key, version = "1.0.0", keep_half_float = False):
         """
         Loads an image and post process it.
 
         :param file_path: Image path. Type: string.
         :param key: The image's key with regards to the hdf5 file. Type: string.
         :param version: The version number original data. Type: String. Default: 1.0.0.
+        :param keep_half_float: If true, half float .exr images are loaded as float16, this is only done if there are \
+                                no postprocessing modules for the key. Type: bool. Default: False.
         :return: The post-processed image that was loaded using the file path.
         """
-        data = WriterUtility.load_output_file(Utility.resolve_path(file_path), self.write_alpha_channel)
+        data = self._load_output_file(file_path, key, keep_half_float)
+        return self._postprocess(data, key, version, file_path)
+
+    def _load_output_file(self, file_path: str, key: str, keep_half_float: bool = False) -> np.ndarray:
+        """ Loads the given output file, this does not need bpy, so it can be done in a background thread.
+
+        :param file_path: Image path.
+        :param key: The image's key with regards to the hdf5 file.
+        :param keep_half_float: If true, half float .exr images are loaded as float16, this is only done if there are \
+                                no postprocessing modules for the key.
+        :return: The loaded image.
+        """
+        keep_half_float = keep_half_float and key not in self.postprocessing_modules_per_output
+        return WriterUtility.load_output_file(Utility.resolve_path(file_path), self.write_alpha_channel,
+                                              keep_half_float)
+
+    def _postprocess(self, data: np.ndarray, key: str, version: str, source: str) -> Tuple[np.ndarray, str, str]:
+        """ Post processes the given loaded image.
+
+        :param data: The loaded image.
+        :param key: The image's key with regards to the hdf5 file.
+        :param version: The version number original data.
+        :param source: Where the image was loaded from, only used for printing.
+        :return: The post-processed image, its new key and its new version.
+        """
         data, new_key, new_version = self._apply_postprocessing(key, data, version)
-        print("Key: " + key + " - shape: " + str(data.shape) + " - dtype: " + str(data.dtype) + " - path: " + file_path)
+        print("Key: " + key + " - shape: " + str(data.shape) + " - dtype: " + str(data.dtype) + " - path: " + source)
         return data, new_key, new_version
 
+    def _prefetch_output_files(self, frame_files: Iterable[List[Tuple[str, str, bool]]]) \
+            -> Iterator[List[np.ndarray]]:
+        """ Loads the output files of multiple frames in a thread pool, ahead of the frame which is processed.
+
+        The files of the next prefetch_frames frames are loaded in the background, while the caller postprocesses
+        and writes the current frame. The postprocessing stays in the calling thread, as it might need bpy.
+
+        :param frame_files: For every frame a list of (file_path, key, keep_half_float) tuples, see _load_output_file().
+        :return: An iterator returning for every frame the list of loaded files in the same order.
+        """
+        with ThreadPoolExecutor(max_workers=self._loader_threads) as executor:
+            pending = deque()
+            for files in frame_files:
+                pending.append([executor.submit(self._load_output_file, *file) for file in files])
+                if len(pending) > self._prefetch_frames:
+                    yield [future.result() for future in pending.popleft()]
+            while pending:
+                yield [future.result() for future in pending.popleft()]
+